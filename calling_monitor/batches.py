@@ -0,0 +1,208 @@
+# calling_monitor/batches.py
+"""
+Lotes de análisis: todas las grabaciones de un rango de fechas (y opcionalmente una cola).
+
+Las grabaciones se obtienen del CDR de Sharpen (`V2/query/`) al crear el lote. `advance_batch`
+programa trabajos hasta tener `concurrency` en curso y se vuelve a llamar cada vez que termina
+uno (ver tasks.run_transcription_job), así un lote grande no llena la cola `transcription`
+por delante de los análisis que piden los supervisores. Las llamadas que ya tienen CallAnalysis
+se saltan, y el cursor `next_index` permite reanudar un lote interrumpido. Si al terminar
+quedan grabaciones cuyo análisis falló el lote queda FAILED; `resume_batch` las reintenta.
+"""
+import datetime
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from websocket_app.fetch_script import _call_sharpen_api_async, parse_sharpen_query_result
+from websocket_app.sharpen_client import run_sync
+from .jobs import enqueue_analysis_job, find_cached_analysis, has_full_analysis_access
+
+logger = logging.getLogger(__name__)
+
+# Las fechas van en hora local (Hermosillo); _call_sharpen_api_async las convierte a UTC
+SQL_RECORDINGS_IN_RANGE = """
+    SELECT
+        `queueCDR`.`uniqueID` AS "uniqueID",
+        `queueCDR`.`mixmonFileName` AS "mixmonFileName",
+        `queueCDR`.`queue` AS "queue",
+        `queueCDR`.`startTime` AS "startTime"
+    FROM
+        `fathomvoice`.`fathomQueues`.`queueCDR` AS `queueCDR`
+    WHERE
+        `queueCDR`.`startTime` >= '{start}'
+        AND `queueCDR`.`startTime` < '{end}'
+        AND `queueCDR`.`mixmonFileName` != ''
+        {queue_filter}
+    ORDER BY
+        `queueCDR`.`startTime`
+"""
+
+
+def _sql_string(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("'", "''")
+
+
+def fetch_batch_recordings(date_from: datetime.date, date_to: datetime.date, queue: str = "") -> list[dict]:
+    """Grabaciones del CDR de Sharpen entre `date_from` y `date_to` (ambos incluidos), sin repetir uniqueID."""
+    end = date_to + datetime.timedelta(days=1)
+    queue_filter = f"AND `queueCDR`.`queue` = '{_sql_string(queue)}'" if queue else ""
+    payload = {
+        "method": "query",
+        "q": SQL_RECORDINGS_IN_RANGE.format(
+            start=f"{date_from.isoformat()} 00:00:00",
+            end=f"{end.isoformat()} 00:00:00",
+            queue_filter=queue_filter,
+        ),
+        "global": False,
+    }
+    # run_sync usa el loop de fondo del proceso y su cliente HTTP compartido (async_to_sync crearía un loop y un cliente que nunca se cierra)
+    data = run_sync(_call_sharpen_api_async, "V2/query/", payload)
+    if not data or "error" in data:
+        raise ValueError(f"Sharpen no devolvió el CDR: {data.get('error', 'sin datos') if data else 'sin datos'}")
+
+    recordings, seen = [], set()
+    for row in parse_sharpen_query_result(data):
+        unique_id = row.get("uniqueID")
+        if not unique_id or not row.get("mixmonFileName") or unique_id in seen:
+            continue
+        seen.add(unique_id)
+        recordings.append({"uniqueID": unique_id, "mixmonFileName": row["mixmonFileName"]})
+    return recordings
+
+
+def batch_concurrency(requested: int | None = None) -> int:
+    """`concurrency` del lote: el pedido (o TRANSCRIBE_BATCH_CONCURRENCY) sin pasar de TRANSCRIBE_BATCH_MAX_CONCURRENCY."""
+    if requested is not None and requested <= 0:
+        raise ValueError("concurrency debe ser mayor que 0")
+    return max(1, min(requested or settings.TRANSCRIBE_BATCH_CONCURRENCY, settings.TRANSCRIBE_BATCH_MAX_CONCURRENCY))
+
+
+def visible_batches(user):
+    """Lotes que `user` puede consultar: los suyos, o todos con acceso completo (ver jobs.visible_jobs)."""
+    from .models import AnalysisBatch
+
+    if not getattr(user, "is_authenticated", False):
+        return AnalysisBatch.objects.none()
+    if has_full_analysis_access(user):
+        return AnalysisBatch.objects.all()
+    return AnalysisBatch.objects.filter(requested_by=user)
+
+
+def create_analysis_batch(date_from, date_to, queue="", lang="en", concurrency=None, user=None):
+    """Consulta el CDR y crea el lote (todavía sin programar; ver `advance_batch`)."""
+    from .models import AnalysisBatch
+
+    concurrency = batch_concurrency(concurrency)
+    recordings = fetch_batch_recordings(date_from, date_to, queue)
+    batch = AnalysisBatch.objects.create(
+        date_from=date_from,
+        date_to=date_to,
+        queue=queue or "",
+        lang=lang,
+        concurrency=concurrency,
+        recordings=recordings,
+        requested_by=user if getattr(user, "is_authenticated", False) else None,
+    )
+    logger.info(f"Lote de análisis {batch.id} creado: {len(recordings)} grabaciones del {date_from} al {date_to}.")
+    return batch
+
+
+def advance_batch(batch_id):
+    """
+    Programa trabajos del lote hasta tener `concurrency` en curso, y lo cierra cuando no quedan
+    grabaciones ni trabajos pendientes. Es idempotente: se puede llamar en cualquier momento
+    (p. ej. para reanudar tras reiniciar los workers).
+    """
+    from .models import AnalysisBatch, TranscriptionJob
+
+    with transaction.atomic():
+        # El bloqueo evita que dos trabajos que terminan a la vez programen la misma grabación
+        batch = AnalysisBatch.objects.select_for_update().get(pk=batch_id)
+        if batch.status in (AnalysisBatch.DONE, AnalysisBatch.FAILED):
+            return batch
+        if batch.status == AnalysisBatch.QUEUED:
+            batch.status = AnalysisBatch.RUNNING
+            batch.started_at = timezone.now()
+
+        in_flight = batch.jobs.filter(status__in=TranscriptionJob.ACTIVE_STATUSES).count()
+        while in_flight < batch.concurrency:
+            if batch.next_index < len(batch.recordings):
+                recording = batch.recordings[batch.next_index]
+                batch.next_index += 1
+            elif batch.retry_queue:
+                # Reintentos de grabaciones que fallaron (ver `resume_batch`)
+                recording = batch.retry_queue.pop(0)
+            else:
+                break
+            if find_cached_analysis(recording["uniqueID"], batch.lang):
+                batch.skipped += 1
+                continue
+            _, created = enqueue_analysis_job(
+                recording["mixmonFileName"], recording["uniqueID"], batch.lang,
+                user=batch.requested_by, batch=batch,
+            )
+            if created:
+                in_flight += 1
+            else:
+                # Ya la está analizando otro trabajo fuera del lote
+                batch.skipped += 1
+
+        if batch.next_index >= len(batch.recordings) and not batch.retry_queue and in_flight == 0:
+            failed = len(batch.failed_unique_ids())
+            if failed:
+                batch.status = AnalysisBatch.FAILED
+                batch.error = f"{failed} grabaciones no se pudieron analizar; se reintentan al reanudar el lote."
+            else:
+                batch.status = AnalysisBatch.DONE
+            batch.finished_at = timezone.now()
+        batch.save()
+
+    notify_batch_update(batch)
+    if batch.status in (AnalysisBatch.DONE, AnalysisBatch.FAILED):
+        progress = batch.progress()
+        logger.info(
+            f"Lote de análisis {batch.id} terminado: {progress['done']} analizadas, {progress['failed']} fallidas, "
+            f"{progress['skipped']} omitidas ({progress['recordingsPerHour']} grabaciones/hora)."
+        )
+    return batch
+
+
+def resume_batch(batch_id):
+    """
+    Reanuda un lote: vuelve a programar las grabaciones cuyo último intento falló y sigue con
+    las que faltan. Un lote FAILED (o DONE con fallidas) vuelve a RUNNING.
+    """
+    from .models import AnalysisBatch
+
+    with transaction.atomic():
+        batch = AnalysisBatch.objects.select_for_update().get(pk=batch_id)
+        failed = batch.failed_unique_ids()
+        queued = {recording["uniqueID"] for recording in batch.retry_queue}
+        retries = [r for r in batch.recordings if r["uniqueID"] in failed and r["uniqueID"] not in queued]
+        batch.retry_queue.extend(retries)
+        if batch.status in (AnalysisBatch.DONE, AnalysisBatch.FAILED) and batch.retry_queue:
+            batch.status = AnalysisBatch.RUNNING
+            batch.error = ""
+            batch.finished_at = None
+        batch.save()
+    if retries:
+        logger.info(f"Lote de análisis {batch.id} reanudado: {len(retries)} grabaciones fallidas se vuelven a programar.")
+    return advance_batch(batch_id)
+
+
+def notify_batch_update(batch) -> None:
+    """Progreso del lote al grupo `user_<id>` de quien lo pidió."""
+    channel_layer = get_channel_layer()
+    if not channel_layer or not batch.requested_by_id:
+        return
+    try:
+        async_to_sync(channel_layer.group_send)(
+            f"user_{batch.requested_by_id}", {"type": "analysis.batch", "batch": batch.to_dict()}
+        )
+    except Exception as e:
+        logger.warning(f"No se pudo notificar el lote {batch.id} por WebSocket: {e}")
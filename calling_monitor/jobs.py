@@ -0,0 +1,156 @@
+# calling_monitor/jobs.py
+"""
+Trabajos de análisis de grabaciones en segundo plano (ver tasks.run_transcription_job).
+
+El progreso de cada trabajo se notifica por el channel layer al grupo del trabajo (los clientes
+se suscriben enviando `{"type": "watchJob", "jobId": ...}` por el WebSocket) y a los grupos
+`user_<id>` de quienes lo pidieron.
+
+Cada usuario sólo ve los trabajos que pidió (o a los que se unió por deduplicación); los roles de
+ANALYSIS_FULL_ACCESS_ROLES y el staff ven todos (`visible_jobs`).
+
+Antes de encolar se busca el análisis ya guardado de la llamada (`find_cached_analysis`), y si
+ya hay un trabajo en curso para la misma llamada e idioma se devuelve ese en lugar de crear otro
+(restricción `unique_active_transcription_job` en la base de datos).
+"""
+import logging
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+logger = logging.getLogger(__name__)
+
+
+def job_group_name(job_id) -> str:
+    return f"transcription_job.{job_id}"
+
+
+def job_event(job) -> dict:
+    return {"type": "transcription.job", "job": job.to_dict()}
+
+
+def notify_job_update(job) -> None:
+    channel_layer = get_channel_layer()
+    if not channel_layer:
+        return
+    event = job_event(job)
+    groups = [job_group_name(job.id)]
+    user_ids = set(job.subscribers.values_list("id", flat=True))
+    if job.requested_by_id:
+        user_ids.add(job.requested_by_id)
+    groups.extend(f"user_{user_id}" for user_id in sorted(user_ids))
+    try:
+        for group in groups:
+            async_to_sync(channel_layer.group_send)(group, event)
+    except Exception as e:
+        # La notificación es un extra: el estado siempre se puede consultar por HTTP
+        logger.warning(f"No se pudo notificar el trabajo {job.id} por WebSocket: {e}")
+
+
+def has_full_analysis_access(user) -> bool:
+    """Staff y roles de ANALYSIS_FULL_ACCESS_ROLES ven los trabajos y lotes de todos los usuarios."""
+    if not getattr(user, "is_authenticated", False):
+        return False
+    return user.is_staff or getattr(user, "role", "") in settings.ANALYSIS_FULL_ACCESS_ROLES
+
+
+def visible_jobs(user):
+    """Trabajos que `user` puede consultar (ninguno si no está autenticado)."""
+    from .models import TranscriptionJob
+
+    if not getattr(user, "is_authenticated", False):
+        return TranscriptionJob.objects.none()
+    if has_full_analysis_access(user):
+        return TranscriptionJob.objects.all()
+    return TranscriptionJob.objects.filter(Q(requested_by=user) | Q(subscribers=user)).distinct()
+
+
+def get_visible_job(job_id, user):
+    """
+    El trabajo si existe y `user` puede verlo, o None. No distingue entre ambos casos para que
+    nadie pueda averiguar qué IDs existen.
+    """
+    from .models import TranscriptionJob
+
+    try:
+        return visible_jobs(user).get(pk=job_id)
+    except (TranscriptionJob.DoesNotExist, ValidationError, ValueError):
+        return None
+
+
+def find_cached_analysis(unique_id: str, lang: str, audio_sha256: str | None = None):
+    """
+    CallAnalysis ya guardado para la llamada en ese idioma, o None. Con `audio_sha256` sólo
+    vale si se transcribió exactamente ese audio.
+    """
+    from .models import CallAnalysis
+
+    queryset = CallAnalysis.objects.filter(unique_id=unique_id, language_used=lang).exclude(transcript="")
+    if audio_sha256:
+        queryset = queryset.filter(audio_sha256=audio_sha256)
+    return queryset.first()
+
+
+def cached_analysis_result(instance) -> dict:
+    """
+    Resultado con la forma de `TranscriptionJob.result`. Si el análisis salió de un trabajo,
+    se usa su resultado completo (incluye tiempos y hablantes).
+    """
+    from .models import TranscriptionJob
+
+    job = instance.jobs.filter(status=TranscriptionJob.DONE).exclude(result=None).order_by('-finished_at').first()
+    if job and job.result.get("transcription") == instance.transcript:
+        return job.result
+    return {"transcription": instance.transcript, "analysis": instance.analysis_dict()}
+
+
+def active_analysis_job(unique_id: str, lang: str):
+    from .models import TranscriptionJob
+
+    return TranscriptionJob.objects.filter(
+        unique_id=unique_id, lang=lang, status__in=TranscriptionJob.ACTIVE_STATUSES,
+    ).first()
+
+
+def enqueue_analysis_job(mixmon_file_name: str, unique_id: str, lang: str, user=None, batch=None):
+    """
+    Encola el análisis en la cola `transcription`, salvo que ya haya uno en curso para la misma
+    llamada e idioma; en ese caso `user` se suscribe a él para poder consultarlo. Devuelve `(job, created)`.
+    """
+    from .models import TranscriptionJob
+    from .tasks import run_transcription_job
+
+    job = active_analysis_job(unique_id, lang)
+    if job:
+        _subscribe(job, user)
+        return job, False
+    try:
+        with transaction.atomic():
+            job = TranscriptionJob.objects.create(
+                mixmon_file_name=mixmon_file_name,
+                unique_id=unique_id,
+                lang=lang,
+                requested_by=user if getattr(user, "is_authenticated", False) else None,
+                batch=batch,
+            )
+    except IntegrityError:
+        # Otra petición creó el trabajo entre la consulta y el INSERT
+        job = active_analysis_job(unique_id, lang)
+        if job:
+            _subscribe(job, user)
+            return job, False
+        raise
+    # Si se llama dentro de una transacción (p. ej. al avanzar un lote), el worker no debe
+    # recibir el trabajo antes de que exista en la base de datos
+    transaction.on_commit(lambda: run_transcription_job.delay(str(job.id)))
+    logger.info(f"Trabajo de análisis {job.id} encolado para {unique_id} ({lang}).")
+    return job, True
+
+
+def _subscribe(job, user) -> None:
+    if getattr(user, "is_authenticated", False) and user.pk != job.requested_by_id:
+        job.subscribers.add(user)
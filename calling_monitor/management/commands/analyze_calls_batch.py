@@ -0,0 +1,85 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from calling_monitor.batches import advance_batch, create_analysis_batch, resume_batch
+from calling_monitor.models import AnalysisBatch
+
+
+class Command(BaseCommand):
+    help = (
+        'Analiza todas las grabaciones de un rango de fechas (CDR de Sharpen) con trabajos en la cola '
+        '`transcription`, omitiendo las llamadas ya analizadas. Requiere los workers de Celery en marcha.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--from', dest='date_from', help='Fecha inicial YYYY-MM-DD (por defecto hoy)')
+        parser.add_argument('--to', dest='date_to', help='Fecha final YYYY-MM-DD, incluida (por defecto --from)')
+        parser.add_argument('--queue', default='', help='Sólo las llamadas de esta cola')
+        parser.add_argument('--lang', default='en')
+        parser.add_argument('--concurrency', type=int, help='Trabajos en curso a la vez (TRANSCRIBE_BATCH_CONCURRENCY, tope TRANSCRIBE_BATCH_MAX_CONCURRENCY)')
+        parser.add_argument('--resume', metavar='BATCH_ID', help='Reanudar un lote existente en lugar de crear uno')
+        parser.add_argument('--no-wait', action='store_true', help='Programar y salir sin seguir el progreso')
+        parser.add_argument('--poll', type=float, default=10, help='Segundos entre consultas de progreso')
+
+    def handle(self, *args, **options):
+        if options['resume']:
+            try:
+                batch = AnalysisBatch.objects.get(pk=options['resume'])
+            except (AnalysisBatch.DoesNotExist, ValueError) as e:
+                raise CommandError(f"Lote no encontrado: {e}")
+            # Reprograma las grabaciones que fallaron además de las que faltan
+            batch = resume_batch(batch.id)
+            if batch.status == AnalysisBatch.DONE:
+                self.stdout.write(f"El lote {batch.id} ya había terminado.")
+                self._summary(batch)
+                return
+        else:
+            date_from = parse_date(options['date_from']) if options['date_from'] else timezone.localdate()
+            date_to = parse_date(options['date_to']) if options['date_to'] else date_from
+            if not date_from or not date_to or date_to < date_from:
+                raise CommandError("Rango de fechas inválido (usar YYYY-MM-DD).")
+            try:
+                batch = create_analysis_batch(
+                    date_from, date_to, queue=options['queue'], lang=options['lang'],
+                    concurrency=options['concurrency'],
+                )
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Lote {batch.id}: {len(batch.recordings)} grabaciones del {date_from} al {date_to}.")
+
+            batch = advance_batch(batch.id)
+        if options['no_wait']:
+            self.stdout.write(f"Lote programado; reanudar o seguir con --resume {batch.id}")
+            return
+
+        last_line = None
+        while batch.status not in (AnalysisBatch.DONE, AnalysisBatch.FAILED):
+            time.sleep(options['poll'])
+            # Cada trabajo que termina programa el siguiente; esto sólo cubre avisos perdidos
+            batch = advance_batch(batch.id)
+            progress = batch.progress()
+            line = (
+                f"{progress['scheduled']}/{progress['total']} programadas · {progress['done']} analizadas · "
+                f"{progress['running']} en curso · {progress['failed']} fallidas · {progress['retrying']} por reintentar · "
+                f"{progress['skipped']} omitidas"
+            )
+            if line != last_line:
+                self.stdout.write(line)
+                last_line = line
+
+        self._summary(batch)
+
+    def _summary(self, batch):
+        progress = batch.progress()
+        line = (
+            f"Lote {batch.id}: {progress['done']} analizadas, {progress['failed']} fallidas, "
+            f"{progress['skipped']} omitidas de {progress['total']} · "
+            f"{progress['recordingsPerHour'] or 0} grabaciones/hora"
+        )
+        if batch.status == AnalysisBatch.FAILED:
+            self.stdout.write(self.style.WARNING(f"⚠️ {line}. Reintentar las fallidas con --resume {batch.id}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(f"✅ {line}"))
@@ -0,0 +1,75 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from calling_monitor.utils.audio_stream import PCM_CHUNK_BYTES, PCM_SAMPLE_RATE, decode_to_pcm, iter_file_chunks
+from calling_monitor.utils.parallel_transcriber import (
+    BYTES_PER_SAMPLE, IN_FLIGHT_PER_WORKER, shutdown_pool, start_pool, transcribe_pcm_parallel,
+)
+from calling_monitor.utils.transcriber import recognize_pcm
+from calling_monitor.utils.vosk_models import vosk_models
+
+
+def _chunks(pcm: bytes):
+    for offset in range(0, len(pcm), PCM_CHUNK_BYTES):
+        yield pcm[offset:offset + PCM_CHUNK_BYTES]
+
+
+class Command(BaseCommand):
+    help = 'Compara la transcripción secuencial contra la transcripción en paralelo por segmentos sobre la misma grabación'
+
+    def add_arguments(self, parser):
+        parser.add_argument('audio', help='Archivo de audio (cualquier formato que lea ffmpeg)')
+        parser.add_argument('--lang', default='en')
+        parser.add_argument('--minutes', type=float, default=30, help='Repite la grabación hasta esta duración (0 = tal cual)')
+        parser.add_argument('--workers', type=int, help='Procesos (TRANSCRIBE_WORKERS)')
+        parser.add_argument('--segment-seconds', type=float, help='Tamaño objetivo de segmento (TRANSCRIBE_SEGMENT_SECONDS)')
+
+    def handle(self, *args, **options):
+        try:
+            pcm = b"".join(decode_to_pcm(iter_file_chunks(options['audio'])))
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        if not pcm:
+            raise CommandError("El archivo no tiene audio.")
+
+        target_bytes = int(options['minutes'] * 60 * PCM_SAMPLE_RATE) * BYTES_PER_SAMPLE
+        if target_bytes:
+            pcm = (pcm * (target_bytes // len(pcm) + 1))[:target_bytes]
+        duration = len(pcm) / (PCM_SAMPLE_RATE * BYTES_PER_SAMPLE)
+        workers = options['workers'] or settings.TRANSCRIBE_WORKERS
+
+        vosk_models.warm_up(options['lang'])
+        self.stdout.write(f"Audio de {duration / 60:.1f} min, modelo '{options['lang']}', {workers} procesos")
+
+        started = time.perf_counter()
+        sequential_text = recognize_pcm(_chunks(pcm), options['lang'])
+        sequential = time.perf_counter() - started
+        self.stdout.write(
+            f"secuencial: {sequential:8.1f}s  ({duration / sequential:.1f}x tiempo real, {len(sequential_text.split())} palabras)"
+        )
+
+        # Arranque del pool (forkserver + un modelo por proceso) medido aparte: en el worker se paga una vez
+        startup = start_pool(workers, options['lang'])
+        self.stdout.write(f"arranque del pool: {startup:.1f}s")
+
+        started = time.perf_counter()
+        result = transcribe_pcm_parallel(
+            _chunks(pcm), options['lang'], workers=workers, segment_seconds=options['segment_seconds']
+        )
+        parallel = time.perf_counter() - started
+        shutdown_pool()
+        self.stdout.write(
+            f"paralelo:   {parallel:8.1f}s  ({duration / parallel:.1f}x tiempo real, {len(result['words'])} palabras, "
+            f"{len(result['segments'])} segmentos, hasta {IN_FLIGHT_PER_WORKER * workers} en curso)"
+        )
+
+        speedup = sequential / parallel
+        # Con el arranque incluido: lo que gana la primera grabación después de crear el pool
+        cold_speedup = sequential / (parallel + startup)
+        self.stdout.write(f"aceleración secuencial → paralelo: {speedup:.2f}x ({cold_speedup:.2f}x contando el arranque del pool)")
+        if speedup > 1:
+            self.stdout.write(self.style.SUCCESS(f"✅ El paralelo es {speedup:.2f}x más rápido con {workers} procesos."))
+        else:
+            self.stdout.write(self.style.WARNING(f"⚠️ El paralelo no es más rápido con {workers} procesos: dejar TRANSCRIBE_PARALLEL desactivado."))
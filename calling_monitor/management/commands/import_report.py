@@ -0,0 +1,88 @@
+import json
+import subprocess
+import sys
+from collections import defaultdict
+
+from django.apps import apps
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Bibliotecas que sólo deben cargarse al transcribir/analizar (ver gvhc/lazy_imports.py)
+HEAVY_MODULES = ("spacy", "vosk", "numpy", "pandas", "pydub", "soundfile", "language_tool_python", "torch")
+
+# Lo que importa un proceso al arrancar: Django, las URLs (todas las vistas), el routing de
+# WebSockets y las tareas de Celery (autodiscover)
+STARTUP_SCRIPT = """
+import json, os, sys, time
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gvhc.settings")
+started = time.perf_counter()
+import django
+django.setup()
+setup = time.perf_counter()
+import gvhc.urls
+import websocket_app.routing
+from gvhc.celery import app
+app.loader.import_default_modules()
+finished = time.perf_counter()
+print(json.dumps({
+    "setup": setup - started,
+    "total": finished - started,
+    "heavy": [name for name in json.loads(sys.argv[1]) if name in sys.modules],
+}))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide en un proceso nuevo lo que cuesta arrancar (Django + URLs + routing + tareas de Celery), '
+        'con el tiempo de importación por app y por paquete, y avisa si se cargó alguna biblioteca pesada'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help='Paquetes de terceros a mostrar')
+        parser.add_argument('--check', action='store_true', help='Terminar con error si se cargó alguna biblioteca pesada')
+
+    def handle(self, *args, **options):
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", STARTUP_SCRIPT, json.dumps(HEAVY_MODULES)],
+            cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise CommandError(f"El arranque falló:\n{completed.stderr[-2000:]}")
+        summary = json.loads(completed.stdout.strip().splitlines()[-1])
+
+        # Líneas de -X importtime: "import time: self [us] | cumulative | paquete.modulo"
+        self_us = defaultdict(int)
+        for line in completed.stderr.splitlines():
+            if not line.startswith("import time:") or "|" not in line:
+                continue
+            try:
+                own, _, name = line[len("import time:"):].split("|")
+                self_us[name.strip().split(".")[0]] += int(own)
+            except ValueError:
+                continue  # encabezado
+
+        local_apps = {config.name.split(".")[0] for config in apps.get_app_configs() if not config.name.startswith("django.")}
+        local_apps.add("gvhc")
+
+        self.stdout.write(f"Arranque: {summary['total']:.2f}s (django.setup: {summary['setup']:.2f}s)")
+        self.stdout.write("\nPor app del proyecto (tiempo propio de sus módulos):")
+        for name in sorted(local_apps, key=lambda n: -self_us.get(n, 0)):
+            if self_us.get(name):
+                self.stdout.write(f"  {name:<28} {self_us[name] / 1000:8.1f} ms")
+
+        self.stdout.write(f"\nPaquetes de terceros más lentos (top {options['top']}):")
+        third_party = sorted(
+            ((name, us) for name, us in self_us.items() if name not in local_apps),
+            key=lambda item: -item[1],
+        )
+        for name, us in third_party[:options['top']]:
+            self.stdout.write(f"  {name:<28} {us / 1000:8.1f} ms")
+
+        if summary["heavy"]:
+            message = f"Bibliotecas pesadas cargadas al arrancar: {', '.join(summary['heavy'])}"
+            if options['check']:
+                raise CommandError(message)
+            self.stdout.write(self.style.WARNING(f"\n⚠️ {message}"))
+        else:
+            self.stdout.write(self.style.SUCCESS("\n✅ Ninguna biblioteca pesada se carga al arrancar"))
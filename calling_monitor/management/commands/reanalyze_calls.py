@@ -0,0 +1,79 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from calling_monitor.models import CallAnalysis
+from calling_monitor.utils.analyzer import extract_information_batch
+from calling_monitor.utils.stereo_transcriber import strip_speaker_labels
+
+
+class Command(BaseCommand):
+    help = (
+        'Vuelve a aplicar las reglas del analizador a las transcripciones guardadas en CallAnalysis '
+        '(p. ej. después de editar analyzer_rules.json), procesándolas por lotes con nlp.pipe'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lang', action='append', help='Sólo este idioma (se puede repetir; por defecto todos)')
+        parser.add_argument('--since', help='Sólo análisis creados desde esta fecha (YYYY-MM-DD)')
+        parser.add_argument('--batch-size', type=int, help='Transcripciones por lote de nlp.pipe (ANALYZER_BATCH_SIZE)')
+        parser.add_argument('--n-process', type=int, help='Procesos de nlp.pipe (ANALYZER_N_PROCESS)')
+        parser.add_argument('--chunk-size', type=int, default=500, help='Filas por bulk_update')
+        parser.add_argument('--dry-run', action='store_true', help='Analizar sin guardar')
+
+    def handle(self, *args, **options):
+        queryset = CallAnalysis.objects.exclude(transcript="")
+        if options['since']:
+            since = parse_date(options['since'])
+            if not since:
+                raise CommandError("--since debe tener el formato YYYY-MM-DD.")
+            queryset = queryset.filter(created_at__date__gte=since)
+
+        languages = options['lang'] or list(
+            queryset.order_by().values_list('language_used', flat=True).distinct()
+        )
+        started = time.perf_counter()
+        total = 0
+        for lang in languages:
+            if not lang:
+                continue
+            total += self._reanalyze(queryset.filter(language_used=lang), lang, options)
+
+        elapsed = time.perf_counter() - started
+        rate = total / elapsed if elapsed else 0
+        action = "analizadas (sin guardar)" if options['dry_run'] else "re-analizadas"
+        self.stdout.write(self.style.SUCCESS(f"✅ {total} transcripciones {action} en {elapsed:.1f}s ({rate:.1f}/s)"))
+
+    def _reanalyze(self, queryset, lang, options) -> int:
+        rows = queryset.order_by('id').values_list('transcript', 'id').iterator(chunk_size=options['chunk_size'])
+        # Las transcripciones estéreo se guardan con "Agente:"/"Cliente:"; el análisis original no las vio
+        rows = ((strip_speaker_labels(transcript), pk) for transcript, pk in rows)
+        results = extract_information_batch(
+            rows, lang, batch_size=options['batch_size'], n_process=options['n_process'], as_tuples=True,
+        )
+
+        count = 0
+        pending = []
+        for analysis, pk in results:
+            pending.append(CallAnalysis(
+                id=pk,
+                high_risk_warnings=analysis["high_risk_warnings"],
+                call_motives=analysis["call_motives"],
+                motives=analysis["motivos"],
+                agent_actions=analysis["acciones_agente"],
+            ))
+            count += 1
+            if len(pending) >= options['chunk_size']:
+                self._save(pending, options)
+                self.stdout.write(f"{lang}: {count} transcripciones")
+                pending = []
+        self._save(pending, options)
+        self.stdout.write(f"{lang}: {count} transcripciones")
+        return count
+
+    def _save(self, instances, options):
+        if instances and not options['dry_run']:
+            CallAnalysis.objects.bulk_update(
+                instances, ['high_risk_warnings', 'call_motives', 'motives', 'agent_actions']
+            )
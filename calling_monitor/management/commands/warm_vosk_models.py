@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from calling_monitor.utils.vosk_models import vosk_models
+
+
+class Command(BaseCommand):
+    help = 'Carga y calienta los modelos de Vosk y muestra el tiempo de carga y la memoria (RSS) de cada uno'
+
+    def add_arguments(self, parser):
+        parser.add_argument('languages', nargs='*', help='Idiomas a cargar (por defecto todos los configurados)')
+        parser.add_argument('--no-warm-up', action='store_true', help='Sólo cargar, sin pasar audio de prueba')
+
+    def handle(self, *args, **options):
+        languages = options['languages'] or vosk_models.languages()
+        for lang in languages:
+            try:
+                if options['no_warm_up']:
+                    vosk_models.load(lang)
+                else:
+                    vosk_models.warm_up(lang)
+            except (ValueError, FileNotFoundError) as e:
+                raise CommandError(str(e))
+
+        for lang, info in vosk_models.stats().items():
+            if not info["loaded"]:
+                continue
+            self.stdout.write(
+                f"{lang}: carga {info['load_seconds']}s, +{info['rss_mb']} MB RSS, "
+                f"warm-up {info['warm_up_seconds']}s ({info['path']})"
+            )
+        self.stdout.write(self.style.SUCCESS("✅ Modelos de Vosk listos"))
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calling_monitor', '0006_analysisbatch_transcriptionjob_batch'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisbatch',
+            name='retry_queue',
+            field=models.JSONField(default=list),
+        ),
+    ]
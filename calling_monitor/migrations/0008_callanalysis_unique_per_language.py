@@ -0,0 +1,42 @@
+import json
+
+from django.db import migrations, models
+
+JSON_FIELDS = ('high_risk_warnings', 'call_motives', 'motives', 'agent_actions')
+
+
+def decode_json_strings(apps, schema_editor):
+    """Convierte a listas los análisis que se guardaron como texto (json.dumps) dentro de los JSONField."""
+    CallAnalysis = apps.get_model('calling_monitor', 'CallAnalysis')
+    for analysis in CallAnalysis.objects.iterator():
+        changed = []
+        for field in JSON_FIELDS:
+            value = getattr(analysis, field)
+            if isinstance(value, str):
+                try:
+                    setattr(analysis, field, json.loads(value))
+                except ValueError:
+                    continue
+                changed.append(field)
+        if changed:
+            analysis.save(update_fields=changed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calling_monitor', '0007_analysisbatch_retry_queue'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='callanalysis',
+            name='unique_id',
+            field=models.CharField(blank=True, db_index=True, max_length=255, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='callanalysis',
+            constraint=models.UniqueConstraint(fields=('unique_id', 'language_used'), name='unique_call_analysis_per_language'),
+        ),
+        migrations.RunPython(decode_json_strings, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('calling_monitor', '0008_callanalysis_unique_per_language'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='transcriptionjob',
+            name='subscribers',
+            field=models.ManyToManyField(blank=True, related_name='subscribed_transcription_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
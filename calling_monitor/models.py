@@ -1,5 +1,10 @@
 #calling_monitor
+import json
+import uuid
+
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 class CallRecord(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -13,10 +18,186 @@ class CallAnalysis(models.Model):
     audio_file = models.FileField(upload_to="call_audios/")
     transcript = models.TextField(blank=True)
     motives = models.JSONField(blank=True, null=True)
-    unique_id = models.CharField(max_length=255, unique=True, blank=True, null=True) # Nuevo campo
+    unique_id = models.CharField(max_length=255, blank=True, null=True, db_index=True) # Nuevo campo
     language_used = models.CharField(max_length=10, default='es', blank=True, null=True) # NEW FIELD
     agent_actions = models.JSONField(blank=True, null=True)
+    high_risk_warnings = models.JSONField(blank=True, null=True)
+    call_motives = models.JSONField(blank=True, null=True)
+    audio_sha256 = models.CharField(max_length=64, blank=True, db_index=True)  # hash del audio transcrito
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            # Un análisis por llamada e idioma: analizar en 'en' no reemplaza el análisis en 'es'
+            models.UniqueConstraint(fields=['unique_id', 'language_used'], name='unique_call_analysis_per_language'),
+        ]
+
+    def analysis_dict(self) -> dict:
+        """El análisis guardado con las mismas claves que devuelve `extract_information`."""
+        def value(field):
+            # Registros anteriores a la migración 0008 podían guardar el JSON como texto (json.dumps)
+            if isinstance(field, str):
+                try:
+                    return json.loads(field)
+                except ValueError:
+                    return field
+            return field or []
+
+        return {
+            "high_risk_warnings": value(self.high_risk_warnings),
+            "call_motives": value(self.call_motives),
+            "motivos": value(self.motives),
+            "acciones_agente": value(self.agent_actions),
+        }
+
+    def __str__(self):
+        return f"Llamada {self.id} - {self.created_at.strftime('%Y-%m-%d')}"
+
+class AnalysisBatch(models.Model):
+    """
+    Análisis de todas las grabaciones de un rango de fechas (y opcionalmente una cola) de Sharpen.
+    `recordings` es la lista obtenida del CDR al crear el lote y `next_index` el cursor de lo ya
+    programado, así el lote se puede reanudar sin repetir llamadas. Como mucho `concurrency`
+    trabajos del lote están en curso a la vez (ver batches.advance_batch).
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    date_from = models.DateField()
+    date_to = models.DateField()
+    queue = models.CharField(max_length=255, blank=True)
+    lang = models.CharField(max_length=10, default='en')
+    concurrency = models.PositiveSmallIntegerField(default=2)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    error = models.TextField(blank=True)
+    recordings = models.JSONField(default=list)  # [{"uniqueID", "mixmonFileName"}]
+    next_index = models.PositiveIntegerField(default=0)
+    retry_queue = models.JSONField(default=list)  # grabaciones fallidas que se vuelven a programar al reanudar
+    skipped = models.PositiveIntegerField(default=0)  # ya analizadas o en curso fuera del lote
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def _recordings_by_status(self) -> dict:
+        """uniqueIDs del lote por estado de sus trabajos (una grabación reintentada tiene varios)."""
+        by_status = {status: set() for status, _ in TranscriptionJob.STATUS_CHOICES}
+        for unique_id, status in self.jobs.values_list('unique_id', 'status'):
+            by_status[status].add(unique_id)
+        return by_status
+
+    def failed_unique_ids(self) -> set:
+        """Grabaciones cuyo último intento falló (sin otro trabajo terminado o en curso)."""
+        by_status = self._recordings_by_status()
+        resolved = by_status[TranscriptionJob.DONE] | by_status[TranscriptionJob.QUEUED] | by_status[TranscriptionJob.RUNNING]
+        return by_status[TranscriptionJob.FAILED] - resolved
+
+    def progress(self) -> dict:
+        by_status = self._recordings_by_status()
+        running = by_status[TranscriptionJob.QUEUED] | by_status[TranscriptionJob.RUNNING]
+        done = len(by_status[TranscriptionJob.DONE])
+        failed = len(by_status[TranscriptionJob.FAILED] - by_status[TranscriptionJob.DONE] - running)
+        end = self.finished_at or timezone.now()
+        hours = (end - self.started_at).total_seconds() / 3600 if self.started_at else 0
+        return {
+            "total": len(self.recordings),
+            "scheduled": self.next_index,
+            "skipped": self.skipped,
+            "running": len(running),
+            "done": done,
+            "failed": failed,
+            "retrying": len(self.retry_queue),
+            "recordingsPerHour": round(done / hours, 1) if hours else None,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "batchId": str(self.id),
+            "status": self.status,
+            "dateFrom": self.date_from.isoformat(),
+            "dateTo": self.date_to.isoformat(),
+            "queue": self.queue or None,
+            "lang": self.lang,
+            "concurrency": self.concurrency,
+            "error": self.error or None,
+            **self.progress(),
+            "createdAt": self.created_at.isoformat() if self.created_at else None,
+            "startedAt": self.started_at.isoformat() if self.started_at else None,
+            "finishedAt": self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+    def __str__(self):
+        return f"Lote {self.id} ({self.status}) - {self.date_from} a {self.date_to}"
+
+class TranscriptionJob(models.Model):
+    """
+    Análisis de una grabación de Sharpen ejecutado en segundo plano (cola `transcription` de Celery):
+    descarga → decodificación + transcripción → análisis → guardado en CallAnalysis.
+    """
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE_STATUSES = (QUEUED, RUNNING)
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    unique_id = models.CharField(max_length=255)
+    mixmon_file_name = models.CharField(max_length=255)
+    lang = models.CharField(max_length=10, default='en')
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    stage = models.CharField(max_length=20, blank=True)  # download, transcribe, analyze, persist
+    error = models.TextField(blank=True)
+    result = models.JSONField(blank=True, null=True)
+    analysis = models.ForeignKey(CallAnalysis, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    requested_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True)
+    # Usuarios que pidieron la misma llamada mientras el trabajo estaba en curso (ver enqueue_analysis_job)
+    subscribers = models.ManyToManyField(settings.AUTH_USER_MODEL, blank=True, related_name='subscribed_transcription_jobs')
+    batch = models.ForeignKey(AnalysisBatch, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            # Un solo trabajo en curso por llamada e idioma: las peticiones repetidas se unen a él
+            models.UniqueConstraint(
+                fields=['unique_id', 'lang'],
+                condition=models.Q(status__in=['queued', 'running']),
+                name='unique_active_transcription_job',
+            ),
+        ]
+
+    def to_dict(self) -> dict:
+        return {
+            "jobId": str(self.id),
+            "status": self.status,
+            "stage": self.stage,
+            "uniqueID": self.unique_id,
+            "lang": self.lang,
+            "batchId": str(self.batch_id) if self.batch_id else None,
+            "error": self.error or None,
+            "result": self.result,
+            "createdAt": self.created_at.isoformat() if self.created_at else None,
+            "startedAt": self.started_at.isoformat() if self.started_at else None,
+            "finishedAt": self.finished_at.isoformat() if self.finished_at else None,
+        }
 
     def __str__(self):
-        return f"Llamada {self.id} - {self.created_at.strftime('%Y-%m-%d')}"
\ No newline at end of file
+        return f"Job {self.id} ({self.status}) - {self.unique_id}"
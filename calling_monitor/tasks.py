@@ -0,0 +1,149 @@
+# calling_monitor/tasks.py
+import hashlib
+import logging
+
+import requests
+from celery import shared_task
+from django.utils import timezone
+
+from dashboards.recording_cache import recording_cache
+from dashboards.views import get_sharpen_audio_url
+from .jobs import notify_job_update
+from .models import CallAnalysis, TranscriptionJob
+from .utils.analyzer import extract_information
+from .utils.audio_helper import iter_audio_response, open_audio_response
+from .utils.audio_stream import iter_mmap_chunks
+from .utils.stereo_transcriber import strip_speaker_labels
+from .utils.transcriber import transcribe_recording
+
+logger = logging.getLogger(__name__)
+
+
+def _hashing(chunks, digest):
+    """Pasa los bloques sin cambios mientras calcula el hash del audio descargado."""
+    for chunk in chunks:
+        digest.update(chunk)
+        yield chunk
+
+
+def _open_recording(job: TranscriptionJob):
+    """
+    Abre la descarga de la grabación del trabajo. La URL puede venir de la caché de URLs
+    presignadas; si S3 la rechaza (403) se pide una nueva a Sharpen y se reintenta una vez.
+    """
+    audio_url = get_sharpen_audio_url(job.mixmon_file_name, job.unique_id)
+    if not audio_url:
+        raise ValueError("No se pudo obtener la URL de audio de Sharpen")
+    try:
+        return open_audio_response(audio_url)
+    except requests.HTTPError as e:
+        if e.response is None or e.response.status_code != 403:
+            raise
+    logger.warning(f"S3 rechazó (403) la URL de audio de {job.unique_id}. Se solicita una nueva.")
+    audio_url = get_sharpen_audio_url(job.mixmon_file_name, job.unique_id, refresh=True)
+    if not audio_url:
+        raise ValueError("No se pudo renovar la URL de audio de Sharpen")
+    return open_audio_response(audio_url)
+
+
+def _recording_chunks(job: TranscriptionJob):
+    """
+    Bloques de la grabación del trabajo: de la caché en disco (por mmap) si ya se descargó,
+    o de S3, guardándola en la caché a medida que llega para la próxima reproducción/análisis.
+    """
+    cached = recording_cache.get(job.mixmon_file_name, job.unique_id)
+    if cached:
+        logger.info(f"Grabación de {job.unique_id} leída de la caché local ({cached.size / 1024 ** 2:.1f} MB).")
+        return iter_mmap_chunks(cached.path)
+
+    audio_response = _open_recording(job)
+    content_length = audio_response.headers.get("Content-Length", "")
+    return recording_cache.tee(
+        iter_audio_response(audio_response),
+        job.mixmon_file_name, job.unique_id,
+        content_type=audio_response.headers.get("Content-Type", "audio/wav"),
+        expected_size=int(content_length) if content_length.isdigit() else None,
+    )
+
+
+def _set_stage(job: TranscriptionJob, stage: str) -> None:
+    job.stage = stage
+    job.save(update_fields=['stage'])
+    notify_job_update(job)
+
+
+@shared_task(acks_late=True)
+def run_transcription_job(job_id: str):
+    """
+    Descarga → transcripción → análisis → guardado de una grabación de Sharpen.
+    Corre en la cola `transcription` (CELERY_TASK_ROUTES) para no competir con el broadcast en vivo.
+    """
+    try:
+        job = TranscriptionJob.objects.get(pk=job_id)
+    except TranscriptionJob.DoesNotExist:
+        logger.error(f"Trabajo de análisis {job_id} no encontrado.")
+        return
+    if job.status == TranscriptionJob.DONE:
+        # acks_late: una entrega repetida tras reiniciar el worker no repite el trabajo
+        return
+
+    job.status = TranscriptionJob.RUNNING
+    job.started_at = timezone.now()
+    job.error = ''
+    job.save(update_fields=['status', 'started_at', 'error'])
+
+    try:
+        _set_stage(job, 'download')
+        audio_chunks = _recording_chunks(job)
+
+        # La descarga continúa mientras se transcribe (HTTP → ffmpeg → Vosk en streaming)
+        _set_stage(job, 'transcribe')
+        # Estéreo → frases por hablante; mono → segmentos en paralelo (TRANSCRIBE_PARALLEL) o un reconocedor
+        audio_digest = hashlib.sha256()
+        transcription = transcribe_recording(_hashing(audio_chunks, audio_digest), job.lang)
+        transcription_text = transcription.pop("text")
+
+        _set_stage(job, 'analyze')
+        # Con canales separados el analizador recibe las frases sin las etiquetas de hablante
+        # (reanalyze_calls aplica lo mismo al `transcript` guardado)
+        analysis_text = strip_speaker_labels(transcription_text)
+        analysis = extract_information(analysis_text, lang=job.lang)
+
+        _set_stage(job, 'persist')
+        instance, _ = CallAnalysis.objects.update_or_create(
+            unique_id=job.unique_id,
+            language_used=job.lang,
+            defaults={
+                "audio_file": None,
+                "transcript": transcription_text,
+                "high_risk_warnings": analysis.get("high_risk_warnings", []),
+                "call_motives": analysis.get("call_motives", []),
+                "motives": analysis.get("motivos", []),
+                "agent_actions": analysis.get("acciones_agente", []),
+                "audio_sha256": audio_digest.hexdigest(),
+            },
+        )
+
+        job.analysis = instance
+        job.result = {"transcription": transcription_text, "analysis": analysis, **transcription}
+        job.status = TranscriptionJob.DONE
+        logger.info(f"Trabajo de análisis {job.id} completado para {job.unique_id} (CallAnalysis {instance.id}).")
+    except Exception as e:
+        logger.error(f"Error en el trabajo de análisis {job.id} ({job.stage}) para {job.unique_id}: {e}", exc_info=True)
+        job.status = TranscriptionJob.FAILED
+        job.error = str(e)
+
+    job.finished_at = timezone.now()
+    job.save(update_fields=['analysis', 'result', 'status', 'error', 'finished_at'])
+    notify_job_update(job)
+    if job.batch_id:
+        # Libera un lugar del lote: programar la siguiente grabación
+        advance_analysis_batch.delay(str(job.batch_id))
+
+
+@shared_task
+def advance_analysis_batch(batch_id: str):
+    """Programa los siguientes trabajos de un lote (cola por defecto, no la de transcripción)."""
+    from .batches import advance_batch
+
+    advance_batch(batch_id)
@@ -1,3 +1,258 @@
-from django.test import TestCase
+import io
+import os
+import struct
+import sys
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import SimpleTestCase, override_settings
+
+from .batches import batch_concurrency
+from .utils.audio_stream import AudioDecodeError, decode_to_pcm, iter_file_chunks
+from .utils.grammar import (
+    LanguageToolPool, _utf16_to_index, apply_corrections, batch_sentences, match_context, split_sentences,
+)
+from .utils.parallel_transcriber import SilenceSegmenter
+from .utils.stereo_transcriber import SPEAKER_LABELS, strip_speaker_labels, wav_channels
+
+FRAME_BYTES = 960  # 30 ms de PCM s16le mono a 16 kHz
+
+
+def pcm_frames(loud: bool, frames: int) -> bytes:
+    sample = struct.pack("<h", 10000 if loud else 0)
+    return sample * (FRAME_BYTES // 2) * frames
+
+
+class SilenceSegmenterTests(SimpleTestCase):
+    def segmenter(self):
+        # 1 s objetivo (32000 bytes), corte forzado a 2 s, silencio mínimo de 10 bloques
+        return SilenceSegmenter(segment_seconds=1, silence_db=-40, min_silence_ms=300)
+
+    def test_corta_a_la_mitad_del_silencio(self):
+        pcm = pcm_frames(True, 50) + pcm_frames(False, 20) + pcm_frames(True, 30)
+        segments = list(self.segmenter().segments([pcm]))
+
+        self.assertEqual([start for start, _ in segments], [0, 55 * FRAME_BYTES])
+        self.assertEqual(b"".join(data for _, data in segments), pcm)
+        # El primer segmento termina dentro del silencio
+        self.assertTrue(segments[0][1].endswith(pcm_frames(False, 5)))
+
+    def test_sin_silencio_corta_al_doble_del_objetivo(self):
+        segmenter = self.segmenter()
+        pcm = pcm_frames(True, 150)
+        segments = list(segmenter.segments([pcm]))
+
+        self.assertEqual(b"".join(data for _, data in segments), pcm)
+        for _, data in segments[:-1]:
+            self.assertGreaterEqual(len(data), segmenter.max_bytes)
+            self.assertLess(len(data), segmenter.max_bytes + FRAME_BYTES)
+
+    def test_bloques_desalineados_dan_los_mismos_segmentos(self):
+        pcm = pcm_frames(True, 50) + pcm_frames(False, 20) + pcm_frames(True, 30) + b"\x01\x00" * 7
+        chunks = [pcm[offset:offset + 1000] for offset in range(0, len(pcm), 1000)]
+
+        self.assertEqual(list(self.segmenter().segments(chunks)), list(self.segmenter().segments([pcm])))
+
+    def test_audio_vacio_no_produce_segmentos(self):
+        self.assertEqual(list(self.segmenter().segments([])), [])
+
+    def test_seconds(self):
+        self.assertEqual(self.segmenter().seconds(32000), 1.0)
+
+
+def wav_header(channels: int, extra_chunk: bytes = b"") -> bytes:
+    fmt = struct.pack("<HHIIHH", 1, channels, 8000, 8000 * channels * 2, channels * 2, 16)
+    body = b"WAVE" + extra_chunk + b"fmt " + struct.pack("<I", len(fmt)) + fmt + b"data" + struct.pack("<I", 0)
+    return b"RIFF" + struct.pack("<I", len(body)) + body
+
+
+class WavChannelsTests(SimpleTestCase):
+    def test_mono_y_estereo(self):
+        self.assertEqual(wav_channels(wav_header(1)), 1)
+        self.assertEqual(wav_channels(wav_header(2)), 2)
+
+    def test_salta_chunks_antes_de_fmt(self):
+        # Chunk LIST de tamaño impar: lleva un byte de relleno
+        extra = b"LIST" + struct.pack("<I", 5) + b"abcde" + b"\x00"
+        self.assertEqual(wav_channels(wav_header(2, extra)), 2)
+
+    def test_no_wav_o_cabecera_incompleta(self):
+        self.assertIsNone(wav_channels(b"ID3\x04" + b"\x00" * 40))
+        self.assertIsNone(wav_channels(wav_header(2)[:20]))
+        self.assertIsNone(wav_channels(b""))
+
+
+class StripSpeakerLabelsTests(SimpleTestCase):
+    def test_quita_las_etiquetas_de_una_transcripcion_estereo(self):
+        transcript = f"{SPEAKER_LABELS['agent']}: hola buenos días\n{SPEAKER_LABELS['caller']}: necesito una cita"
+        self.assertEqual(strip_speaker_labels(transcript), "hola buenos días necesito una cita")
+
+    def test_transcripcion_mono_queda_igual(self):
+        self.assertEqual(strip_speaker_labels("hola agente: buenos días"), "hola agente: buenos días")
+
+
+@override_settings(TRANSCRIBE_BATCH_CONCURRENCY=2, TRANSCRIBE_BATCH_MAX_CONCURRENCY=4)
+class BatchConcurrencyTests(SimpleTestCase):
+    def test_sin_valor_usa_el_de_settings(self):
+        self.assertEqual(batch_concurrency(None), 2)
+
+    def test_respeta_el_pedido_hasta_el_maximo(self):
+        self.assertEqual(batch_concurrency(3), 3)
+        self.assertEqual(batch_concurrency(50), 4)
+
+    def test_cero_o_negativo_es_error(self):
+        for value in (0, -1):
+            with self.assertRaises(ValueError):
+                batch_concurrency(value)
+
+
+class SplitSentencesTests(SimpleTestCase):
+    def test_offsets_apuntan_a_cada_oracion(self):
+        text = "Hola.  ¿Cómo estás? Bien\nAdiós"
+        sentences = split_sentences(text)
+
+        self.assertEqual(sentences, [(0, "Hola."), (7, "¿Cómo estás?"), (20, "Bien"), (25, "Adiós")])
+        for offset, sentence in sentences:
+            self.assertEqual(text[offset:offset + len(sentence)], sentence)
+
+    def test_punto_sin_espacio_no_corta(self):
+        self.assertEqual(split_sentences("  v1.5 es la versión... ok  "), [(2, "v1.5 es la versión..."), (24, "ok")])
+
+    def test_texto_en_blanco(self):
+        self.assertEqual(split_sentences(" \n "), [])
+
+
+class Utf16ToIndexTests(SimpleTestCase):
+    def test_ascii_no_cambia(self):
+        self.assertEqual(_utf16_to_index("abc", 2), 2)
+
+    def test_emoji_ocupa_dos_unidades(self):
+        text = "😀 ab"
+        self.assertEqual(_utf16_to_index(text, 2), 1)
+        self.assertEqual(_utf16_to_index(text, 3), 2)
+        self.assertEqual(_utf16_to_index(text, 99), len(text))
+
+    def test_acentos_ocupan_una_unidad(self):
+        self.assertEqual(_utf16_to_index("está bien", 5), 5)
+
+
+class ApplyCorrectionsTests(SimpleTestCase):
+    def test_aplica_la_primera_sugerencia_en_orden(self):
+        suggestions = [
+            {"offset": 8, "length": 4, "suggestions": ["bien", "vien"]},
+            {"offset": 0, "length": 4, "suggestions": ["Esto"]},
+        ]
+        self.assertEqual(apply_corrections("esto es vien", suggestions), "Esto es bien")
+
+    def test_omite_solapes_y_matches_sin_sugerencias(self):
+        suggestions = [
+            {"offset": 0, "length": 4, "suggestions": ["Esto"]},
+            {"offset": 2, "length": 4, "suggestions": ["X"]},
+            {"offset": 5, "length": 2, "suggestions": []},
+        ]
+        self.assertEqual(apply_corrections("esto es", suggestions), "Esto es")
+
+
+class BatchSentencesTests(SimpleTestCase):
+    def test_agrupa_sin_pasar_el_limite(self):
+        sentences = ["a" * 200, "b" * 200, "c" * 200, "d" * 600, "e"]
+        self.assertEqual(
+            batch_sentences(sentences, 500),
+            [["a" * 200, "b" * 200], ["c" * 200], ["d" * 600], ["e"]],
+        )
+
+    def test_cuenta_el_separador(self):
+        # 249 + 2 + 249 = 500 entra justo; 250 + 2 + 250 ya no
+        self.assertEqual(len(batch_sentences(["x" * 249, "y" * 249], 500)), 1)
+        self.assertEqual(len(batch_sentences(["x" * 250, "y" * 250], 500)), 2)
+
+    def test_cuenta_unidades_utf16(self):
+        self.assertEqual(len(batch_sentences(["😀" * 125, "y"], 250)), 2)
+
+
+class GrammarBatchTests(SimpleTestCase):
+    def pool(self, matches):
+        pool = LanguageToolPool("es", size=1)
+        pool._check_text = lambda text: matches(text)
+        return pool
+
+    def test_reparte_matches_con_contexto_de_su_oracion(self):
+        sentences = ["Primera oracion bien.", "Esto es vien."]
+
+        def matches(joined):
+            offset = joined.index("vien")
+            return [SimpleNamespace(
+                offset=offset, errorLength=4, context=joined, message="Ortografía",
+                replacements=["bien"], ruleId="MORFOLOGIK",
+            )]
+
+        results = self.pool(matches)._check_sentences(sentences)
+
+        self.assertEqual(results["Primera oracion bien."], [])
+        [match] = results["Esto es vien."]
+        self.assertEqual((match["offset"], match["length"]), (8, 4))
+        # Sin texto de la oración vecina, que queda en caché con esta
+        self.assertEqual(match["error"], "Esto es vien.")
+
+    def test_un_pedido_por_lote(self):
+        requests = []
+
+        def matches(joined):
+            requests.append(joined)
+            return []
+
+        self.pool(matches)._check_sentences(["a" * 300, "b" * 300])
+        self.assertEqual(requests, ["a" * 300, "b" * 300])
+
+
+class MatchContextTests(SimpleTestCase):
+    def test_recorta_con_puntos_suspensivos(self):
+        self.assertEqual(match_context("Hola mundo esto es una prueba", 5, 5, chars=3), "...la mundo es...")
+
+    def test_oracion_corta_completa(self):
+        self.assertEqual(match_context("Esto es vien.", 8, 4), "Esto es vien.")
+
+
+# Reemplaza a ffmpeg en las pruebas de decode_to_pcm: copia stdin a stdout
+PIPE_COMMAND = [sys.executable, "-c", "import shutil, sys; shutil.copyfileobj(sys.stdin.buffer, sys.stdout.buffer)"]
+FAILING_COMMAND = [sys.executable, "-c", "import sys; sys.stdin.buffer.read(); sys.stderr.write('formato inválido'); sys.exit(1)"]
+
+
+class IterFileChunksTests(SimpleTestCase):
+    def test_ruta_y_archivo_abierto_desde_el_inicio(self):
+        data = os.urandom(10000)
+        with tempfile.NamedTemporaryFile(delete=False) as f:
+            f.write(data)
+        self.addCleanup(os.remove, f.name)
+
+        self.assertEqual(list(iter_file_chunks(f.name, chunk_size=4096)), [data[:4096], data[4096:8192], data[8192:]])
+        buffer = io.BytesIO(data)
+        buffer.read(500)
+        self.assertEqual(b"".join(iter_file_chunks(buffer, chunk_size=4096)), data)
+
+
+class DecodeToPcmTests(SimpleTestCase):
+    def decode(self, command, source_chunks, **kwargs):
+        with mock.patch("calling_monitor.utils.audio_stream.ffmpeg_pcm_command", return_value=command):
+            return list(decode_to_pcm(source_chunks, **kwargs))
+
+    def test_entrega_bloques_del_tamano_pedido(self):
+        # Más que los buffers de los pipes: stdin y stdout deben avanzar a la vez
+        data = os.urandom(1024 * 1024 + 123)
+        chunks = self.decode(PIPE_COMMAND, (data[i:i + 65536] for i in range(0, len(data), 65536)), chunk_bytes=8000)
+
+        self.assertEqual(b"".join(chunks), data)
+        self.assertTrue(all(len(chunk) == 8000 for chunk in chunks[:-1]))
+
+    def test_error_de_ffmpeg(self):
+        with self.assertRaisesMessage(AudioDecodeError, "formato inválido"):
+            self.decode(FAILING_COMMAND, [b"no es audio"])
+
+    def test_error_del_origen_se_propaga(self):
+        def broken_download():
+            yield b"x" * 1000
+            raise OSError("conexión cortada")
+
+        with self.assertRaisesMessage(OSError, "conexión cortada"):
+            self.decode(PIPE_COMMAND, broken_download())
@@ -1,9 +1,15 @@
 #calling_monitor/urls.py
 from django.urls import path
-from .views import process_call, grammar_correction2, analyze_sharpen_audio
+from .views import (
+    process_call, grammar_correction2, analyze_sharpen_audio, transcription_job_status,
+    analysis_batches, analysis_batch_status,
+)
 
 urlpatterns = [
     path('process_call/', process_call, name='grammar_correction'),
     path('correct-grammar2/', grammar_correction2, name='grammar_correction2'),
     path('analyze_remote_audio/', analyze_sharpen_audio, name='analyze_remote_audio'),
+    path('analyze_remote_audio/jobs/<uuid:job_id>/', transcription_job_status, name='transcription_job_status'),
+    path('analyze_remote_audio/batches/', analysis_batches, name='analysis_batches'),
+    path('analyze_remote_audio/batches/<uuid:batch_id>/', analysis_batch_status, name='analysis_batch_status'),
 ]
@@ -1,12 +1,35 @@
 # calling_monitor/utils/analyzer.py
-import spacy
+"""
+Análisis de transcripciones: advertencias de alto riesgo y motivos de la llamada.
+
+Las reglas viven en un archivo JSON (`settings.ANALYZER_RULES_PATH`, por defecto
+analyzer_rules.json junto a este módulo): por idioma, una lista de `risks` (`label`, `warning`,
+`lemmas` de una palabra y `phrases` de varias) y una de `motives` (`motive` y `lemmas`).
+Agregar una categoría es editar ese archivo y reiniciar el proceso.
+
+Las reglas se compilan una vez por idioma (`get_call_analyzer`): un índice lema → categorías y
+un PhraseMatcher para las frases. Cada transcripción se recorre una sola vez.
+Para muchas transcripciones (p. ej. `manage.py reanalyze_calls`) usar `extract_information_batch`.
+"""
+import json
 import logging
-from spacy.matcher import Matcher # Importamos Matcher para detección de patrones más avanzada
+from django.conf import settings
+
+from gvhc.lazy_imports import lazy_import
 
 logger = logging.getLogger(__name__)
 
+# spaCy se importa en el primer análisis, no al importar las vistas o las tareas
+spacy = lazy_import("spacy")
+spacy_matcher = lazy_import("spacy.matcher")
+
+NO_RISK_WARNING = "No se detectaron advertencias de alto riesgo."
+UNCLASSIFIED_MOTIVE = "No clasificado"
+
 # Cache de modelos Spacy
 _nlp_models = {}
+# Reglas compiladas por idioma
+_call_analyzers = {}
 
 def get_spacy_model(lang: str):
     """
@@ -21,168 +44,123 @@ def get_spacy_model(lang: str):
         raise ValueError(f"Idioma no soportado para modelo Spacy: {lang}. Elige 'es' o 'en'.")
 
     if model_name not in _nlp_models:
-        logger.info(f"Cargando modelo Spacy: {model_name}...")
+        # El análisis sólo usa lemas (tagger/morphologizer + lemmatizer); el parser y NER no se cargan
+        exclude = settings.ANALYZER_SPACY_EXCLUDE
+        logger.info(f"Cargando modelo Spacy: {model_name} (sin {', '.join(exclude) or 'nada'})...")
         try:
-            nlp = spacy.load(model_name)
+            nlp = spacy.load(model_name, exclude=exclude)
             _nlp_models[model_name] = nlp
-            logger.info(f"Modelo Spacy {model_name} cargado y cacheado exitosamente.")
+            logger.info(f"Modelo Spacy {model_name} cargado y cacheado exitosamente. Componentes: {nlp.pipe_names}")
         except OSError:
             logger.error(f"Modelo Spacy {model_name} no encontrado. Intentando descargar...")
             spacy.cli.download(model_name)
-            nlp = spacy.load(model_name)
+            nlp = spacy.load(model_name, exclude=exclude)
             _nlp_models[model_name] = nlp
             logger.info(f"Modelo Spacy {model_name} descargado y cargado.")
     return _nlp_models[model_name]
 
 
+class CallAnalyzer:
+    """Reglas de un idioma compiladas sobre el vocabulario de su modelo Spacy."""
+
+    def __init__(self, nlp, rules: dict):
+        self.nlp = nlp
+        self.warnings = {}  # label -> texto de la advertencia
+        self.risk_labels_by_lemma = {}  # lema -> [labels]
+        self.motives_by_lemma = {}  # lema -> [motivos]
+        # Frases de varias palabras, sin distinguir mayúsculas
+        self.phrase_matcher = spacy_matcher.PhraseMatcher(nlp.vocab, attr="LOWER")
+
+        for risk in rules.get("risks", []):
+            label = risk["label"]
+            self.warnings[label] = risk["warning"]
+            for lemma in risk.get("lemmas", []):
+                self.risk_labels_by_lemma.setdefault(lemma, []).append(label)
+            if risk.get("phrases"):
+                self.phrase_matcher.add(label, [nlp.make_doc(phrase) for phrase in risk["phrases"]])
+
+        # Los motivos se devuelven en el orden del archivo de reglas
+        self.motive_order = [motive["motive"] for motive in rules.get("motives", [])]
+        for motive in rules.get("motives", []):
+            for lemma in motive.get("lemmas", []):
+                self.motives_by_lemma.setdefault(lemma, []).append(motive["motive"])
+
+    def _warning(self, label: str, text: str) -> str:
+        return f"Advertencia: {self.warnings[label]} detectada ({text})"
+
+    def analyze(self, doc) -> dict:
+        """Resultado de `extract_information` para un Doc ya procesado."""
+        detected_risks = {}  # dict como set ordenado
+        lemmas = set()
+        for token in doc:
+            lemma = token.lemma_
+            lemmas.add(lemma)
+            for label in self.risk_labels_by_lemma.get(lemma, ()):
+                detected_risks[self._warning(label, token.text)] = None
+
+        for match_id, start, end in self.phrase_matcher(doc):
+            detected_risks[self._warning(self.nlp.vocab.strings[match_id], doc[start:end].text)] = None
+
+        detected_motives = set()
+        for lemma in lemmas.intersection(self.motives_by_lemma):
+            detected_motives.update(self.motives_by_lemma[lemma])
+
+        high_risk_warnings = list(detected_risks) or [NO_RISK_WARNING]
+        call_motives = [motive for motive in self.motive_order if motive in detected_motives] or [UNCLASSIFIED_MOTIVE]
+
+        logger.debug(f"Análisis completado. Advertencias de riesgo: {high_risk_warnings}, Motivos de llamada: {call_motives}")
+        return {
+            "high_risk_warnings": high_risk_warnings,
+            "call_motives": call_motives,
+            "motivos": ["Análisis de motivos del cliente más detallado aquí."], # Si son diferentes a call_motives
+            "acciones_agente": ["Análisis de acciones del agente aquí."], # Si necesitas esto separado
+        }
+
+
+def load_analyzer_rules(lang: str) -> dict:
+    with open(settings.ANALYZER_RULES_PATH, encoding="utf-8") as f:
+        rules = json.load(f)
+    if lang not in rules:
+        logger.warning(f"No hay reglas de análisis para el idioma '{lang}' en {settings.ANALYZER_RULES_PATH}.")
+    return rules.get(lang, {})
+
+
+def get_call_analyzer(lang: str) -> CallAnalyzer:
+    """Analizador compilado del idioma (se crea en el primer uso y queda cacheado)."""
+    analyzer = _call_analyzers.get(lang)
+    if analyzer is None:
+        analyzer = CallAnalyzer(get_spacy_model(lang), load_analyzer_rules(lang))
+        _call_analyzers[lang] = analyzer
+        logger.info(f"Reglas de análisis compiladas para '{lang}'.")
+    return analyzer
+
+
 def extract_information(transcript: str, lang: str = "es") -> dict:
     """
     Analiza la transcripción utilizando Spacy para detectar situaciones de alto riesgo
     y clasificar el motivo de la llamada.
     """
     logger.debug(f"Iniciando análisis para idioma: {lang} con longitud de transcripción: {len(transcript)}")
-    nlp = get_spacy_model(lang)
-    doc = nlp(transcript) # Procesar la transcripción con Spacy
-
-    # Inicializar resultados
-    high_risk_warnings = []
-    call_motives = ["No clasificado"] # Por defecto, si no se detecta nada específico
-
-    # --- Detección de Palabras Clave de Alto Riesgo ---
-    # Usaremos un Matcher para patrones más robustos que simples palabras clave
-    # Puedes añadir más patrones según tus necesidades.
+    analyzer = get_call_analyzer(lang)
+    return analyzer.analyze(analyzer.nlp(transcript))
 
-    matcher = Matcher(nlp.vocab)
 
-    # Patrones para Detección de Alto Riesgo (Español)
-    if lang == "es":
-        # Violencia/Amenazas
-        matcher.add("RIESGO_VIOLENCIA", [
-            [{"LEMMA": {"IN": ["amenazar", "agredir", "golpear", "matar"]}}],
-            [{"LOWER": "me"}, {"LOWER": "va"}, {"LOWER": "a"}, {"LOWER": "matar"}],
-            [{"LOWER": "te"}, {"LOWER": "voy"}, {"LOWER": "a"}, {"LOWER": "denunciar"}] # A veces una amenaza, dependiendo del contexto
-        ])
-        # Emergencias/Salud
-        matcher.add("RIESGO_EMERGENCIA", [
-            [{"LEMMA": {"IN": ["emergencia", "ayuda", "hospital", "ambulancia", "médico", "urgencia"]}}],
-            [{"LOWER": "no"}, {"LOWER": "puedo"}, {"LOWER": "respirar"}],
-            [{"LOWER": "necesito"}, {"LOWER": "ayuda"}, {"LOWER": "urgente"}]
-        ])
-        # Fraude/Estafa
-        matcher.add("RIESGO_FRAUDE", [
-            [{"LEMMA": {"IN": ["fraude", "estafa", "robo", "engañar", "extorsión"]}}],
-            [{"LOWER": "me"}, {"LOWER": "robaron"}, {"LOWER": "mis"}, {"LOWER": "datos"}],
-            [{"LOWER": "estafa"}, {"LOWER": "telefónica"}]
-        ])
-        # Suicidio/Crisis Mental
-        matcher.add("RIESGO_CRISIS", [
-            [{"LEMMA": {"IN": ["suicidio", "deprimido", "vida", "matarme", "ya no puedo", "cuchillo", "pistola"]}}],
-            [{"LOWER": "no"}, {"LOWER": "quiero"}, {"LOWER": "vivir"}]
-        ])
-        # Cliente muy molesto/agresivo (podría necesitar NER para detectar insultos)
-        # Esto es más complejo y quizás requiera un modelo de clasificación de sentimiento o un enfoque de reglas más sofisticado.
-        # Por ahora, nos quedamos con palabras clave explícitas.
-        # Ejemplo: "insultos", "groserías" -- puedes añadir palabras específicas si sabes cuáles buscar
-
-    # Patrones para Detección de Alto Riesgo (Inglés)
-    elif lang == "en":
-        # Violence/Threats
-        matcher.add("HIGH_RISK_VIOLENCE", [
-            [{"LEMMA": {"IN": ["threaten", "assault", "hit", "kill"]}}],
-            [{"LOWER": "i'm"}, {"LOWER": "going"}, {"LOWER": "to"}, {"LOWER": "kill"}, {"LOWER": "you"}],
-            [{"LOWER": "i'm"}, {"LOWER": "reporting"}, {"LOWER": "you"}]
-        ])
-        # Emergencies/Health
-        matcher.add("HIGH_RISK_EMERGENCY", [
-            [{"LEMMA": {"IN": ["emergency", "help", "hospital", "ambulance", "doctor", "urgent"]}}],
-            [{"LOWER": "i"}, {"LOWER": "can't"}, {"LOWER": "breathe"}],
-            [{"LOWER": "i"}, {"LOWER": "need"}, {"LOWER": "urgent"}, {"LOWER": "help"}]
-        ])
-        # Fraud/Scam
-        matcher.add("HIGH_RISK_FRAUD", [
-            [{"LEMMA": {"IN": ["fraud", "scam", "theft", "deceive", "extortion"]}}],
-            [{"LOWER": "my"}, {"LOWER": "data"}, {"LOWER": "was"}, {"LOWER": "stolen"}],
-            [{"LOWER": "phone"}, {"LOWER": "scam"}]
-        ])
-        # Suicide/Mental Crisis
-        matcher.add("HIGH_RISK_CRISIS", [
-            [{"LEMMA": {"IN": ["suicide", "depressed", "life", "kill myself", "can't go on", "knife", "gun"]}}],
-            [{"LOWER": "i"}, {"LOWER": "don't"}, {"LOWER": "want"}, {"LOWER": "to"}, {"LOWER": "live"}]
-        ])
-
-    matches = matcher(doc)
-    detected_risks = set() # Usar un set para evitar duplicados
-
-    for match_id, start, end in matches:
-        span = doc[start:end]
-        if nlp.vocab.strings[match_id] == "RIESGO_VIOLENCIA" or nlp.vocab.strings[match_id] == "HIGH_RISK_VIOLENCE":
-            detected_risks.add(f"Advertencia: Violencia/Amenaza detectada ({span.text})")
-        elif nlp.vocab.strings[match_id] == "RIESGO_EMERGENCIA" or nlp.vocab.strings[match_id] == "HIGH_RISK_EMERGENCY":
-            detected_risks.add(f"Advertencia: Emergencia/Salud detectada ({span.text})")
-        elif nlp.vocab.strings[match_id] == "RIESGO_FRAUDE" or nlp.vocab.strings[match_id] == "HIGH_RISK_FRAUDE":
-            detected_risks.add(f"Advertencia: Fraude/Estafa detectada ({span.text})")
-        elif nlp.vocab.strings[match_id] == "RIESGO_CRISIS" or nlp.vocab.strings[match_id] == "HIGH_RISK_CRISIS":
-            detected_risks.add(f"Advertencia: Crisis mental/suicidio detectada ({span.text})")
-        # Añade más condiciones aquí para otros tipos de riesgo
-
-    high_risk_warnings = list(detected_risks)
-    if not high_risk_warnings:
-        high_risk_warnings.append("No se detectaron advertencias de alto riesgo.")
-
-    # --- Clasificación del Motivo de la Llamada ---
-    # Esto también se puede hacer con reglas o un clasificador si hay muchos motivos.
-    # Usaremos LEMMA (forma base de la palabra) para ser más robustos.
-
-    call_motives_detected = set() # Usar un set para evitar duplicados
-
-    # Español
-    if lang == "es":
-        # Pedir información
-        if any(lemma in [token.lemma_ for token in doc] for lemma in ["información", "saber", "consulta", "duda"]):
-            call_motives_detected.add("Pedir información")
-        # Agendar cita
-        if any(lemma in [token.lemma_ for token in doc] for lemma in ["agendar", "cita", "programar"]):
-            call_motives_detected.add("Agendar cita")
-        # Cancelar cita
-        if any(lemma in [token.lemma_ for token in doc] for lemma in ["cancelar", "anular", "baja"]):
-            call_motives_detected.add("Cancelar cita")
-        # Reagendar cita
-        if any(lemma in [token.lemma_ for token in doc] for lemma in ["reagendar", "cambiar", "mover"]):
-            call_motives_detected.add("Reagendar cita")
-        
-        # Considerar si solo quieren un motivo dominante o múltiples
-        # Si 'Agendar cita' y 'Reagendar cita' están presentes, ¿cuál es más importante?
-        # Para simplificar, si se detecta más de uno, los incluimos todos.
-
-    # English
-    elif lang == "en":
-        # Ask for information
-        if any(lemma in [token.lemma_ for token in doc] for lemma in ["information", "know", "query", "doubt"]):
-            call_motives_detected.add("Ask for information")
-        # Schedule appointment
-        if any(lemma in [token.lemma_ for token in doc] for lemma in ["schedule", "appointment", "book"]):
-            call_motives_detected.add("Schedule appointment")
-        # Cancel appointment
-        if any(lemma in [token.lemma_ for token in doc] for lemma in ["cancel", "annul", "revoke"]):
-            call_motives_detected.add("Cancel appointment")
-        # Reschedule appointment
-        if any(lemma in [token.lemma_ for token in doc] for lemma in ["reschedule", "change", "move"]):
-            call_motives_detected.add("Reschedule appointment")
-    
-    # Si se detectaron motivos específicos, reemplaza el valor por defecto
-    if call_motives_detected:
-        call_motives = list(call_motives_detected)
-
-    # Las 'acciones_agente' y 'motivos' del cliente (si es que tienes esos campos separados
-    # de los motivos de llamada y riesgos)
-    # Por ahora, los dejo como antes, pero podrías integrarlos mejor con el análisis de Spacy
-    # para un resultado más coherente.
-    agent_actions = [] # Puedes rellenar esto con lógica similar a la de los motivos.
-
-    logger.debug(f"Análisis completado. Advertencias de riesgo: {high_risk_warnings}, Motivos de llamada: {call_motives}")
-    return {
-        "high_risk_warnings": high_risk_warnings,
-        "call_motives": call_motives,
-        "motivos": ["Análisis de motivos del cliente más detallado aquí."], # Si son diferentes a call_motives
-        "acciones_agente": ["Análisis de acciones del agente aquí."], # Si necesitas esto separado
-    }
\ No newline at end of file
+def extract_information_batch(transcripts, lang: str = "es", batch_size=None, n_process=None, as_tuples=False):
+    """
+    Como `extract_information` para muchas transcripciones, con `nlp.pipe` (lotes de
+    `batch_size`, `n_process` procesos). Entrega los resultados en el mismo orden.
+    Con `as_tuples=True` recibe `(texto, contexto)` y entrega `(resultado, contexto)`.
+    """
+    analyzer = get_call_analyzer(lang)
+    docs = analyzer.nlp.pipe(
+        transcripts,
+        batch_size=batch_size or settings.ANALYZER_BATCH_SIZE,
+        n_process=n_process or settings.ANALYZER_N_PROCESS,
+        as_tuples=as_tuples,
+    )
+    if as_tuples:
+        for doc, context in docs:
+            yield analyzer.analyze(doc), context
+    else:
+        for doc in docs:
+            yield analyzer.analyze(doc)
@@ -7,10 +7,14 @@ from urllib.parse import urljoin, unquote, urlparse
 
 logger = logging.getLogger(__name__)
 
-def get_audio_from_url(audio_url: str) -> BytesIO:
+DOWNLOAD_CHUNK_BYTES = 64 * 1024
+
+
+def open_audio_response(audio_url: str) -> requests.Response:
     """
-    Descarga el audio desde una URL, manejando redirecciones a través de HTML.
-    Devuelve un objeto BytesIO con el contenido del audio.
+    Sigue la URL (incluidas las páginas HTML de Sharpen que envuelven el audio) hasta el archivo
+    de audio y devuelve la respuesta abierta en modo stream, sin leer el cuerpo.
+    El llamador debe cerrarla.
     """
     current_url = audio_url
     max_redirects_html = 3
@@ -18,13 +22,15 @@ def get_audio_from_url(audio_url: str) -> BytesIO:
     for i in range(max_redirects_html):
         try:
             logger.info(f"Intentando obtener contenido de: {current_url} (Intento {i+1})")
-            response = requests.get(current_url, timeout=60, allow_redirects=True)
+            response = requests.get(current_url, timeout=60, allow_redirects=True, stream=True)
             response.raise_for_status()
             content_type = response.headers.get("Content-Type", "").lower()
 
             if "text/html" in content_type:
                 logger.info("URL devolvió HTML. Buscando la URL de audio real.")
-                soup = BeautifulSoup(response.text, "html.parser")
+                html = response.text
+                response.close()
+                soup = BeautifulSoup(html, "html.parser")
                 source_tag = soup.find("source")
                 audio_tag = soup.find("audio")
                 extracted_url = None
@@ -53,10 +59,10 @@ def get_audio_from_url(audio_url: str) -> BytesIO:
 
             elif "audio" in content_type or "binary/octet-stream" in content_type or "application/x-download" in content_type:
                 logger.info("URL devolvió directamente un archivo de audio. ¡Éxito!")
-                return BytesIO(response.content)
+                return response
             else:
                 logger.warning(f"Content-Type inesperado: '{content_type}'. Intentando procesar como audio.")
-                return BytesIO(response.content)
+                return response
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Error de red/HTTP al descargar audio desde {current_url}: {e}")
@@ -65,4 +71,29 @@ def get_audio_from_url(audio_url: str) -> BytesIO:
             logger.error(f"Error de procesamiento de URL: {e}")
             raise
 
-    raise TimeoutError("No se pudo obtener el archivo de audio después de múltiples redirecciones HTML.")
\ No newline at end of file
+    raise TimeoutError("No se pudo obtener el archivo de audio después de múltiples redirecciones HTML.")
+
+
+def get_audio_from_url(audio_url: str) -> BytesIO:
+    """
+    Descarga el audio desde una URL, manejando redirecciones a través de HTML.
+    Devuelve un objeto BytesIO con el contenido del audio.
+    """
+    response = open_audio_response(audio_url)
+    try:
+        return BytesIO(response.content)
+    finally:
+        response.close()
+
+
+def iter_audio_from_url(audio_url: str, chunk_size: int = DOWNLOAD_CHUNK_BYTES):
+    """Igual que `get_audio_from_url` pero entrega el audio en bloques a medida que llega."""
+    yield from iter_audio_response(open_audio_response(audio_url), chunk_size=chunk_size)
+
+
+def iter_audio_response(response: requests.Response, chunk_size: int = DOWNLOAD_CHUNK_BYTES):
+    """Entrega en bloques el cuerpo de una respuesta de `open_audio_response` y la cierra al terminar."""
+    try:
+        yield from response.iter_content(chunk_size=chunk_size)
+    finally:
+        response.close()
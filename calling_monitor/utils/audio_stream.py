@@ -0,0 +1,130 @@
+# calling_monitor/utils/audio_stream.py
+"""
+Decodificación en streaming con ffmpeg: los bloques del audio original (p. ej. el cuerpo HTTP)
+entran por stdin y salen como PCM s16le mono a 16 kHz por stdout, listo para KaldiRecognizer.
+
+La memoria usada no depende de la duración de la llamada (sólo los buffers de los pipes) y el
+reconocimiento empieza en cuanto ffmpeg produce los primeros bloques, antes de que termine
+la descarga. Los formatos que necesitan buscar en el archivo (p. ej. MP4 con el índice al final)
+no se pueden leer desde un pipe; las grabaciones de Sharpen son WAV.
+"""
+import logging
+import mmap
+import os
+import shutil
+import subprocess
+import threading
+from typing import Iterable, Iterator
+
+logger = logging.getLogger(__name__)
+
+PCM_SAMPLE_RATE = 16000
+# 0.25 s de audio s16le mono a 16 kHz por bloque entregado al reconocedor
+PCM_CHUNK_BYTES = 8000
+FILE_CHUNK_BYTES = 64 * 1024
+
+
+class AudioDecodeError(Exception):
+    """ffmpeg no pudo decodificar el audio."""
+
+
+def ffmpeg_pcm_command(sample_rate: int = PCM_SAMPLE_RATE, channels: int = 1) -> list[str]:
+    return [
+        shutil.which("ffmpeg") or "ffmpeg",
+        "-hide_banner", "-nostats", "-loglevel", "error",
+        "-i", "pipe:0",
+        "-f", "s16le", "-acodec", "pcm_s16le",
+        "-ac", str(channels), "-ar", str(sample_rate),
+        "pipe:1",
+    ]
+
+
+def iter_file_chunks(file_or_path, chunk_size: int = FILE_CHUNK_BYTES) -> Iterator[bytes]:
+    """Bloques de un archivo abierto (desde el inicio) o de una ruta en disco."""
+    if isinstance(file_or_path, (str, os.PathLike)):
+        with open(file_or_path, "rb") as f:
+            yield from iter(lambda: f.read(chunk_size), b"")
+        return
+    if file_or_path.seekable():
+        file_or_path.seek(0)
+    yield from iter(lambda: file_or_path.read(chunk_size), b"")
+
+
+def iter_mmap_chunks(path, chunk_size: int = FILE_CHUNK_BYTES) -> Iterator[bytes]:
+    """Bloques de un archivo en disco leídos por mmap (p. ej. una grabación de la caché local)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            if hasattr(mmap, "MADV_SEQUENTIAL"):
+                mapped.madvise(mmap.MADV_SEQUENTIAL)
+            for offset in range(0, len(mapped), chunk_size):
+                yield mapped[offset:offset + chunk_size]
+
+
+def decode_to_pcm(
+    source_chunks: Iterable[bytes],
+    sample_rate: int = PCM_SAMPLE_RATE,
+    channels: int = 1,
+    chunk_bytes: int = PCM_CHUNK_BYTES,
+) -> Iterator[bytes]:
+    """
+    Pasa `source_chunks` por ffmpeg y entrega el PCM resultante en bloques de `chunk_bytes`
+    a medida que se produce. Un hilo escribe en stdin mientras este generador lee stdout,
+    así ninguno de los dos pipes se llena y bloquea al otro.
+    """
+    process = subprocess.Popen(
+        ffmpeg_pcm_command(sample_rate, channels),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    writer_errors = []
+    stderr_chunks = []
+
+    def feed_stdin():
+        try:
+            for chunk in source_chunks:
+                if chunk:
+                    process.stdin.write(chunk)
+        except (BrokenPipeError, ValueError):
+            # ffmpeg terminó antes (error de formato o el lector se detuvo); lo reporta el lector
+            pass
+        except Exception as e:
+            writer_errors.append(e)
+        finally:
+            try:
+                process.stdin.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+    def drain_stderr():
+        stderr_chunks.append(process.stderr.read())
+
+    writer = threading.Thread(target=feed_stdin, name="ffmpeg-stdin", daemon=True)
+    stderr_reader = threading.Thread(target=drain_stderr, name="ffmpeg-stderr", daemon=True)
+    writer.start()
+    stderr_reader.start()
+
+    completed = False
+    try:
+        while True:
+            data = process.stdout.read(chunk_bytes)
+            if not data:
+                break
+            yield data
+        completed = True
+    finally:
+        if not completed and process.poll() is None:
+            process.kill()
+        returncode = process.wait()
+        writer.join(timeout=5)
+        stderr_reader.join(timeout=5)
+        process.stdout.close()
+
+    if writer_errors:
+        # Error leyendo el origen (p. ej. la descarga se cortó)
+        raise writer_errors[0]
+    if returncode != 0:
+        stderr = b"".join(stderr_chunks).decode("utf-8", errors="replace").strip()
+        raise AudioDecodeError(f"ffmpeg terminó con código {returncode}: {stderr}")
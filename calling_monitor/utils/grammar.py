@@ -0,0 +1,391 @@
+# calling_monitor/utils/grammar.py
+"""
+Servicio de corrección gramatical con LanguageTool.
+
+Crear un `LanguageTool` arranca un servidor Java (segundos y cientos de MB), así que cada proceso
+mantiene un pool de hasta `LANGUAGETOOL_POOL_SIZE` instancias que se reutilizan. Cada revisión
+toma una instancia libre; si no hay, espera en la cola hasta `LANGUAGETOOL_ACQUIRE_TIMEOUT`
+segundos (`GrammarServiceBusy`). Una instancia que falla se cierra y se reemplaza por una nueva
+en el siguiente uso.
+
+Con `LANGUAGETOOL_SERVER_URL` las instancias son sólo clientes HTTP de un servidor LanguageTool
+compartido por todos los procesos (p. ej. un contenedor aparte) y no arrancan Java.
+
+El texto se revisa por oraciones: los matches de cada oración se guardan (con offsets relativos
+a la oración) en una LRU en memoria y en Redis, y sólo se envían a LanguageTool las oraciones que
+no están en caché, juntas en peticiones de hasta `maxTextLength` caracteres. Los offsets se
+traducen de vuelta al texto completo, así el costo de volver a revisar una nota es proporcional
+a lo que cambió. El contexto de cada match se arma con su propia oración (nunca con las vecinas
+de la petición), porque queda en caché para esa oración. Las reglas que cruzan oraciones
+(p. ej. inicios repetidos) no se detectan.
+"""
+import atexit
+import hashlib
+import logging
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+
+from gvhc.lazy_imports import lazy_import
+
+logger = logging.getLogger(__name__)
+
+language_tool_python = lazy_import("language_tool_python")
+
+# Opciones del servidor local (no aplican con LANGUAGETOOL_SERVER_URL)
+LANGUAGETOOL_CONFIG = {
+    'maxTextLength': 500,
+    'maxErrorsPerWordRate': 0.5,
+    'maxSpellingSuggestions': 3,  # Solo 3 sugerencias de ortografía por error
+    'cacheSize': 20,  # Tamaño de caché
+    'cacheTTLSeconds': 300,  # Tiempo de vida de caché: 5 minutos
+    'pipelineCaching': True,  # Habilita caché de pipelines
+    'pipelineExpireTimeInSeconds': 600,  # Cache de pipelines expira en 10 minutos
+}
+
+
+# Fin de oración: puntuación seguida de espacio/fin de texto, o salto de línea
+_SENTENCE_END_RE = re.compile(r"[.!?]+(?=\s|$)|\n")
+# Separa las oraciones enviadas juntas a LanguageTool (un párrafo nuevo para cada una)
+_BATCH_SEPARATOR = "\n\n"
+# Caracteres a cada lado del error en `error` (como el contexto de LanguageTool)
+CONTEXT_CHARS = 40
+
+
+class GrammarServiceBusy(Exception):
+    """Todas las instancias de LanguageTool siguen ocupadas tras el tiempo de espera."""
+
+
+def split_sentences(text: str) -> list[tuple[int, str]]:
+    """`(offset, oración)` sin los espacios de los extremos; los offsets son índices de `text`."""
+    sentences = []
+    start = 0
+    bounds = [match.end() for match in _SENTENCE_END_RE.finditer(text)]
+    for end in bounds + [len(text)]:
+        chunk = text[start:end]
+        stripped = chunk.strip()
+        if stripped:
+            sentences.append((start + len(chunk) - len(chunk.lstrip()), stripped))
+        start = end
+    return sentences
+
+
+def _utf16_to_index(text: str, utf16_offset: int) -> int:
+    """LanguageTool (Java) cuenta unidades UTF-16: los caracteres fuera del BMP (emojis) ocupan dos."""
+    if text.isascii():
+        return utf16_offset
+    units = 0
+    for index, char in enumerate(text):
+        if units >= utf16_offset:
+            return index
+        units += 2 if ord(char) > 0xFFFF else 1
+    return len(text)
+
+
+def _utf16_length(text: str) -> int:
+    return len(text) if text.isascii() else len(text.encode("utf-16-le")) // 2
+
+
+def batch_sentences(sentences: list[str], max_length: int) -> list[list[str]]:
+    """
+    Agrupa las oraciones (en orden) en lotes que, unidos con el separador, no pasan de
+    `max_length` unidades UTF-16 (como cuenta `maxTextLength` LanguageTool). Una oración más
+    larga que el límite va sola.
+    """
+    batches, current, current_length = [], [], 0
+    for sentence in sentences:
+        length = _utf16_length(sentence)
+        added = length + (len(_BATCH_SEPARATOR) if current else 0)
+        if current and current_length + added > max_length:
+            batches.append(current)
+            current, current_length, added = [], 0, length
+        current.append(sentence)
+        current_length += added
+    if current:
+        batches.append(current)
+    return batches
+
+
+def match_context(sentence: str, offset: int, length: int, chars: int = CONTEXT_CHARS) -> str:
+    """Contexto del error tomado sólo de su oración, con `...` donde se recorta."""
+    start = max(0, offset - chars)
+    end = min(len(sentence), offset + length + chars)
+    return f"{'...' if start else ''}{sentence[start:end]}{'...' if end < len(sentence) else ''}"
+
+
+def apply_corrections(text: str, suggestions: list[dict]) -> str:
+    """Aplica la primera sugerencia de cada match (sin solapes), como language_tool_python.utils.correct."""
+    parts = []
+    position = 0
+    for item in sorted(suggestions, key=lambda item: item["offset"]):
+        if not item["suggestions"] or item["offset"] < position:
+            continue
+        parts.append(text[position:item["offset"]])
+        parts.append(item["suggestions"][0])
+        position = item["offset"] + item["length"]
+    parts.append(text[position:])
+    return "".join(parts)
+
+
+class LanguageToolPool:
+    def __init__(
+        self, language: str, size: int, server_url: str = "", acquire_timeout: float = 10,
+        cache_size: int = 1024, redis_ttl: int = 0,
+    ):
+        self.language = language
+        self.size = max(1, size)
+        self.server_url = server_url
+        self.acquire_timeout = acquire_timeout
+        self.cache_size = cache_size  # oraciones en la LRU en memoria
+        self.redis_ttl = redis_ttl  # 0 = sin Redis
+
+        self._idle = queue.LifoQueue()  # LIFO: se reutiliza la instancia más "caliente"
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._stats = {
+            "created": 0, "restarts": 0, "checks": 0, "waits": 0,
+            "sentences": 0, "memory_hits": 0, "redis_hits": 0, "sentences_checked": 0,
+        }
+
+    def _create(self):
+        started = time.perf_counter()
+        if self.server_url:
+            tool = language_tool_python.LanguageTool(self.language, remote_server=self.server_url)
+        else:
+            tool = language_tool_python.LanguageTool(self.language, config=LANGUAGETOOL_CONFIG)
+        tool.picky = True  # Activa picky mode para sugerencias detalladas
+        with self._lock:
+            self._stats["created"] += 1
+        logger.info(f"📝 Instancia de LanguageTool ({self.language}) lista en {time.perf_counter() - started:.1f}s.")
+        return tool
+
+    def _acquire(self):
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self._stats["waits"] += 1
+            if not self._slots.acquire(timeout=self.acquire_timeout):
+                raise GrammarServiceBusy(f"LanguageTool ocupado (más de {self.acquire_timeout}s en espera)")
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            return self._create()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _release(self, tool, broken: bool = False):
+        if broken:
+            with self._lock:
+                self._stats["restarts"] += 1
+            try:
+                tool.close()
+            except Exception as e:
+                logger.warning(f"Error al cerrar una instancia de LanguageTool: {e}")
+        else:
+            self._idle.put(tool)
+        self._slots.release()
+
+    def _run_check(self, text: str) -> list:
+        tool = self._acquire()
+        try:
+            matches = tool.check(text)
+        except Exception:
+            # Servidor caído o respuesta inválida: la instancia se descarta y se crea otra
+            self._release(tool, broken=True)
+            raise
+        self._release(tool)
+        return matches
+
+    def _check_text(self, text: str) -> list:
+        try:
+            return self._run_check(text)
+        except GrammarServiceBusy:
+            raise
+        except Exception as e:
+            logger.warning(f"LanguageTool falló ({e}); reintentando con una instancia nueva.")
+            return self._run_check(text)
+
+    def _check_sentences(self, sentences: list[str]) -> dict:
+        """Revisa las oraciones en lotes bajo `maxTextLength` y reparte los matches (offsets relativos a cada una)."""
+        results = {}
+        for batch in batch_sentences(sentences, LANGUAGETOOL_CONFIG['maxTextLength']):
+            results.update(self._check_batch(batch))
+        return results
+
+    def _check_batch(self, sentences: list[str]) -> dict:
+        """Revisa las oraciones en una sola petición."""
+        joined = _BATCH_SEPARATOR.join(sentences)
+        starts = []
+        position = 0
+        for sentence in sentences:
+            starts.append(position)
+            position += len(sentence) + len(_BATCH_SEPARATOR)
+
+        results = {sentence: [] for sentence in sentences}
+        for match in self._check_text(joined):
+            offset = _utf16_to_index(joined, match.offset)
+            end = _utf16_to_index(joined, match.offset + match.errorLength)
+            for sentence, sentence_start in zip(sentences, starts):
+                if sentence_start <= offset and end <= sentence_start + len(sentence):
+                    results[sentence].append({
+                        "offset": offset - sentence_start,
+                        "length": end - offset,
+                        # `match.context` puede incluir oraciones vecinas de la petición
+                        "error": match_context(sentence, offset - sentence_start, end - offset),
+                        "message": match.message,
+                        "suggestions": match.replacements,
+                        "rule": match.ruleId,
+                    })
+                    break
+            # Un match que cae sobre el separador no pertenece a ninguna oración y se descarta
+        return results
+
+    def _redis_key(self, sentence: str) -> str:
+        digest = hashlib.sha1(sentence.encode("utf-8")).hexdigest()
+        # v2: las entradas anteriores guardaban contexto de oraciones vecinas
+        return f"grammar:v2:{self.language}:{digest}"
+
+    def _cached_sentences(self, sentences: list[str]) -> dict:
+        found = {}
+        with self._lock:
+            for sentence in sentences:
+                matches = self._cache.get(sentence)
+                if matches is not None:
+                    self._cache.move_to_end(sentence)
+                    found[sentence] = matches
+            self._stats["memory_hits"] += len(found)
+
+        missing = [sentence for sentence in sentences if sentence not in found]
+        if missing and self.redis_ttl:
+            try:
+                keys = {self._redis_key(sentence): sentence for sentence in missing}
+                from_redis = {keys[key]: matches for key, matches in cache.get_many(list(keys)).items()}
+            except Exception as e:
+                logger.warning(f"No se pudo leer la caché de gramática en Redis: {e}")
+                from_redis = {}
+            self._remember(from_redis)
+            with self._lock:
+                self._stats["redis_hits"] += len(from_redis)
+            found.update(from_redis)
+        return found
+
+    def _remember(self, results: dict) -> None:
+        with self._lock:
+            for sentence, matches in results.items():
+                self._cache[sentence] = matches
+                self._cache.move_to_end(sentence)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def check(self, text: str) -> dict:
+        """
+        `{"corrected_text", "suggestions": [{"error", "suggestions", "rule", "message", "offset", "length"}]}`
+        para `text`, con `offset`/`length` en caracteres del texto completo.
+        """
+        sentences = split_sentences(text)
+        unique = list(dict.fromkeys(sentence for _, sentence in sentences))
+        results = self._cached_sentences(unique)
+
+        missing = [sentence for sentence in unique if sentence not in results]
+        if missing:
+            fresh = self._check_sentences(missing)
+            self._remember(fresh)
+            if self.redis_ttl:
+                try:
+                    cache.set_many({self._redis_key(sentence): matches for sentence, matches in fresh.items()}, self.redis_ttl)
+                except Exception as e:
+                    logger.warning(f"No se pudo guardar la caché de gramática en Redis: {e}")
+            results.update(fresh)
+
+        with self._lock:
+            self._stats["checks"] += 1
+            self._stats["sentences"] += len(sentences)
+            self._stats["sentences_checked"] += len(missing)
+
+        suggestions = [
+            {**match, "offset": sentence_offset + match["offset"]}
+            for sentence_offset, sentence in sentences
+            for match in results[sentence]
+        ]
+        return {"corrected_text": apply_corrections(text, suggestions), "suggestions": suggestions}
+
+    def warm_up(self) -> None:
+        """Crea las instancias del pool antes de la primera petición."""
+        tools = []
+        try:
+            for _ in range(self.size):
+                tools.append(self._acquire())
+        finally:
+            for tool in tools:
+                self._release(tool)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                **self._stats,
+                "size": self.size,
+                "idle": self._idle.qsize(),
+                "cached_sentences": len(self._cache),
+                "server_url": self.server_url or None,
+            }
+
+    def close(self) -> None:
+        while True:
+            try:
+                tool = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                tool.close()
+            except Exception:
+                pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_grammar_pool() -> LanguageToolPool:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = LanguageToolPool(
+                    settings.LANGUAGETOOL_LANGUAGE,
+                    settings.LANGUAGETOOL_POOL_SIZE,
+                    server_url=settings.LANGUAGETOOL_SERVER_URL,
+                    acquire_timeout=settings.LANGUAGETOOL_ACQUIRE_TIMEOUT,
+                    cache_size=settings.LANGUAGETOOL_CACHE_SIZE,
+                    redis_ttl=settings.LANGUAGETOOL_REDIS_TTL,
+                )
+                # Los servidores Java locales no deben quedar huérfanos al salir
+                atexit.register(_pool.close)
+    return _pool
+
+
+def check_grammar(text: str) -> dict:
+    return get_grammar_pool().check(text)
+
+
+def warm_up_grammar_in_background() -> threading.Thread | None:
+    """Para servidores que no deben demorar su arranque (ver settings.LANGUAGETOOL_PRELOAD)."""
+    if not settings.LANGUAGETOOL_PRELOAD:
+        return None
+
+    def warm_up():
+        try:
+            get_grammar_pool().warm_up()
+        except Exception as e:
+            logger.error(f"No se pudo precargar LanguageTool: {e}", exc_info=True)
+
+    thread = threading.Thread(target=warm_up, name="languagetool-preload", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,238 @@
+# calling_monitor/utils/parallel_transcriber.py
+"""
+Transcripción en paralelo de grabaciones largas.
+
+El PCM que produce ffmpeg (ver audio_stream) se corta en los silencios en segmentos de unos
+`TRANSCRIBE_SEGMENT_SECONDS` (VAD por energía en bloques de 30 ms) y cada segmento se
+transcribe en un pool de procesos. Los segmentos se envían al pool mientras la decodificación
+sigue, con a lo sumo `IN_FLIGHT_PER_WORKER` × procesos pendientes (así el proceso no retiene el
+PCM de toda la llamada), y los resultados se unen en orden, con marcas de tiempo por palabra
+relativas a la grabación.
+
+El pool NO usa `fork`: el worker ya tiene hilos corriendo (loop de fondo de sharpen_client,
+precarga de Vosk/LanguageTool, hilos de la transcripción estéreo) y un lock tomado en el
+momento del fork deja colgado al hijo. Se usa `forkserver` (o `spawn` donde no existe) y cada
+proceso carga en su inicializador el modelo del idioma pedido, y sólo ese: la memoria del pool
+es TRANSCRIBE_WORKERS × un modelo (varios GB con los modelos grandes de es/en), además de los
+modelos del propio worker. Un trabajo en otro idioma vuelve a crear el pool con ese modelo.
+
+Crear procesos no es posible desde los hijos de Celery prefork: usar en un worker `--pool=solo`.
+"""
+import json
+import logging
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Iterable, Iterator
+
+from django.conf import settings
+
+from gvhc.lazy_imports import lazy_import
+
+from .audio_stream import PCM_CHUNK_BYTES, PCM_SAMPLE_RATE, decode_to_pcm
+from .vosk_models import get_vosk_model, vosk_models
+
+logger = logging.getLogger(__name__)
+
+np = lazy_import("numpy")
+vosk = lazy_import("vosk")
+
+FRAME_MS = 30
+BYTES_PER_SAMPLE = 2  # s16le
+# Segmentos enviados al pool y todavía sin recoger, por proceso
+IN_FLIGHT_PER_WORKER = 2
+
+_pool_lock = threading.Lock()
+_pool: ProcessPoolExecutor | None = None
+_pool_key: tuple | None = None
+
+
+class SilenceSegmenter:
+    """Corta un flujo de PCM s16le mono en segmentos que terminan en silencio."""
+
+    def __init__(self, sample_rate=PCM_SAMPLE_RATE, segment_seconds=None, silence_db=None, min_silence_ms=None):
+        segment_seconds = settings.TRANSCRIBE_SEGMENT_SECONDS if segment_seconds is None else segment_seconds
+        silence_db = settings.TRANSCRIBE_VAD_SILENCE_DB if silence_db is None else silence_db
+        min_silence_ms = settings.TRANSCRIBE_VAD_MIN_SILENCE_MS if min_silence_ms is None else min_silence_ms
+
+        self.sample_rate = sample_rate
+        self.frame_bytes = sample_rate * FRAME_MS // 1000 * BYTES_PER_SAMPLE
+        self.target_bytes = int(segment_seconds * sample_rate) * BYTES_PER_SAMPLE
+        # Si no aparece un silencio, se corta igual al doble del tamaño objetivo
+        self.max_bytes = self.target_bytes * 2
+        self.min_silence_frames = max(1, math.ceil(min_silence_ms / FRAME_MS))
+        self.threshold = 32768 * 10 ** (silence_db / 20)  # RMS en amplitud de muestra
+
+    def seconds(self, byte_offset: int) -> float:
+        return byte_offset / (self.sample_rate * BYTES_PER_SAMPLE)
+
+    def segments(self, pcm_chunks: Iterable[bytes]) -> Iterator[tuple[int, bytes]]:
+        """Entrega `(offset_en_bytes, pcm)` por segmento, en orden."""
+        current = bytearray()
+        start = 0
+        pending = b""
+        silent_run = 0
+
+        for chunk in pcm_chunks:
+            data = pending + chunk
+            whole = len(data) - len(data) % self.frame_bytes
+            pending = data[whole:]
+            if not whole:
+                continue
+            frames = np.frombuffer(data[:whole], dtype="<i2").reshape(-1, self.frame_bytes // BYTES_PER_SAMPLE)
+            rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1))
+
+            for index, is_silent in enumerate(rms < self.threshold):
+                current += data[index * self.frame_bytes:(index + 1) * self.frame_bytes]
+                silent_run = silent_run + 1 if is_silent else 0
+
+                if len(current) >= self.target_bytes and silent_run >= self.min_silence_frames:
+                    # Cortamos a la mitad del silencio: cada lado conserva un poco de margen
+                    cut = len(current) - (silent_run // 2) * self.frame_bytes
+                elif len(current) >= self.max_bytes:
+                    cut = len(current)
+                else:
+                    continue
+                yield start, bytes(current[:cut])
+                start += cut
+                del current[:cut]
+                silent_run = 0
+
+        current += pending
+        if current:
+            yield start, bytes(current)
+
+
+def _start_method() -> str:
+    return "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+
+
+def _init_worker(lang: str) -> None:
+    """Inicializador de cada proceso del pool: configura Django y carga el modelo del idioma una sola vez."""
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "gvhc.settings")
+    import django
+
+    django.setup()
+    vosk_models.load(lang)
+
+
+def _recognize_segment(lang: str, sample_rate: int, pcm: bytes) -> tuple[str, list[dict]]:
+    """Corre en un proceso del pool: el modelo ya está en memoria (lo cargó `_init_worker`)."""
+    rec = vosk.KaldiRecognizer(get_vosk_model(lang), sample_rate)
+    rec.SetWords(True)
+    texts, words = [], []
+
+    def collect(result_json: str):
+        result = json.loads(result_json)
+        if result.get("text"):
+            texts.append(result["text"])
+        words.extend(result.get("result", []))
+
+    for offset in range(0, len(pcm), PCM_CHUNK_BYTES):
+        if rec.AcceptWaveform(pcm[offset:offset + PCM_CHUNK_BYTES]):
+            collect(rec.Result())
+    collect(rec.FinalResult())
+    return " ".join(texts), words
+
+
+def _get_pool(workers: int, lang: str) -> ProcessPoolExecutor:
+    """
+    Pool compartido por el proceso, con el modelo de un solo idioma. Pedir otro idioma (u otro
+    número de procesos) lo vuelve a crear: nunca hay dos modelos por proceso del pool.
+    """
+    global _pool, _pool_key
+    with _pool_lock:
+        key = (workers, lang)
+        if _pool is None or _pool_key != key:
+            if _pool is not None:
+                _pool.shutdown(wait=True)
+            method = _start_method()
+            _pool = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context(method),
+                initializer=_init_worker,
+                initargs=(lang,),
+            )
+            _pool_key = key
+            logger.info(f"🧵 Pool de transcripción creado con {workers} procesos ({method}, modelo: {lang}).")
+        return _pool
+
+
+def _worker_ready() -> int:
+    # Retener la tarea un momento para que cada proceso (ya inicializado) tome una
+    time.sleep(0.5)
+    return os.getpid()
+
+
+def start_pool(workers: int, lang: str) -> float:
+    """Crea el pool y espera a que todos sus procesos carguen el modelo. Devuelve los segundos que tardó."""
+    started = time.perf_counter()
+    pool = _get_pool(workers, lang)
+    for future in [pool.submit(_worker_ready) for _ in range(workers)]:
+        future.result()
+    return time.perf_counter() - started
+
+
+def shutdown_pool() -> None:
+    global _pool, _pool_key
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+        _pool_key = None
+
+
+def transcribe_parallel(source_chunks: Iterable[bytes], lang="es", workers=None, segment_seconds=None) -> dict:
+    """
+    Transcribe audio recibido en bloques (cualquier formato de ffmpeg) en paralelo.
+    Devuelve `{"text", "words": [{"word", "start", "end", "conf"}], "segments": [{"start", "end", "text"}]}`
+    con tiempos en segundos desde el inicio de la grabación.
+    """
+    pcm_chunks = decode_to_pcm(source_chunks, sample_rate=PCM_SAMPLE_RATE)
+    return transcribe_pcm_parallel(pcm_chunks, lang, workers=workers, segment_seconds=segment_seconds)
+
+
+def transcribe_pcm_parallel(pcm_chunks: Iterable[bytes], lang="es", workers=None, segment_seconds=None) -> dict:
+    """Igual que `transcribe_parallel` pero a partir de PCM s16le mono a 16 kHz."""
+    workers = settings.TRANSCRIBE_WORKERS if workers is None else workers
+    if lang not in vosk_models.languages():
+        raise ValueError(f"Unsupported language {lang}")
+    segmenter = SilenceSegmenter(segment_seconds=segment_seconds)
+
+    if workers > 1:
+        pool = _get_pool(workers, lang)
+        # El executor guarda el PCM de cada segmento hasta que termina: con el tope, la memoria
+        # no depende de la duración de la llamada
+        max_in_flight = IN_FLIGHT_PER_WORKER * workers
+        pending = deque()
+        outputs = []
+        for start, pcm in segmenter.segments(pcm_chunks):
+            if len(pending) >= max_in_flight:
+                # Los resultados se recogen en orden; el más antiguo suele ser el primero en terminar
+                first_start, first_length, future = pending.popleft()
+                outputs.append((first_start, first_length, future.result()))
+            pending.append((start, len(pcm), pool.submit(_recognize_segment, lang, PCM_SAMPLE_RATE, pcm)))
+        outputs.extend((start, length, future.result()) for start, length, future in pending)
+    else:
+        outputs = [
+            (start, len(pcm), _recognize_segment(lang, PCM_SAMPLE_RATE, pcm))
+            for start, pcm in segmenter.segments(pcm_chunks)
+        ]
+
+    words, segments = [], []
+    for start, length, (text, segment_words) in outputs:
+        offset = segmenter.seconds(start)
+        for word in segment_words:
+            words.append({**word, "start": round(word["start"] + offset, 2), "end": round(word["end"] + offset, 2)})
+        segments.append({"start": round(offset, 2), "end": round(segmenter.seconds(start + length), 2), "text": text})
+
+    logger.debug(f"Transcripción en paralelo: {len(segments)} segmentos, {len(words)} palabras, {workers} procesos.")
+    return {
+        "text": " ".join(segment["text"] for segment in segments if segment["text"]).strip(),
+        "words": words,
+        "segments": segments,
+    }
@@ -0,0 +1,190 @@
+# calling_monitor/utils/stereo_transcriber.py
+"""
+Transcripción por hablante de grabaciones mixmon en estéreo.
+
+Asterisk puede grabar cada lado de la llamada en un canal (agente y llamante). En ese caso
+ffmpeg entrega PCM estéreo intercalado, que se separa aquí en dos flujos mono; cada canal lo
+transcribe su propio KaldiRecognizer en un hilo (Vosk llama a la librería nativa por cffi, que
+suelta el GIL, así que los dos canales avanzan en paralelo sobre el mismo modelo compartido).
+Las frases de ambos canales se unen ordenadas por tiempo y etiquetadas con el hablante.
+
+Las grabaciones mono siguen por la ruta normal (ver `transcriber.transcribe_recording`).
+"""
+import itertools
+import json
+import logging
+import queue
+import re
+import shutil
+import struct
+import subprocess
+import threading
+from typing import Iterable, Iterator
+
+from django.conf import settings
+
+from gvhc.lazy_imports import lazy_import
+
+from .audio_stream import PCM_CHUNK_BYTES, PCM_SAMPLE_RATE, decode_to_pcm
+from .vosk_models import get_vosk_model
+
+logger = logging.getLogger(__name__)
+
+np = lazy_import("numpy")
+vosk = lazy_import("vosk")
+
+SPEAKERS = ("agent", "caller")
+SPEAKER_LABELS = {"agent": "Agente", "caller": "Cliente"}
+_SPEAKER_PREFIX_RE = re.compile(rf"^(?:{'|'.join(SPEAKER_LABELS.values())}): ")
+# Bytes del inicio del archivo que se usan para detectar los canales
+PROBE_BYTES = 64 * 1024
+# Bloques en espera por canal antes de frenar a ffmpeg (unos 8 s de audio)
+CHANNEL_QUEUE_CHUNKS = 32
+
+_END = None
+
+
+def peek_chunks(source_chunks: Iterable[bytes], size: int = PROBE_BYTES) -> tuple[bytes, Iterator[bytes]]:
+    """Lee al menos `size` bytes del inicio y devuelve `(inicio, flujo_completo)` sin perder datos."""
+    iterator = iter(source_chunks)
+    head = bytearray()
+    consumed = []
+    for chunk in iterator:
+        consumed.append(chunk)
+        head += chunk
+        if len(head) >= size:
+            break
+    return bytes(head), itertools.chain(consumed, iterator)
+
+
+def wav_channels(head: bytes) -> int | None:
+    """Canales según la cabecera RIFF/WAVE, o None si no es un WAV legible."""
+    if len(head) < 12 or head[:4] != b"RIFF" or head[8:12] != b"WAVE":
+        return None
+    offset = 12
+    while offset + 8 <= len(head):
+        chunk_id, chunk_size = struct.unpack_from("<4sI", head, offset)
+        if chunk_id == b"fmt ":
+            if offset + 12 > len(head):
+                return None
+            return struct.unpack_from("<H", head, offset + 10)[0]
+        offset += 8 + chunk_size + (chunk_size & 1)
+    return None
+
+
+def probe_channels(head: bytes) -> int | None:
+    """Canales del audio a partir de su inicio: cabecera WAV y, si no, ffprobe por stdin."""
+    channels = wav_channels(head)
+    if channels is not None:
+        return channels
+    command = [
+        shutil.which("ffprobe") or "ffprobe",
+        "-v", "error", "-select_streams", "a:0",
+        "-show_entries", "stream=channels", "-of", "csv=p=0",
+        "-i", "pipe:0",
+    ]
+    try:
+        completed = subprocess.run(command, input=head, capture_output=True, timeout=15)
+        return int(completed.stdout.decode().strip().splitlines()[0])
+    except (OSError, subprocess.TimeoutExpired, ValueError, IndexError) as e:
+        logger.warning(f"No se pudieron detectar los canales del audio: {e}")
+        return None
+
+
+def agent_channel_index() -> int:
+    return 0 if settings.TRANSCRIBE_AGENT_CHANNEL == "left" else 1
+
+
+def _recognize_channel(lang: str, sample_rate: int, speaker: str, chunks: queue.Queue, utterances: list, errors: list):
+    """Hilo de un canal: consume PCM mono de `chunks` hasta `_END` y agrega sus frases a `utterances`."""
+    try:
+        rec = vosk.KaldiRecognizer(get_vosk_model(lang), sample_rate)
+        rec.SetWords(True)
+
+        def collect(result_json: str):
+            result = json.loads(result_json)
+            words = result.get("result", [])
+            if result.get("text") and words:
+                utterances.append({
+                    "speaker": speaker,
+                    "start": round(words[0]["start"], 2),
+                    "end": round(words[-1]["end"], 2),
+                    "text": result["text"],
+                })
+
+        while True:
+            chunk = chunks.get()
+            if chunk is _END:
+                break
+            if rec.AcceptWaveform(chunk):
+                collect(rec.Result())
+        collect(rec.FinalResult())
+    except Exception as e:
+        errors.append(e)
+        # Seguir vaciando la cola para que el lector no quede bloqueado
+        while chunks.get() is not _END:
+            pass
+
+
+def strip_speaker_labels(transcript: str) -> str:
+    """
+    Texto que recibe el analizador: las frases de una transcripción estéreo (`Hablante: frase`
+    por línea) unidas sin las etiquetas. Una transcripción mono queda igual.
+    """
+    return " ".join(_SPEAKER_PREFIX_RE.sub("", line) for line in transcript.splitlines() if line.strip())
+
+
+def transcribe_stereo(source_chunks: Iterable[bytes], lang="es") -> dict:
+    """
+    Transcribe por separado los dos canales de una grabación estéreo.
+    Devuelve `{"text", "utterances": [{"speaker", "start", "end", "text"}], "channels": {"agent", "caller"}}`
+    con las frases ordenadas por inicio y `text` como líneas `Hablante: frase`.
+    """
+    get_vosk_model(lang)  # cargar antes de arrancar los hilos
+    agent_index = agent_channel_index()
+    speakers_by_index = {agent_index: "agent", 1 - agent_index: "caller"}
+
+    queues = {speaker: queue.Queue(maxsize=CHANNEL_QUEUE_CHUNKS) for speaker in SPEAKERS}
+    results = {speaker: [] for speaker in SPEAKERS}
+    errors = []
+    threads = [
+        threading.Thread(
+            target=_recognize_channel,
+            args=(lang, PCM_SAMPLE_RATE, speaker, queues[speaker], results[speaker], errors),
+            name=f"vosk-{speaker}",
+            daemon=True,
+        )
+        for speaker in SPEAKERS
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        # Bloques de 0.25 s por canal: frames intercalados L/R de 4 bytes
+        pending = b""
+        for data in decode_to_pcm(source_chunks, sample_rate=PCM_SAMPLE_RATE, channels=2, chunk_bytes=PCM_CHUNK_BYTES * 2):
+            data = pending + data
+            whole = len(data) - len(data) % 4
+            pending = data[whole:]
+            frames = np.frombuffer(data[:whole], dtype="<i2").reshape(-1, 2)
+            for index, speaker in speakers_by_index.items():
+                queues[speaker].put(frames[:, index].tobytes())
+    finally:
+        for speaker in SPEAKERS:
+            queues[speaker].put(_END)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+    utterances = sorted(results["agent"] + results["caller"], key=lambda u: (u["start"], u["end"]))
+    logger.debug(
+        f"Transcripción estéreo: {len(results['agent'])} frases del agente, "
+        f"{len(results['caller'])} del cliente."
+    )
+    return {
+        "text": "\n".join(f"{SPEAKER_LABELS[u['speaker']]}: {u['text']}" for u in utterances),
+        "utterances": utterances,
+        "channels": {speaker: " ".join(u["text"] for u in results[speaker]) for speaker in SPEAKERS},
+    }
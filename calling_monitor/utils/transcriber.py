@@ -2,38 +2,43 @@
 import shutil # Make sure this is at the top
 import wave
 import json
-from vosk import Model, KaldiRecognizer
-import soundfile as sf
 import tempfile 
-import numpy as np # Needed for array manipulation if converting audio
 import os # Import the os module
 import io
-from pydub import AudioSegment
-from pydub.utils import get_prober_name, get_encoder_name, which
+from shutil import which
 import mimetypes
-import spacy
 import logging
-import gc
 import tracemalloc  # Para debugging memoria opcional
+from .audio_helper import iter_audio_from_url
+from .audio_stream import PCM_SAMPLE_RATE, decode_to_pcm, iter_file_chunks
+from .parallel_transcriber import transcribe_parallel
+from .stereo_transcriber import peek_chunks, probe_channels, transcribe_stereo
+from .vosk_models import get_vosk_model, vosk_models
+from django.conf import settings
+from gvhc.lazy_imports import lazy_import
 
 logger = logging.getLogger(__name__)
 
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Detect if running inside Docker
-RUNNING_IN_DOCKER = os.path.exists("/.dockerenv")
+# Las rutas de los modelos viven en settings.VOSK_MODEL_PATHS; los modelos se cargan una sola
+# vez por proceso en el registro de vosk_models (nunca por petición).
+VOSK_MODEL_ES_PATH = vosk_models.model_paths["es"]
+VOSK_MODEL_EN_PATH = vosk_models.model_paths["en"]
 
-if RUNNING_IN_DOCKER:
-    # Path inside Docker (host folder mounted at /models)
-    VOSK_MODEL_ES_PATH = "/models/vosk-model-es-0.42"
-    VOSK_MODEL_EN_PATH = "/models/vosk-model-en-us-0.22"
-else:
-    # Path in local development (Windows)
-    VOSK_MODEL_ES_PATH = os.path.join(BASE_DIR, "models", "vosk-model-es-0.42")
-    VOSK_MODEL_EN_PATH = os.path.join(BASE_DIR, "models", "vosk-model-en-us-0.22")
+# Vosk y spaCy se importan en el primer uso: importar este módulo (vistas, tareas) no los carga
+vosk = lazy_import("vosk")
+spacy = lazy_import("spacy")
 
+_nlp_model = None
 
-NLP_MODEL = spacy.load("en_core_web_md")
+
+def get_nlp_model():
+    """Modelo en_core_web_md para analyze_transcript, cargado en el primer uso."""
+    global _nlp_model
+    if _nlp_model is None:
+        _nlp_model = spacy.load("en_core_web_md")
+    return _nlp_model
 
 ffmpeg_local_path = os.path.join(BASE_DIR, "env", "ffmpeg", "bin")
 
@@ -49,7 +54,7 @@ if not which("ffprobe"):
     logger.error("❌ FFprobe no se encontró en el PATH del sistema.")
 
 def analyze_transcript(text):
-    doc = NLP_MODEL(text)
+    doc = get_nlp_model()(text)
     logger.debug("Tokens y POS:")
     for token in doc:
         logger.debug(f"{token.text} ({token.pos_})")
@@ -74,19 +79,16 @@ if __name__ == "__main__":
 
 
 def get_vosk_model_path(lang="es"):
-    if lang == "es":
-        return VOSK_MODEL_ES_PATH
-    elif lang == "en":
-        return VOSK_MODEL_EN_PATH
-    else:
+    if lang not in vosk_models.model_paths:
         raise ValueError("Unsupported language for Vosk model. Choose 'es' or 'en'.")
+    return vosk_models.model_paths[lang]
 
-def transcribe_audio(file_path, model_path=VOSK_MODEL_ES_PATH):
-    logger.debug(f"Transcribing audio from disk: {file_path} using model: {model_path}")
+def transcribe_audio(file_path, lang="es"):
+    logger.debug(f"Transcribing audio from disk: {file_path} using model: {lang}")
 
-    model = Model(model_path)
+    model = get_vosk_model(lang)
     with wave.open(file_path, "rb") as wf:  # Aquí abres el archivo con context manager
-        rec = KaldiRecognizer(model, wf.getframerate())
+        rec = vosk.KaldiRecognizer(model, wf.getframerate())
 
         results = []
         while True:
@@ -101,8 +103,8 @@ def transcribe_audio(file_path, model_path=VOSK_MODEL_ES_PATH):
 
     return " ".join(results)
 
-def transcribe_audio_filelike(file_like_obj, model_path=VOSK_MODEL_ES_PATH): # Default to Spanish
-    logger.debug(f"Transcribing file-like object using temp file, model: {model_path}")
+def transcribe_audio_filelike(file_like_obj, lang="es"): # Default to Spanish
+    logger.debug(f"Transcribing file-like object using temp file, model: {lang}")
     mime_type, _ = mimetypes.guess_type("archivo.wav")
     file_like_obj.seek(0)
     logger.debug(f"Detected MIME type: {mime_type}")
@@ -110,62 +112,66 @@ def transcribe_audio_filelike(file_like_obj, model_path=VOSK_MODEL_ES_PATH): # D
     with tempfile.NamedTemporaryFile(delete=True, suffix=".wav") as temp_wav:
         temp_wav.write(file_like_obj.read())
         temp_wav.flush()
-        return transcribe_audio(temp_wav.name, model_path) # Pass model_path here
+        return transcribe_audio(temp_wav.name, lang)
+
+def recognize_pcm(pcm_chunks, lang="es", sample_rate=PCM_SAMPLE_RATE) -> str:
+    """Pasa bloques de PCM s16le mono por KaldiRecognizer a medida que llegan."""
+    rec = vosk.KaldiRecognizer(get_vosk_model(lang), sample_rate)
+    results = []
+    for chunk in pcm_chunks:
+        if rec.AcceptWaveform(chunk):
+            part_result = json.loads(rec.Result())
+            if part_result.get("text"):
+                results.append(part_result["text"])
+
+    # Get the final result for any remaining audio
+    final_result = json.loads(rec.FinalResult())
+    if final_result.get("text"):
+        results.append(final_result["text"])
+    return " ".join(results).strip()
+
+
+def transcribe_stream(source_chunks, lang="es") -> str:
+    """Transcribe audio en cualquier formato que entienda ffmpeg, recibido en bloques."""
+    get_vosk_model(lang)  # ValueError si el idioma no tiene modelo, antes de lanzar ffmpeg
+    return recognize_pcm(decode_to_pcm(source_chunks, sample_rate=PCM_SAMPLE_RATE), lang)
+
+
+def transcribe_audio_url(audio_url, lang="es") -> str:
+    """Descarga y transcribe al mismo tiempo: el cuerpo HTTP va directo a ffmpeg y de ahí a Vosk."""
+    logger.debug(f"Transcribing audio streamed from URL with model: {lang}")
+    full_transcript = transcribe_stream(iter_audio_from_url(audio_url), lang)
+    logger.debug(f"Full transcription result: {full_transcript}")
+    return full_transcript
+
+
+def transcribe_recording(source_chunks, lang="es") -> dict:
+    """
+    Elige la ruta de transcripción de una grabación completa:
+    estéreo → un transcript por canal (agente/cliente) unido por tiempo;
+    mono → segmentos en paralelo si TRANSCRIBE_PARALLEL, o un solo reconocedor.
+    Siempre devuelve al menos `{"text"}`; las otras claves dependen de la ruta.
+    """
+    get_vosk_model(lang)
+    if settings.TRANSCRIBE_SPLIT_STEREO:
+        head, source_chunks = peek_chunks(source_chunks)
+        channels = probe_channels(head)
+        logger.debug(f"Grabación con {channels} canal(es).")
+        if channels == 2:
+            return {**transcribe_stereo(source_chunks, lang), "stereo": True}
+    if settings.TRANSCRIBE_PARALLEL:
+        return transcribe_parallel(source_chunks, lang)
+    return {"text": transcribe_stream(source_chunks, lang)}
+
 
 def transcribe_audio_filelike_no_disk(file_like_obj, lang="es", enable_tracemalloc=False):
+    """Transcribe un archivo abierto (o una ruta) decodificándolo en streaming con ffmpeg."""
     if enable_tracemalloc:
         tracemalloc.start()
         logger.debug("tracemalloc started")
 
-    model = VOSK_MODELS.get(lang)
-    if not model:
-        raise ValueError(f"Unsupported language {lang}")
-
     try:
-        file_like_obj.seek(0)
-
-        logger.debug("Attempting to load audio with pydub...")
-        audio_segment = AudioSegment.from_file(file_like_obj)
-
-        if audio_segment.frame_rate != 16000:
-            logger.debug(f"Resampling audio from {audio_segment.frame_rate}Hz to 16000Hz.")
-            audio_segment = audio_segment.set_frame_rate(16000)
-        if audio_segment.channels != 1:
-            logger.debug(f"Converting audio from {audio_segment.channels} channels to mono.")
-            audio_segment = audio_segment.set_channels(1)
-
-        wav_buffer = io.BytesIO()
-        audio_segment.export(
-            wav_buffer,
-            format="wav",
-            parameters=["-acodec", "pcm_s16le", "-ar", "16000", "-ac", "1"],
-        )
-        wav_buffer.seek(0)
-
-        logger.debug("Pydub successfully processed audio into WAV format in memory.")
-
-        samplerate = audio_segment.frame_rate  # Should be 16000 now
-        rec = KaldiRecognizer(model, samplerate)
-        logger.debug(f"KaldiRecognizer initialized with samplerate: {samplerate}.")
-
-        results = []
-        chunk_size = 4000  # Read in chunks (e.g., 4000 bytes)
-
-        while True:
-            data_chunk = wav_buffer.read(chunk_size)
-            if len(data_chunk) == 0:
-                break
-            if rec.AcceptWaveform(data_chunk):
-                part_result = json.loads(rec.Result())
-                if part_result.get("text"):
-                    results.append(part_result["text"])
-
-        # Get the final result for any remaining audio
-        final_result = json.loads(rec.FinalResult())
-        if final_result.get("text"):
-            results.append(final_result["text"])
-
-        full_transcript = " ".join(results).strip()
+        full_transcript = transcribe_stream(iter_file_chunks(file_like_obj), lang)
         logger.debug(f"Full transcription result: {full_transcript}")
 
         if enable_tracemalloc:
@@ -176,14 +182,8 @@ def transcribe_audio_filelike_no_disk(file_like_obj, lang="es", enable_tracemall
                 logger.debug(stat)
             tracemalloc.stop()
 
-        # Limpieza manual para liberar memoria
-        del audio_segment
-        del wav_buffer
-        del rec
-        gc.collect()
-
         return full_transcript
 
     except Exception as e:
         logger.error(f"Error inside transcribe_audio_filelike_no_disk: {str(e)}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
@@ -0,0 +1,127 @@
+# calling_monitor/utils/vosk_models.py
+"""
+Registro de modelos de Vosk compartido por todo el proceso.
+
+Cada modelo (varios GB) se carga una sola vez por proceso: en el primer uso, o al arrancar
+si su idioma está en `settings.VOSK_PRELOAD` (ver `preload_vosk_models`, que llaman el worker
+de Celery y el servidor ASGI). Después, obtener un modelo es una búsqueda en un diccionario.
+
+`stats()` expone el tiempo de carga y el RSS que sumó cada modelo (medido con psutil).
+"""
+import logging
+import os
+import threading
+import time
+
+import psutil
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+WARM_UP_SAMPLE_RATE = 16000
+
+
+class VoskModelRegistry:
+    def __init__(self, model_paths: dict):
+        self.model_paths = dict(model_paths)
+        self._models = {}
+        self._stats = {}
+        # Una carga a la vez: así el RSS medido corresponde a un solo modelo y dos hilos
+        # que piden el mismo idioma no lo cargan dos veces.
+        self._load_lock = threading.Lock()
+
+    def languages(self) -> list[str]:
+        return list(self.model_paths)
+
+    def is_loaded(self, lang: str) -> bool:
+        return lang in self._models
+
+    def get(self, lang: str):
+        model = self._models.get(lang)
+        if model is None:
+            model = self.load(lang)
+        return model
+
+    def load(self, lang: str):
+        if lang not in self.model_paths:
+            raise ValueError(f"Unsupported language {lang}")
+        with self._load_lock:
+            model = self._models.get(lang)
+            if model is not None:
+                return model
+
+            from vosk import Model
+
+            path = self.model_paths[lang]
+            if not os.path.isdir(path):
+                raise FileNotFoundError(f"No se encontró el modelo de Vosk para '{lang}' en {path}")
+
+            process = psutil.Process()
+            rss_before = process.memory_info().rss
+            started = time.perf_counter()
+            logger.info(f"🧠 Cargando modelo de Vosk '{lang}' desde {path}...")
+            model = Model(path)
+            load_seconds = time.perf_counter() - started
+            rss_added = process.memory_info().rss - rss_before
+
+            self._models[lang] = model
+            self._stats[lang] = {
+                "path": path,
+                "load_seconds": round(load_seconds, 2),
+                "rss_mb": round(rss_added / (1024 * 1024), 1),
+                "warm_up_seconds": None,
+            }
+            logger.info(f"✅ Modelo de Vosk '{lang}' cargado en {load_seconds:.1f}s (+{rss_added / (1024 * 1024):.0f} MB RSS).")
+            return model
+
+    def warm_up(self, lang: str) -> float:
+        """Carga el modelo (si hace falta) y le pasa un segundo de silencio. Devuelve los segundos del warm-up."""
+        from vosk import KaldiRecognizer
+
+        model = self.get(lang)
+        started = time.perf_counter()
+        recognizer = KaldiRecognizer(model, WARM_UP_SAMPLE_RATE)
+        recognizer.AcceptWaveform(b"\0\0" * WARM_UP_SAMPLE_RATE)
+        recognizer.FinalResult()
+        elapsed = time.perf_counter() - started
+        self._stats[lang]["warm_up_seconds"] = round(elapsed, 3)
+        logger.info(f"🔥 Warm-up del modelo de Vosk '{lang}' en {elapsed:.2f}s.")
+        return elapsed
+
+    def stats(self) -> dict:
+        """Por idioma: `loaded`, `path` y, si está cargado, `load_seconds`, `rss_mb` y `warm_up_seconds`."""
+        return {
+            lang: {"loaded": lang in self._models, "path": path, **self._stats.get(lang, {})}
+            for lang, path in self.model_paths.items()
+        }
+
+
+vosk_models = VoskModelRegistry(settings.VOSK_MODEL_PATHS)
+
+
+def get_vosk_model(lang: str):
+    return vosk_models.get(lang)
+
+
+def preload_vosk_models(languages=None, warm_up=None) -> None:
+    """Carga (y opcionalmente calienta) los modelos indicados; por defecto `settings.VOSK_PRELOAD`."""
+    languages = settings.VOSK_PRELOAD if languages is None else languages
+    warm_up = settings.VOSK_WARM_UP if warm_up is None else warm_up
+    for lang in languages:
+        try:
+            if warm_up:
+                vosk_models.warm_up(lang)
+            else:
+                vosk_models.load(lang)
+        except Exception as e:
+            # Un modelo que falta no debe impedir que el proceso arranque; se reintentará en el primer uso
+            logger.error(f"No se pudo precargar el modelo de Vosk '{lang}': {e}", exc_info=True)
+
+
+def preload_vosk_models_in_background() -> threading.Thread | None:
+    """Para servidores que no deben demorar su arranque: las peticiones esperan al modelo en el lock."""
+    if not settings.VOSK_PRELOAD:
+        return None
+    thread = threading.Thread(target=preload_vosk_models, name="vosk-preload", daemon=True)
+    thread.start()
+    return thread
@@ -1,27 +1,31 @@
 #calling_monitor/views.py
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
-from .models import CallAnalysis
+from django.urls import reverse
+from django.utils.dateparse import parse_date
+from asgiref.sync import sync_to_async
+from .batches import batch_concurrency, create_analysis_batch, visible_batches
+from .jobs import cached_analysis_result, enqueue_analysis_job, find_cached_analysis, get_visible_job
+from .models import AnalysisBatch, CallAnalysis
+from .tasks import advance_analysis_batch
+from .utils.grammar import GrammarServiceBusy, check_grammar
 import json
 import os # Import the os module
 from io import BytesIO
 import requests 
 import tempfile
 import logging
-from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.decorators import api_view, permission_classes
-from dashboards.views import get_sharpen_audio_url
-from .utils.audio_helper import get_audio_from_url # Importa la nueva función
-from .utils.transcriber import transcribe_audio_filelike_no_disk # Import get_vosk_model_path too
+from rest_framework.decorators import api_view
+from .utils.transcriber import transcribe_audio_filelike_no_disk, transcribe_audio_url
 from .utils.analyzer import extract_information
 from bs4 import BeautifulSoup
-import language_tool_python
 from urllib.parse import urljoin, unquote, urlparse, urlunparse # Asegúrate de importar unquote
 
 logger = logging.getLogger(__name__)
 
+
 @csrf_exempt
 def analyze_remote_audio(request):
     if request.method != "POST":
@@ -32,6 +36,7 @@ def analyze_remote_audio(request):
         audio_url = data.get("audioUrl")
         unique_id = data.get("uniqueID")
         lang = data.get("lang", "es")
+        force = str(data.get("force", "")).lower() in ('true', '1', 't')
 
         logger.debug(f"Intentando analizar audio desde URL: {audio_url}, Unique ID: {unique_id}, Lang: {lang}")
 
@@ -39,9 +44,26 @@ def analyze_remote_audio(request):
             logger.error(f"Faltan parámetros: audioUrl={audio_url}, uniqueID={unique_id}")
             return JsonResponse({"error": "Faltan parámetros (audioUrl o uniqueID)."}, status=400)
 
-        audio_data = get_audio_from_url(audio_url)
+        cached = None if force else find_cached_analysis(unique_id, lang)
+        if cached:
+            logger.info(f"Análisis de {unique_id} ({lang}) servido desde CallAnalysis {cached.id}.")
+            analysis = cached.analysis_dict()
+            return JsonResponse({
+                "id": cached.id,
+                "transcript": cached.transcript,
+                "analysis": {
+                    "high_risk_warnings": analysis["high_risk_warnings"],
+                    "call_motives": analysis["call_motives"],
+                    "motivos": analysis["motivos"],
+                    "agent_actions": analysis["acciones_agente"],
+                },
+                "message": "Análisis recuperado (ya existía para esta llamada).",
+                "language_used": lang,
+                "cached": True,
+            })
 
-        transcription_result = transcribe_audio_filelike_no_disk(audio_data, lang=lang)
+        # Descarga y transcripción en streaming (sin copias completas del audio en memoria)
+        transcription_result = transcribe_audio_url(audio_url, lang=lang)
         logger.debug(f"Tipo de transcripción: {type(transcription_result)}, Valor: {transcription_result}")
         if isinstance(transcription_result, tuple):
             transcript = transcription_result[0]
@@ -50,21 +72,22 @@ def analyze_remote_audio(request):
         logger.info(f"Transcripción completada para {unique_id}.")        # LLAMADA ACTUALIZADA a extract_information
         analysis = extract_information(transcript, lang=lang)
 
-        instance = CallAnalysis.objects.create(
-            audio_file=None,
-            transcript=transcript,
-            # Ahora guardamos los nuevos campos
-            high_risk_warnings=json.dumps(analysis["high_risk_warnings"]), # Guarda como JSON string
-            call_motives=json.dumps(analysis["call_motives"]), # Guarda como JSON string
-            # Los siguientes campos podrían ser redundantes si "motivos" y "acciones_agente"
-            # son ahora cubiertos por high_risk_warnings y call_motives.
-            # Decide si aún los necesitas o si el nuevo análisis los reemplaza.
-            motives=json.dumps(analysis.get("motivos", [])), # Usar .get para evitar KeyError si lo eliminas
-            agent_actions=json.dumps(analysis.get("acciones_agente", [])),
+        # update_or_create: un re-análisis (force) reemplaza el registro de la llamada en ese idioma;
+        # los análisis en otros idiomas se conservan
+        instance, _ = CallAnalysis.objects.update_or_create(
             unique_id=unique_id,
-            language_used=lang
+            language_used=lang,
+            defaults={
+                "audio_file": None,
+                "transcript": transcript,
+                # Listas nativas en los JSONField, igual que run_transcription_job
+                "high_risk_warnings": analysis["high_risk_warnings"],
+                "call_motives": analysis["call_motives"],
+                "motives": analysis.get("motivos", []),
+                "agent_actions": analysis.get("acciones_agente", []),
+            },
         )
-        logger.info(f"Instancia CallAnalysis creada con ID: {instance.id}")
+        logger.info(f"Instancia CallAnalysis guardada con ID: {instance.id}")
 
         return JsonResponse({
             "id": instance.id,
@@ -115,104 +138,141 @@ def process_call(request):
     return JsonResponse({"error": "Método no permitido"}, status=405)
 
 @csrf_exempt
-def grammar_correction2(request):
+async def grammar_correction2(request):
+    """
+    Corrige `text` con el pool de LanguageTool del proceso (ver utils/grammar.py).
+    La revisión corre en un hilo aparte para que varias peticiones usen el pool a la vez.
+    """
     if request.method == "POST":
         data = json.loads(request.body)
         user_text = data.get('text')
 
         if user_text:
-            # Configurar LanguageTool con opciones avanzadas
-            tool = language_tool_python.LanguageTool('en-US', config={
-                'maxTextLength': 500, 
-                'maxErrorsPerWordRate': 0.5,
-                'maxSpellingSuggestions': 3,  # Solo 3 sugerencias de ortografía por error
-                'cacheSize': 20,  # Tamaño de caché
-                'cacheTTLSeconds': 300,  # Tiempo de vida de caché: 5 minutos
-                'pipelineCaching': True,  # Habilita caché de pipelines
-                'pipelineExpireTimeInSeconds': 600,  # Cache de pipelines expira en 10 minutos
-                })
-            tool.disable_spellchecking = False
-            tool.picky = True  # Activa picky mode para sugerencias detalladas
-
-            # Realizar la corrección
-            matches = tool.check(user_text)
-            corrected_text = language_tool_python.utils.correct(user_text, matches)
-
-            # Crear una respuesta detallada con sugerencias de corrección
-            suggestions = [
-                {
-                    "error": match.context,
-                    "suggestions": match.replacements,
-                    "rule": match.ruleId
-                }
-                for match in matches
-            ]
-            
-            return JsonResponse({"corrected_text": corrected_text, "suggestions": suggestions})
+            try:
+                result = await sync_to_async(check_grammar, thread_sensitive=False)(user_text)
+            except GrammarServiceBusy as e:
+                logger.warning(f"Corrección gramatical rechazada: {e}")
+                return JsonResponse({"error": "El servicio de corrección está ocupado, intenta de nuevo."}, status=503)
+            except Exception as e:
+                logger.error(f"Error en la corrección gramatical: {e}", exc_info=True)
+                return JsonResponse({"error": "No se pudo revisar el texto."}, status=502)
+
+            return JsonResponse(result)
         else:
             return JsonResponse({"error": "No text provided"}, status=400)
     return JsonResponse({"error": "Invalid request method"}, status=405)
 
 
 @api_view(['POST'])
-@permission_classes([AllowAny])  # 👈 Esto es lo que necesitas
 def analyze_sharpen_audio(request):
     """
-    Endpoint que analiza audio de Sharpen directamente.
-    Espera `mixmonFileName`, `uniqueID` y opcionalmente `lang`.
+    Encola el análisis de una grabación de Sharpen y responde de inmediato con el ID del trabajo.
+    Espera `mixmonFileName`, `uniqueID` y opcionalmente `lang`. Requiere un usuario autenticado,
+    que es quien luego puede consultar el trabajo.
+
+    El resultado se consulta en `transcription_job_status` o llega por WebSocket
+    (`{"type": "transcriptionJob", "job": {...}}`) tras enviar `{"type": "watchJob", "jobId": ...}`.
+
+    Si la llamada ya se analizó en ese idioma responde 200 con el resultado guardado
+    (`cached: true`), salvo que se envíe `force`; `audioSha256` exige además que sea el mismo audio.
+    Si ya hay un trabajo en curso para la llamada se devuelve ese (`deduplicated: true`).
     """
     mixmon_file_name = request.data.get("mixmonFileName")
     unique_id = request.data.get("uniqueID")
     lang = request.data.get("lang", "en")
+    force = str(request.data.get("force", "")).lower() in ('true', '1', 't')
+    audio_sha256 = request.data.get("audioSha256")
 
     if not mixmon_file_name or not unique_id:
         logger.error(f"Faltan parámetros en la solicitud. mixmonFileName: {mixmon_file_name}, uniqueID: {unique_id}") # <-- Mejora el log aquí
         return Response({"error": "mixmonFileName y uniqueID son requeridos"}, status=400)
 
+    if not force:
+        cached = find_cached_analysis(unique_id, lang, audio_sha256)
+        if cached:
+            logger.info(f"Análisis de {unique_id} ({lang}) servido desde CallAnalysis {cached.id}.")
+            return Response({
+                "status": "done",
+                "cached": True,
+                "uniqueID": unique_id,
+                "lang": lang,
+                "analysisId": cached.id,
+                "audioSha256": cached.audio_sha256 or None,
+                "result": cached_analysis_result(cached),
+            })
+
     try:
-        # 1. Obtener la URL firmada de Sharpen (lógica específica de esta vista)
-        sharpen_proxy_url = get_sharpen_audio_url(mixmon_file_name, unique_id)
-        if not sharpen_proxy_url:
-            logger.error(f"No se pudo obtener la URL del proxy de Sharpen para {unique_id}. Sharpen API no devolvió URL.")
-            return Response({"error": "No se pudo obtener la URL de audio de Sharpen"}, status=500)
-        
-        logger.info(f"URL de proxy de Sharpen obtenida para {unique_id}: {sharpen_proxy_url}")
-        
-        # 2. Usar la función unificada para descargar y resolver la URL
-        audio_data = get_audio_from_url(sharpen_proxy_url)
-
-        # 3. El resto de la lógica de transcripción y análisis es la misma
-        logger.info(f"Iniciando transcripción para {unique_id}...")
-        transcription_result = transcribe_audio_filelike_no_disk(audio_data, lang)
-        if isinstance(transcription_result, tuple):
-            transcription_text = transcription_result[0]
-        else:
-            transcription_text = transcription_result
-            
-        logger.info(f"Transcripción completada para {unique_id}.")
-        
-        analysis = extract_information(transcription_text, lang=lang)
-        logger.info(f"Análisis Spacy completado para {unique_id}.")
-
-        instance = CallAnalysis.objects.create(
-            audio_file=None,
-            transcript=transcription_text,
-            high_risk_warnings=json.dumps(analysis.get("high_risk_warnings", [])),
-            call_motives=json.dumps(analysis.get("call_motives", [])),
-            motives=json.dumps(analysis.get("motivos", [])),
-            agent_actions=json.dumps(analysis.get("acciones_agente", [])),
-            unique_id=unique_id,
-            language_used=lang,
-        )
-        logger.info(f"Instancia CallAnalysis creada para audio de Sharpen con ID: {instance.id}")
+        job, created = enqueue_analysis_job(mixmon_file_name, unique_id, lang, user=request.user)
+    except Exception as e:
+        logger.error(f"No se pudo encolar el análisis para {unique_id}: {e}", exc_info=True)
+        return Response({"error": f"No se pudo encolar el análisis: {str(e)}"}, status=500)
+
+    return Response({
+        **job.to_dict(),
+        "cached": False,
+        "deduplicated": not created,
+        "statusUrl": request.build_absolute_uri(reverse('transcription_job_status', args=[job.id])),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def transcription_job_status(request, job_id):
+    """
+    Estado de un trabajo de análisis; con `status: done` incluye `result` (transcripción + análisis).
+    Sólo para quien lo pidió (o se unió a él) y los roles con acceso completo; para el resto es un 404.
+    """
+    job = get_visible_job(job_id, request.user)
+    if job is None:
+        return Response({"error": "Trabajo no encontrado"}, status=404)
+    return Response(job.to_dict())
+
 
-        return Response({
-            "status": "success",
-            "transcription": transcription_text,
-            "uniqueID": unique_id,
-            "analysis": analysis,
-        }, status=status.HTTP_200_OK)
+@api_view(['POST'])
+def analysis_batches(request):
+    """
+    Crea un lote con todas las grabaciones del CDR de Sharpen entre `dateFrom` y `dateTo`
+    (YYYY-MM-DD, ambos incluidos), opcionalmente de una `queue`, y empieza a analizarlas con
+    `concurrency` trabajos a la vez (como mucho TRANSCRIBE_BATCH_MAX_CONCURRENCY). Las llamadas
+    ya analizadas se omiten.
+    """
+    date_from = parse_date(str(request.data.get("dateFrom", "")))
+    date_to = parse_date(str(request.data.get("dateTo", request.data.get("dateFrom", ""))))
+    if not date_from or not date_to or date_to < date_from:
+        return Response({"error": "dateFrom y dateTo (YYYY-MM-DD) son requeridos"}, status=400)
+    try:
+        concurrency = int(request.data["concurrency"]) if request.data.get("concurrency") not in (None, "") else None
+        # Lo que pase de TRANSCRIBE_BATCH_MAX_CONCURRENCY se recorta
+        concurrency = batch_concurrency(concurrency)
+    except (TypeError, ValueError):
+        return Response({"error": "concurrency debe ser un entero mayor que 0"}, status=400)
 
+    try:
+        batch = create_analysis_batch(
+            date_from, date_to,
+            queue=request.data.get("queue", ""),
+            lang=request.data.get("lang", "en"),
+            concurrency=concurrency,
+            user=request.user,
+        )
     except Exception as e:
-        logger.error(f"Error durante el proceso de análisis para {unique_id}: {e}", exc_info=True)
-        return Response({"error": f"Ocurrió un error al procesar la URL: {str(e)}"}, status=500)
+        logger.error(f"No se pudo crear el lote de análisis: {e}", exc_info=True)
+        return Response({"error": f"No se pudo crear el lote: {str(e)}"}, status=502)
+
+    advance_analysis_batch.delay(str(batch.id))
+    return Response({
+        **batch.to_dict(),
+        "statusUrl": request.build_absolute_uri(reverse('analysis_batch_status', args=[batch.id])),
+    }, status=status.HTTP_202_ACCEPTED)
+
+
+@api_view(['GET'])
+def analysis_batch_status(request, batch_id):
+    """
+    Progreso de un lote (programadas, omitidas, en curso, terminadas, fallidas y grabaciones/hora).
+    Como los trabajos, sólo lo ve quien lo pidió y los roles con acceso completo.
+    """
+    try:
+        batch = visible_batches(request.user).get(pk=batch_id)
+    except AnalysisBatch.DoesNotExist:
+        return Response({"error": "Lote no encontrado"}, status=404)
+    return Response(batch.to_dict())
@@ -0,0 +1,293 @@
+# dashboards/recording_cache.py
+"""
+Caché en disco de las grabaciones descargadas de S3, compartida por el proxy de audio y el
+worker de transcripción (montar `RECORDING_CACHE_DIR` en un volumen común).
+
+- Cada grabación (`uniqueID` + `mixmonFileName`) se guarda como `<dir>/<ab>/<sha1>.audio` con
+  sus metadatos (tamaño, sha256 del contenido, Content-Type) en `<sha1>.json`.
+- Las escrituras van a un temporal en el mismo directorio y se publican con `os.replace`, así
+  que nadie lee una grabación a medias; una descarga interrumpida o incompleta se descarta.
+- Expulsión LRU por tamaño (`RECORDING_CACHE_MAX_MB`) y por antigüedad desde el último uso
+  (`RECORDING_CACHE_MAX_AGE`); cada acierto actualiza el mtime del archivo.
+
+Se llena al pasar la descarga completa por `tee`/`atee` mientras se reproduce o se transcribe.
+`atee` corre en el event loop de Daphne, así que todo su acceso a disco (abrir el temporal,
+escribir, publicar) va a hilos aparte, en bloques de `ASYNC_FLUSH_BYTES`.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import AsyncIterable, Iterable, NamedTuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+AUDIO_SUFFIX = ".audio"
+META_SUFFIX = ".json"
+TMP_SUFFIX = ".tmp"
+# Temporales huérfanos (proceso caído a mitad de una descarga) que se borran al expulsar
+STALE_TMP_SECONDS = 3600
+# `atee` acumula en memoria hasta este tamaño y escribe en un hilo: un salto de hilo por bloque grande, no por chunk
+ASYNC_FLUSH_BYTES = 1024 * 1024
+
+
+def _in_thread(fn):
+    return sync_to_async(fn, thread_sensitive=False)
+
+
+class CachedRecording(NamedTuple):
+    path: str
+    size: int
+    sha256: str
+    content_type: str
+    cached_at: float
+
+    @property
+    def etag(self) -> str:
+        return f'"{self.sha256}"'
+
+
+class RecordingWriter:
+    """Escribe una grabación en un temporal; `commit()` la publica y `abort()` la descarta."""
+
+    def __init__(self, cache: "RecordingCache", digest: str, content_type: str, expected_size: int | None = None):
+        self.cache = cache
+        self.digest = digest
+        self.content_type = content_type
+        self.expected_size = expected_size
+        self.size = 0
+        self._sha256 = hashlib.sha256()
+        directory = os.path.dirname(cache.audio_path(digest))
+        os.makedirs(directory, exist_ok=True)
+        self._file = tempfile.NamedTemporaryFile(dir=directory, suffix=TMP_SUFFIX, delete=False)
+
+    def write(self, chunk: bytes) -> None:
+        self._file.write(chunk)
+        self._sha256.update(chunk)
+        self.size += len(chunk)
+        if self.size > self.cache.max_bytes:
+            raise ValueError("La grabación supera el tamaño máximo de la caché")
+
+    def commit(self) -> CachedRecording | None:
+        self._file.close()
+        if not self.size or (self.expected_size is not None and self.size != self.expected_size):
+            logger.warning(
+                f"Grabación incompleta ({self.size} de {self.expected_size} bytes); no se guarda en caché."
+            )
+            self._discard()
+            return None
+        recording = CachedRecording(
+            path=self.cache.audio_path(self.digest),
+            size=self.size,
+            sha256=self._sha256.hexdigest(),
+            content_type=self.content_type,
+            cached_at=time.time(),
+        )
+        try:
+            os.replace(self._file.name, recording.path)
+            self.cache._write_meta(self.digest, recording)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la grabación en caché: {e}")
+            self._discard()
+            return None
+        self.cache.evict_soon()
+        return recording
+
+    def abort(self) -> None:
+        self._file.close()
+        self._discard()
+
+    def _discard(self) -> None:
+        try:
+            os.remove(self._file.name)
+        except FileNotFoundError:
+            pass
+
+
+class RecordingCache:
+    def __init__(self, root: str, max_bytes: int, max_age: int, enabled: bool = True):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.enabled = enabled
+        self._evict_lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "stored": 0, "evicted": 0}
+
+    @staticmethod
+    def key(mixmon_file_name: str, recording_key: str) -> str:
+        return hashlib.sha1(f"{recording_key}\0{mixmon_file_name}".encode()).hexdigest()
+
+    def audio_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest + AUDIO_SUFFIX)
+
+    def meta_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest + META_SUFFIX)
+
+    def get(self, mixmon_file_name: str, recording_key: str) -> CachedRecording | None:
+        """Grabación en caché si está completa y no expiró; marca el acceso para la expulsión LRU."""
+        if not self.enabled:
+            return None
+        digest = self.key(mixmon_file_name, recording_key)
+        path = self.audio_path(digest)
+        try:
+            with open(self.meta_path(digest), encoding="utf-8") as f:
+                meta = json.load(f)
+            stat = os.stat(path)
+        except (OSError, ValueError):
+            self._stats["misses"] += 1
+            return None
+
+        if stat.st_size != meta.get("size") or time.time() - stat.st_mtime > self.max_age:
+            self._remove(digest)
+            self._stats["misses"] += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._stats["hits"] += 1
+        return CachedRecording(path, meta["size"], meta["sha256"], meta["content_type"], meta["cached_at"])
+
+    def open_writer(self, mixmon_file_name: str, recording_key: str, content_type: str, expected_size: int | None = None) -> RecordingWriter | None:
+        if not self.enabled or (expected_size is not None and expected_size > self.max_bytes):
+            return None
+        try:
+            return RecordingWriter(self, self.key(mixmon_file_name, recording_key), content_type, expected_size)
+        except OSError as e:
+            logger.warning(f"No se pudo abrir la caché de grabaciones en {self.root}: {e}")
+            return None
+
+    def tee(self, chunks: Iterable[bytes], mixmon_file_name: str, recording_key: str, content_type: str = "audio/wav", expected_size: int | None = None):
+        """Entrega los bloques sin cambios y, si la descarga termina completa, la deja en caché."""
+        writer = self.open_writer(mixmon_file_name, recording_key, content_type, expected_size)
+        try:
+            for chunk in chunks:
+                if writer is not None:
+                    writer = self._write_or_abort(writer, chunk)
+                yield chunk
+        except BaseException:
+            if writer is not None:
+                writer.abort()
+            raise
+        finally:
+            if hasattr(chunks, "close"):
+                chunks.close()
+        if writer is not None and writer.commit():
+            self._stats["stored"] += 1
+
+    async def atee(self, chunks: AsyncIterable[bytes], mixmon_file_name: str, recording_key: str, content_type: str = "audio/wav", expected_size: int | None = None):
+        """
+        Versión asíncrona de `tee`. Nunca toca el disco desde el event loop: el temporal se abre,
+        se escribe (en bloques de `ASYNC_FLUSH_BYTES`) y se publica en hilos aparte.
+        """
+        writer = await _in_thread(self.open_writer)(mixmon_file_name, recording_key, content_type, expected_size)
+        buffer = bytearray()
+        try:
+            async for chunk in chunks:
+                if writer is not None:
+                    buffer += chunk
+                    if len(buffer) >= ASYNC_FLUSH_BYTES:
+                        writer = await _in_thread(self._write_or_abort)(writer, bytes(buffer))
+                        buffer.clear()
+                yield chunk
+        except BaseException:
+            # Incluye el cierre del generador cuando el navegador corta la reproducción. Si esto
+            # también se interrumpe, `evict` borra el temporal huérfano
+            if writer is not None:
+                await _in_thread(writer.abort)()
+            raise
+        finally:
+            # Cerrar el generador de origen devuelve la conexión de S3 al pool
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+        if writer is not None and buffer:
+            writer = await _in_thread(self._write_or_abort)(writer, bytes(buffer))
+        if writer is not None and await _in_thread(writer.commit)():
+            self._stats["stored"] += 1
+
+    def _write_or_abort(self, writer: RecordingWriter, chunk: bytes) -> RecordingWriter | None:
+        try:
+            writer.write(chunk)
+            return writer
+        except (OSError, ValueError) as e:
+            # La caché nunca debe cortar la reproducción ni la transcripción
+            logger.warning(f"Se deja de guardar la grabación en caché: {e}")
+            writer.abort()
+            return None
+
+    def _write_meta(self, digest: str, recording: CachedRecording) -> None:
+        meta_path = self.meta_path(digest)
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(meta_path), suffix=TMP_SUFFIX, delete=False, encoding="utf-8") as f:
+            json.dump(recording._asdict(), f)
+        os.replace(f.name, meta_path)
+
+    def _remove(self, digest: str) -> int:
+        freed = 0
+        for path in (self.audio_path(digest), self.meta_path(digest)):
+            try:
+                freed += os.path.getsize(path)
+                os.remove(path)
+            except OSError:
+                pass
+        return freed
+
+    def evict_soon(self) -> None:
+        """Expulsa en un hilo aparte para no demorar a quien acaba de guardar; una expulsión a la vez."""
+        if self._evict_lock.locked():
+            return
+        threading.Thread(target=self.evict, name="recording-cache-evict", daemon=True).start()
+
+    def evict(self) -> dict:
+        """Borra lo expirado y, del resto, lo usado hace más tiempo hasta quedar bajo `max_bytes`."""
+        if not self._evict_lock.acquire(blocking=False):
+            return {"removed": 0, "freed_bytes": 0}
+        try:
+            now = time.time()
+            entries = []
+            removed = freed = 0
+            for directory, _, files in os.walk(self.root):
+                for name in files:
+                    path = os.path.join(directory, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    if name.endswith(TMP_SUFFIX):
+                        if now - stat.st_mtime > STALE_TMP_SECONDS:
+                            try:
+                                os.remove(path)
+                            except OSError:
+                                pass
+                    elif name.endswith(AUDIO_SUFFIX):
+                        entries.append((stat.st_mtime, stat.st_size, name[:-len(AUDIO_SUFFIX)]))
+
+            total = sum(size for _, size, _ in entries)
+            for mtime, size, digest in sorted(entries):
+                if now - mtime <= self.max_age and total <= self.max_bytes:
+                    break
+                freed += self._remove(digest)
+                total -= size
+                removed += 1
+            self._stats["evicted"] += removed
+            if removed:
+                logger.info(f"🧹 Caché de grabaciones: {removed} expulsadas ({freed / 1024 ** 2:.1f} MB liberados).")
+            return {"removed": removed, "freed_bytes": freed, "total_bytes": total}
+        finally:
+            self._evict_lock.release()
+
+    def stats(self) -> dict:
+        return {"enabled": self.enabled, "dir": self.root, "max_mb": self.max_bytes // 1024 ** 2, **self._stats}
+
+
+recording_cache = RecordingCache(
+    settings.RECORDING_CACHE_DIR,
+    max_bytes=settings.RECORDING_CACHE_MAX_MB * 1024 ** 2,
+    max_age=settings.RECORDING_CACHE_MAX_AGE,
+    enabled=settings.RECORDING_CACHE_ENABLED,
+)
@@ -0,0 +1,122 @@
+# dashboards/recording_urls.py
+"""
+Caché en Redis de las URLs presignadas de grabaciones (`createRecordingURL` de Sharpen).
+
+Las URLs de S3 que devuelve Sharpen valen `X-Amz-Expires` segundos (1200) desde `X-Amz-Date`;
+mientras sigan vigentes, reproducir o analizar otra vez la misma llamada reutiliza la URL en
+lugar de pedir una nueva a Sharpen. La entrada expira en Redis `RECORDING_URL_CACHE_MARGIN`
+segundos antes que la firma, y si S3 responde 403 de todos modos (reloj desfasado, URL revocada)
+quien la usó la invalida y pide una nueva (`get_sharpen_audio_url(..., refresh=True)`).
+"""
+import calendar
+import hashlib
+import logging
+import re
+import time
+from urllib.parse import unquote
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+RECORDING_URL_CACHE_PREFIX = "recording_url"
+
+# La URL puede venir envuelta en una página de Sharpen, así que se buscan los parámetros en toda la URL
+_AMZ_DATE_RE = re.compile(r"X-Amz-Date=(\d{8}T\d{6}Z)", re.IGNORECASE)
+_AMZ_EXPIRES_RE = re.compile(r"X-Amz-Expires=(\d+)", re.IGNORECASE)
+# Firma V2 de S3: `Expires` es el instante de expiración en segundos epoch
+_SIGV2_EXPIRES_RE = re.compile(r"[?&]Expires=(\d{9,})")
+
+
+def presigned_url_expires_at(url: str) -> float | None:
+    """Instante (epoch) en que expira la firma de la URL, o None si no trae los parámetros."""
+    decoded = unquote(url)
+    amz_date = _AMZ_DATE_RE.search(decoded)
+    amz_expires = _AMZ_EXPIRES_RE.search(decoded)
+    if amz_date and amz_expires:
+        signed_at = calendar.timegm(time.strptime(amz_date.group(1).upper(), "%Y%m%dT%H%M%SZ"))
+        return signed_at + int(amz_expires.group(1))
+    sigv2_expires = _SIGV2_EXPIRES_RE.search(decoded)
+    if sigv2_expires:
+        return float(sigv2_expires.group(1))
+    return None
+
+
+def presigned_url_ttl(url: str, now: float | None = None) -> int:
+    """Segundos que la URL puede quedar en caché (vigencia menos el margen); 0 si no se debe guardar."""
+    expires_at = presigned_url_expires_at(url)
+    if expires_at is None:
+        return 0
+    now = time.time() if now is None else now
+    return max(0, int(expires_at - now - settings.RECORDING_URL_CACHE_MARGIN))
+
+
+def recording_url_cache_key(mixmon_file_name: str, recording_key: str) -> str:
+    digest = hashlib.sha1(f"{recording_key}\0{mixmon_file_name}".encode()).hexdigest()
+    return f"{RECORDING_URL_CACHE_PREFIX}:{digest}"
+
+
+def get_cached_recording_url(mixmon_file_name: str, recording_key: str) -> str | None:
+    if not settings.RECORDING_URL_CACHE_ENABLED:
+        return None
+    try:
+        return cache.get(recording_url_cache_key(mixmon_file_name, recording_key))
+    except Exception as e:
+        logger.warning(f"No se pudo leer la URL de grabación en caché para {recording_key}: {e}")
+        return None
+
+
+def cache_recording_url(mixmon_file_name: str, recording_key: str, url: str) -> int:
+    """Guarda la URL hasta poco antes de que expire su firma. Devuelve el TTL usado (0 = no se guardó)."""
+    if not settings.RECORDING_URL_CACHE_ENABLED:
+        return 0
+    ttl = presigned_url_ttl(url)
+    if not ttl:
+        logger.debug(f"URL de grabación de {recording_key} sin vigencia aprovechable; no se guarda en caché.")
+        return 0
+    try:
+        cache.set(recording_url_cache_key(mixmon_file_name, recording_key), url, ttl)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la URL de grabación en caché para {recording_key}: {e}")
+        return 0
+    return ttl
+
+
+def invalidate_recording_url(mixmon_file_name: str, recording_key: str) -> None:
+    try:
+        cache.delete(recording_url_cache_key(mixmon_file_name, recording_key))
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar la URL de grabación en caché para {recording_key}: {e}")
+
+
+async def aget_cached_recording_url(mixmon_file_name: str, recording_key: str) -> str | None:
+    if not settings.RECORDING_URL_CACHE_ENABLED:
+        return None
+    try:
+        return await cache.aget(recording_url_cache_key(mixmon_file_name, recording_key))
+    except Exception as e:
+        logger.warning(f"No se pudo leer la URL de grabación en caché para {recording_key}: {e}")
+        return None
+
+
+async def acache_recording_url(mixmon_file_name: str, recording_key: str, url: str) -> int:
+    if not settings.RECORDING_URL_CACHE_ENABLED:
+        return 0
+    ttl = presigned_url_ttl(url)
+    if not ttl:
+        logger.debug(f"URL de grabación de {recording_key} sin vigencia aprovechable; no se guarda en caché.")
+        return 0
+    try:
+        await cache.aset(recording_url_cache_key(mixmon_file_name, recording_key), url, ttl)
+    except Exception as e:
+        logger.warning(f"No se pudo guardar la URL de grabación en caché para {recording_key}: {e}")
+        return 0
+    return ttl
+
+
+async def ainvalidate_recording_url(mixmon_file_name: str, recording_key: str) -> None:
+    try:
+        await cache.adelete(recording_url_cache_key(mixmon_file_name, recording_key))
+    except Exception as e:
+        logger.warning(f"No se pudo invalidar la URL de grabación en caché para {recording_key}: {e}")
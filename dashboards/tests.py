@@ -1,3 +1,119 @@
-from django.test import TestCase
+import calendar
+import os
+import tempfile
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.utils.http import http_date
+
+from .recording_cache import CachedRecording, RecordingCache
+from .recording_urls import presigned_url_expires_at, presigned_url_ttl
+from .views import _requested_byte_range
+
+SIGNED_AT = calendar.timegm((2026, 10, 18, 12, 0, 0))
+SIGV4_URL = (
+    "https://bucket.s3.amazonaws.com/rec.wav?X-Amz-Algorithm=AWS4-HMAC-SHA256"
+    "&X-Amz-Date=20261018T120000Z&X-Amz-Expires=1200&X-Amz-Signature=abc"
+)
+
+
+@override_settings(RECORDING_URL_CACHE_MARGIN=120)
+class PresignedUrlTtlTests(SimpleTestCase):
+    def test_sigv4_vigencia_menos_el_margen(self):
+        self.assertEqual(presigned_url_expires_at(SIGV4_URL), SIGNED_AT + 1200)
+        self.assertEqual(presigned_url_ttl(SIGV4_URL, now=SIGNED_AT), 1080)
+        self.assertEqual(presigned_url_ttl(SIGV4_URL, now=SIGNED_AT + 1000), 80)
+
+    def test_vencida_o_dentro_del_margen_no_se_guarda(self):
+        self.assertEqual(presigned_url_ttl(SIGV4_URL, now=SIGNED_AT + 1100), 0)
+        self.assertEqual(presigned_url_ttl(SIGV4_URL, now=SIGNED_AT + 5000), 0)
+
+    def test_url_envuelta_y_codificada(self):
+        wrapped = "https://sharpen.example/play?url=" + SIGV4_URL.replace("=", "%3D").replace("&", "%26")
+        self.assertEqual(presigned_url_ttl(wrapped, now=SIGNED_AT), 1080)
+
+    def test_sigv2(self):
+        url = f"https://bucket.s3.amazonaws.com/rec.wav?AWSAccessKeyId=x&Expires={SIGNED_AT + 600}&Signature=y"
+        self.assertEqual(presigned_url_ttl(url, now=SIGNED_AT), 480)
+
+    def test_sin_parametros_de_firma(self):
+        self.assertIsNone(presigned_url_expires_at("https://example.com/rec.wav"))
+        self.assertEqual(presigned_url_ttl("https://example.com/rec.wav", now=SIGNED_AT), 0)
+
+
+class RequestedByteRangeTests(SimpleTestCase):
+    recording = CachedRecording("/tmp/rec.audio", 1000, "abc123", "audio/wav", SIGNED_AT)
+
+    def byte_range(self, range_header=None, **headers):
+        if range_header is not None:
+            headers["HTTP_RANGE"] = range_header
+        return _requested_byte_range(RequestFactory().get("/", **headers), self.recording)
+
+    def test_sin_range_devuelve_el_archivo_completo(self):
+        self.assertIsNone(self.byte_range())
+
+    def test_rangos(self):
+        self.assertEqual(self.byte_range("bytes=0-99"), (0, 99))
+        self.assertEqual(self.byte_range("bytes=900-"), (900, 999))
+        self.assertEqual(self.byte_range("bytes=500-5000"), (500, 999))
+
+    def test_sufijo(self):
+        self.assertEqual(self.byte_range("bytes=-100"), (900, 999))
+        self.assertEqual(self.byte_range("bytes=-5000"), (0, 999))
+
+    def test_no_satisfacible(self):
+        for header in ("bytes=1000-", "bytes=50-10"):
+            with self.assertRaises(ValueError):
+                self.byte_range(header)
+
+    def test_varios_rangos_o_invalido_devuelve_completo(self):
+        self.assertIsNone(self.byte_range("bytes=0-1,5-6"))
+        self.assertIsNone(self.byte_range("bytes=-"))
+        self.assertIsNone(self.byte_range("items=0-10"))
+
+    def test_if_range(self):
+        self.assertEqual(self.byte_range("bytes=0-9", HTTP_IF_RANGE=self.recording.etag), (0, 9))
+        self.assertEqual(self.byte_range("bytes=0-9", HTTP_IF_RANGE=http_date(SIGNED_AT)), (0, 9))
+        # La grabación cambió: se responde el archivo completo
+        self.assertIsNone(self.byte_range("bytes=0-9", HTTP_IF_RANGE='"otro"'))
+
+
+async def _aiter(chunks):
+    for chunk in chunks:
+        yield chunk
+
+
+class RecordingCacheAteeTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.cache = RecordingCache(self.tmp.name, max_bytes=10 * 1024 ** 2, max_age=3600)
+        self.chunks = [bytes([i]) * 65536 for i in range(24)]
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def files(self):
+        return [name for _, _, names in os.walk(self.tmp.name) for name in names]
+
+    async def test_descarga_completa_queda_en_cache(self):
+        expected = b"".join(self.chunks)
+        body = b"".join([chunk async for chunk in self.cache.atee(_aiter(self.chunks), "mix", "u1", expected_size=len(expected))])
+
+        recording = self.cache.get("mix", "u1")
+        self.assertEqual(body, expected)
+        self.assertEqual(recording.size, len(expected))
+        with open(recording.path, "rb") as f:
+            self.assertEqual(f.read(), expected)
+
+    async def test_descarga_cortada_no_deja_archivos(self):
+        stream = self.cache.atee(_aiter(self.chunks), "mix", "u2", expected_size=24 * 65536)
+        async for _ in stream:
+            break
+        await stream.aclose()
+
+        self.assertIsNone(self.cache.get("mix", "u2"))
+        self.assertEqual(self.files(), [])
+
+    async def test_tamano_distinto_al_esperado_no_se_guarda(self):
+        async for _ in self.cache.atee(_aiter(self.chunks), "mix", "u3", expected_size=1):
+            pass
+        self.assertIsNone(self.cache.get("mix", "u3"))
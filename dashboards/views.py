@@ -1,5 +1,5 @@
 #dashboards/views.py
-import requests
+import httpx
 import json
 import os
 
@@ -15,7 +15,14 @@ from datetime import datetime # Importar datetime
 import pytz
 from urllib.parse import urlparse, parse_qs
 from websocket_app.fetch_script import _call_sharpen_api_async # 👈 Importamos la función "cerebro"
-from asgiref.sync import async_to_sync
+from websocket_app.sharpen_client import get_async_audio_client, get_async_client, get_sync_client, run_sync
+from .recording_cache import recording_cache
+from .recording_urls import (
+    acache_recording_url, aget_cached_recording_url, ainvalidate_recording_url,
+    cache_recording_url, get_cached_recording_url, invalidate_recording_url,
+)
+from asgiref.sync import sync_to_async
+from django.utils.http import http_date
 from rest_framework import status # Add this import if you're using status.HTTP_xxx_REQUEST
 from django.conf import settings 
 
@@ -25,11 +32,20 @@ logger = logging.getLogger(__name__)
 HERMOSILLO_TZ = pytz.timezone('America/Hermosillo') 
 UTC_TZ = pytz.utc # Zona horaria UTC para localizar los datetimes
 
-def get_sharpen_audio_url(mixmon_file_name: str, recording_key: str) -> str | None:
-    """
-    Llama a la API de Sharpen para obtener una nueva URL de audio para una grabación.
-    """
-    endpoint = "V2/voice/callRecordings/createRecordingURL"
+SHARPEN_RECORDING_URL_ENDPOINT = "V2/voice/callRecordings/createRecordingURL"
+
+# Cabeceras del navegador que se reenvían al servidor de audio (seek del <audio> / reanudación)
+AUDIO_FORWARDED_REQUEST_HEADERS = ("Range", "If-Range")
+# Cabeceras de la respuesta de S3 que se copian al cliente
+AUDIO_PROPAGATED_RESPONSE_HEADERS = ("Content-Length", "Content-Range", "Accept-Ranges", "ETag", "Last-Modified")
+AUDIO_CORS_ALLOW_HEADERS = "Content-Type, Authorization, Range, If-Range"
+AUDIO_CORS_EXPOSE_HEADERS = "Content-Length, Content-Range, Accept-Ranges"
+AUDIO_FILE_CHUNK_BYTES = 256 * 1024
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-(\d+)/(\d+)")
+_BYTE_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+def _recording_url_request(mixmon_file_name: str, recording_key: str) -> tuple[str, dict] | None:
+    """URL y payload de `createRecordingURL`, o None si faltan las claves de Sharpen."""
     cKey1 = settings.SHARPEN_CKEY1
     cKey2 = settings.SHARPEN_CKEY2
     uKey = settings.SHARPEN_UKEY
@@ -47,34 +63,207 @@ def get_sharpen_audio_url(mixmon_file_name: str, recording_key: str) -> str | No
         "mixmonFileName": mixmon_file_name
     }
     
-    api_url = f"{settings.SHARPEN_API_BASE_URL}/{endpoint}/"
+    api_url = f"{settings.SHARPEN_API_BASE_URL}/{SHARPEN_RECORDING_URL_ENDPOINT}/"
     logger.info(f"Solicitando nueva URL de audio a Sharpen: {api_url}")
+    return api_url, payload
 
+def _recording_url_from_response(response: httpx.Response) -> str | None:
     try:
-        response = requests.post(api_url, json=payload, timeout=15)
         response.raise_for_status()
         result = response.json()
-        
-        if result.get('status') == 'successful' and result.get('url'):
-            returned_sharpen_url = result['url'] # Captura la URL devuelta por Sharpen
-            logger.info(f"Sharpen API (createRecordingURL) devolvió la URL: {returned_sharpen_url}")
-            return returned_sharpen_url
-        else:
-            logger.error(f"La respuesta de Sharpen para nueva URL no fue exitosa: {result}")
-            return None
-            
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         logger.error(f"Error al solicitar nueva URL de audio a Sharpen: {e}")
         return None
-    except requests.exceptions.JSONDecodeError:
+    except json.JSONDecodeError:
         logger.error(f"Respuesta no-JSON de Sharpen al solicitar nueva URL: {response.text}")
         return None
 
-def stream_audio_from_url(audio_url: str, recording_key: str):
-    """Función auxiliar para hacer streaming de un audio desde una URL."""
+    if result.get('status') == 'successful' and result.get('url'):
+        returned_sharpen_url = result['url'] # Captura la URL devuelta por Sharpen
+        logger.info(f"Sharpen API (createRecordingURL) devolvió la URL: {returned_sharpen_url}")
+        return returned_sharpen_url
+    logger.error(f"La respuesta de Sharpen para nueva URL no fue exitosa: {result}")
+    return None
+
+def get_sharpen_audio_url(mixmon_file_name: str, recording_key: str, refresh: bool = False) -> str | None:
+    """
+    Devuelve la URL de audio de una grabación: la presignada que sigue vigente en caché o, si no
+    hay (o con `refresh=True`, p. ej. tras un 403 de S3), una nueva de la API de Sharpen.
+    """
+    if refresh:
+        invalidate_recording_url(mixmon_file_name, recording_key)
+    else:
+        cached_url = get_cached_recording_url(mixmon_file_name, recording_key)
+        if cached_url:
+            logger.info(f"URL de audio de {recording_key} servida desde caché.")
+            return cached_url
+
+    request_data = _recording_url_request(mixmon_file_name, recording_key)
+    if request_data is None:
+        return None
+    api_url, payload = request_data
+    try:
+        response = get_sync_client().post(api_url, json=payload, timeout=15)
+    except httpx.HTTPError as e:
+        logger.error(f"Error al solicitar nueva URL de audio a Sharpen: {e}")
+        return None
+    audio_url = _recording_url_from_response(response)
+    if audio_url:
+        cache_recording_url(mixmon_file_name, recording_key, audio_url)
+    return audio_url
+
+async def aget_sharpen_audio_url(mixmon_file_name: str, recording_key: str, refresh: bool = False) -> str | None:
+    """Versión asíncrona de `get_sharpen_audio_url` (cliente httpx compartido del event loop)."""
+    if refresh:
+        await ainvalidate_recording_url(mixmon_file_name, recording_key)
+    else:
+        cached_url = await aget_cached_recording_url(mixmon_file_name, recording_key)
+        if cached_url:
+            logger.info(f"URL de audio de {recording_key} servida desde caché.")
+            return cached_url
+
+    request_data = _recording_url_request(mixmon_file_name, recording_key)
+    if request_data is None:
+        return None
+    api_url, payload = request_data
+    try:
+        response = await get_async_client().post(api_url, json=payload, timeout=15)
+    except httpx.HTTPError as e:
+        logger.error(f"Error al solicitar nueva URL de audio a Sharpen: {e}")
+        return None
+    audio_url = _recording_url_from_response(response)
+    if audio_url:
+        await acache_recording_url(mixmon_file_name, recording_key, audio_url)
+    return audio_url
+
+async def _aiter_and_close(audio_response: httpx.Response, chunk_size: int = 64 * 1024):
+    """
+    Itera el cuerpo de la respuesta y devuelve la conexión al pool al terminar (o si el cliente corta).
+    Sólo se lee de S3 el siguiente bloque cuando el servidor ASGI terminó de enviar el anterior,
+    así que un cliente lento frena la descarga en lugar de acumularla en memoria.
+    """
+    try:
+        async for chunk in audio_response.aiter_bytes(chunk_size=chunk_size):
+            yield chunk
+    finally:
+        await audio_response.aclose()
+
+def _full_content_size(audio_response: httpx.Response) -> int | None:
+    """Tamaño del archivo si la respuesta trae el archivo completo (200, o 206 de 0 al final); si no, None."""
+    if audio_response.status_code == 200:
+        content_length = audio_response.headers.get('Content-Length', '')
+        return int(content_length) if content_length.isdigit() else None
+    match = _CONTENT_RANGE_RE.fullmatch(audio_response.headers.get('Content-Range', ''))
+    if audio_response.status_code == 206 and match:
+        start, end, total = (int(value) for value in match.groups())
+        if start == 0 and end == total - 1:
+            return total
+    return None
+
+def _requested_byte_range(request, recording) -> tuple[int, int] | None:
+    """
+    `(inicio, fin)` inclusivos del `Range` pedido sobre una grabación en caché, o None para
+    devolverla completa (sin Range, varios rangos, o `If-Range` que ya no coincide).
+    Lanza ValueError si el rango no se puede satisfacer.
+    """
+    match = _BYTE_RANGE_RE.fullmatch(request.headers.get('Range', '').strip())
+    if not match or not any(match.groups()):
+        return None
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range not in (recording.etag, http_date(recording.cached_at)):
+        return None
+    first, last = match.groups()
+    if not first:
+        # Sufijo: los últimos N bytes
+        start, end = max(0, recording.size - int(last)), recording.size - 1
+    else:
+        start = int(first)
+        end = min(int(last), recording.size - 1) if last else recording.size - 1
+    if start >= recording.size or start > end:
+        raise ValueError(f"Rango no satisfacible para {recording.size} bytes")
+    return start, end
+
+async def _aiter_file_range(f, start: int, length: int, chunk_size: int = AUDIO_FILE_CHUNK_BYTES):
+    """Lee `length` bytes del archivo abierto desde `start` en hilos aparte, bloque a bloque, y lo cierra."""
+    read_in_thread = sync_to_async(lambda size: f.read(size), thread_sensitive=False)
+    try:
+        await sync_to_async(f.seek, thread_sensitive=False)(start)
+        remaining = length
+        while remaining > 0:
+            chunk = await read_in_thread(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+    finally:
+        f.close()
+
+async def acached_recording_response(request, recording, recording_key: str):
+    """
+    Respuesta (200 o 206 según `Range`) servida desde la caché local de grabaciones.
+    Lanza OSError si el archivo ya no existe (p. ej. lo acaba de expulsar otro proceso).
+
+    Bajo ASGI (Daphne) no hay sendfile y Django lee los iteradores síncronos de un FileResponse
+    completos en memoria, así que el archivo se entrega con un iterador asíncrono; abrirlo y
+    leerlo también ocurre en hilos aparte, fuera del event loop.
+    """
+    try:
+        byte_range = _requested_byte_range(request, recording)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{recording.size}'
+        return response
+
+    start, end = byte_range or (0, recording.size - 1)
+    audio_file = await sync_to_async(open, thread_sensitive=False)(recording.path, 'rb')
+    response = StreamingHttpResponse(
+        _aiter_file_range(audio_file, start, end - start + 1),
+        content_type=recording.content_type if 'audio/' in recording.content_type else 'audio/wav',
+        status=206 if byte_range else 200,
+    )
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{recording.size}'
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = recording.etag
+    response['Last-Modified'] = http_date(recording.cached_at)
+    response['Content-Disposition'] = f'inline; filename="{recording_key}.wav"'
+    return response
+
+async def stream_audio_from_url(audio_url: str, recording_key: str, request_headers: dict | None = None, refresh_url=None, cache_as: tuple[str, str] | None = None):
+    """
+    Hace streaming de un audio desde una URL. Reenvía `Range`/`If-Range` (si vienen en
+    `request_headers`) y responde con el mismo estado que el origen (200, 206 o 416).
+    Si S3 rechaza la URL (403) y se pasa `refresh_url` (corrutina sin argumentos que devuelve
+    una URL nueva), se reintenta una vez con la URL renovada. Con `cache_as`
+    (`(mixmonFileName, uniqueID)`) una respuesta con el archivo completo se guarda además en la
+    caché local de grabaciones mientras se envía.
+    """
+    audio_response = None
     try:
         logger.info(f"Intentando descargar y hacer streaming del archivo de audio de: {audio_url}")
-        audio_response = requests.get(audio_url, stream=True, timeout=60)
+        # Pool propio: los streamings largos no ocupan las conexiones de la API de Sharpen
+        client = get_async_audio_client()
+        upstream_request = client.build_request("GET", audio_url, headers=request_headers or {})
+        audio_response = await client.send(upstream_request, stream=True)
+
+        if audio_response.status_code == 403 and refresh_url is not None:
+            # URL presignada vencida o revocada (p. ej. la que estaba en caché): pedir otra
+            await audio_response.aclose()
+            logger.warning(f"S3 rechazó (403) la URL de audio de {recording_key}. Se solicita una nueva.")
+            fresh_url = await refresh_url()
+            if not fresh_url:
+                return JsonResponse({"error": "No se pudo renovar la URL de audio de Sharpen."}, status=502)
+            upstream_request = client.build_request("GET", fresh_url, headers=request_headers or {})
+            audio_response = await client.send(upstream_request, stream=True)
+
+        if audio_response.status_code == 416:
+            # Rango fuera del archivo: se devuelve tal cual para que el navegador lo corrija
+            await audio_response.aclose()
+            response = HttpResponse(status=416)
+            if 'Content-Range' in audio_response.headers:
+                response['Content-Range'] = audio_response.headers['Content-Range']
+            return response
         audio_response.raise_for_status()
 
         content_type = audio_response.headers.get('Content-Type', 'audio/wav')
@@ -84,21 +273,55 @@ def stream_audio_from_url(audio_url: str, recording_key: str):
             logger.warning(f"Content-Type inesperado ('{content_type}'). Se forzará a 'audio/wav'.")
             content_type = 'audio/wav'
 
-        response = StreamingHttpResponse(audio_response.iter_content(chunk_size=8192), content_type=content_type)
+        body = _aiter_and_close(audio_response)
+        full_size = _full_content_size(audio_response)
+        if cache_as is not None and full_size:
+            body = recording_cache.atee(body, *cache_as, content_type=content_type, expected_size=full_size)
+        response = StreamingHttpResponse(body, content_type=content_type, status=audio_response.status_code)
+        for header in AUDIO_PROPAGATED_RESPONSE_HEADERS:
+            if header in audio_response.headers:
+                response[header] = audio_response.headers[header]
+        response.setdefault('Accept-Ranges', 'bytes')
         response['Content-Disposition'] = f'inline; filename="{recording_key}.wav"'
         return response
 
-    except requests.HTTPError as e:
+    except httpx.HTTPStatusError as e:
+        error_text = (await e.response.aread()).decode(errors="replace")
+        await e.response.aclose()
         logger.error(f"Error HTTP al descargar audio para {recording_key}: {e.response.status_code}")
-        return JsonResponse({"error": f"No se pudo descargar el audio: {e.response.text}"}, status=e.response.status_code)
-    except requests.RequestException as e:
+        return JsonResponse({"error": f"No se pudo descargar el audio: {error_text}"}, status=e.response.status_code)
+    except httpx.HTTPError as e:
+        if audio_response is not None:
+            await audio_response.aclose()
         logger.error(f"Error de red al descargar audio para {recording_key}: {e}")
         return JsonResponse({"error": "Error de comunicación con el servidor de audio."}, status=502)
 
+def _add_audio_cors_headers(request, response):
+    origin = request.META.get('HTTP_ORIGIN')
+    if origin:
+        # Aquí podrías validar si el origen está permitido en tu lista blanca
+        # Para fines de depuración, permitimos cualquier origen si se envía
+        response['Access-Control-Allow-Origin'] = origin
+    else:
+        # Para producción, es mejor especificar:
+        # response['Access-Control-Allow-Origin'] = 'https://tu-dominio-produccion.com'
+        response['Access-Control-Allow-Origin'] = '*'
+    response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
+    response['Access-Control-Allow-Headers'] = AUDIO_CORS_ALLOW_HEADERS
+    # Sin esto el navegador no deja leer Content-Range en peticiones cross-origin
+    response['Access-Control-Expose-Headers'] = AUDIO_CORS_EXPOSE_HEADERS
+    response['Access-Control-Allow-Credentials'] = 'true' # Si manejas cookies o credenciales
+    return response
+
 class SharpenAudioProxyView(View): # Usamos View en lugar de APIView porque no manejamos JSON de entrada/salida directamente
+    """
+    Proxy asíncrono del audio de una grabación. Bajo ASGI no ocupa un hilo mientras dura el
+    streaming y soporta peticiones parciales (`Range`), que es lo que usa el reproductor para
+    adelantar/retroceder sin descargar el archivo completo.
+    """
     permission_classes = [AllowAny] # O ajusta tus permisos según sea necesario
 
-    def get(self, request, *args, **kwargs):
+    async def get(self, request, *args, **kwargs):
         # Aquí obtenemos los parámetros necesarios de la URL.
         # Asumimos que el frontend enviará `mixmonFileName` y `uniqueID` como query parameters.
         mixmon_file_name = request.GET.get('mixmonFileName')
@@ -108,10 +331,24 @@ class SharpenAudioProxyView(View): # Usamos View en lugar de APIView porque no m
             logger.error("Faltan los parámetros 'mixmonFileName' o 'uniqueID' para la solicitud de audio.")
             return JsonResponse({"error": "Parámetros de audio incompletos."}, status=400)
 
-        logger.info(f"Solicitud de audio proxy recibida para mixmonFileName: {mixmon_file_name}, uniqueID: {unique_id}")
+        range_header = request.headers.get('Range')
+        logger.info(
+            f"Solicitud de audio proxy recibida para mixmonFileName: {mixmon_file_name}, uniqueID: {unique_id}"
+            f"{f', Range: {range_header}' if range_header else ''}"
+        )
 
-        # 1. Obtener la URL presignada de Sharpen
-        sharpen_audio_url = get_sharpen_audio_url(mixmon_file_name, unique_id)
+        # 0. Si la grabación ya está en la caché local se sirve desde disco, sin pasar por Sharpen ni S3
+        cached_recording = await sync_to_async(recording_cache.get, thread_sensitive=False)(mixmon_file_name, unique_id)
+        if cached_recording:
+            try:
+                response = await acached_recording_response(request, cached_recording, unique_id)
+                logger.info(f"Audio de {unique_id} servido desde la caché local de grabaciones.")
+                return _add_audio_cors_headers(request, response)
+            except OSError as e:
+                logger.warning(f"No se pudo leer la grabación en caché de {unique_id}: {e}. Se descarga de S3.")
+
+        # 1. Obtener la URL presignada de Sharpen (de la caché si sigue vigente)
+        sharpen_audio_url = await aget_sharpen_audio_url(mixmon_file_name, unique_id)
 
         if not sharpen_audio_url:
             logger.error(f"No se pudo obtener la URL de audio de Sharpen para {mixmon_file_name}.")
@@ -119,41 +356,25 @@ class SharpenAudioProxyView(View): # Usamos View en lugar de APIView porque no m
 
         logger.info(f"URL de audio de Sharpen obtenida: {sharpen_audio_url}")
 
-        # 2. Stream el audio desde la URL de Sharpen y añadir cabeceras CORS
-        # La función `stream_audio_from_url` ya devuelve un StreamingHttpResponse.
-        # Necesitamos agregar las cabeceras CORS a esa respuesta.
-        response = stream_audio_from_url(sharpen_audio_url, unique_id)
-        origin = request.META.get('HTTP_ORIGIN')
-        if origin:
-            # Aquí podrías validar si el origen está permitido en tu lista blanca
-            # Para fines de depuración, permitimos cualquier origen si se envía
-            response['Access-Control-Allow-Origin'] = origin
-        else:
-        # Añadir las cabeceras CORS a la respuesta del streaming.
-        # Asegúrate de que tu frontend (ej. http://localhost:3000, o tu dominio de producción)
-        # esté en la lista de orígenes permitidos.
-            response['Access-Control-Allow-Origin'] = '*'
-        # Para producción, es mejor especificar:
-        # response['Access-Control-Allow-Origin'] = 'https://tu-dominio-produccion.com'
-        response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-        response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization' # Si tu frontend envía alguna cabecera
-        response['Access-Control-Allow-Credentials'] = 'true' # Si manejas cookies o credenciales
+        # 2. Stream el audio desde la URL de Sharpen (reenviando Range/If-Range) y añadir cabeceras CORS
+        forwarded_headers = {
+            header: request.headers[header]
+            for header in AUDIO_FORWARDED_REQUEST_HEADERS
+            if header in request.headers
+        }
+        response = await stream_audio_from_url(
+            sharpen_audio_url, unique_id, forwarded_headers,
+            refresh_url=lambda: aget_sharpen_audio_url(mixmon_file_name, unique_id, refresh=True),
+            cache_as=(mixmon_file_name, unique_id),
+        )
+        return _add_audio_cors_headers(request, response)
 
-        return response
-
-    def options(self, request, *args, **kwargs):
-        # Manejar las solicitudes OPTIONS (preflight) para CORS
-        response = HttpResponse(status=204) # 204 No Content para preflight
-        origin = request.META.get('HTTP_ORIGIN')
-        if origin:
-            response['Access-Control-Allow-Origin'] = origin
-        else:
-            response['Access-Control-Allow-Origin'] = '*'
-        response['Access-Control-Allow-Methods'] = 'GET, OPTIONS'
-        response['Access-Control-Allow-Headers'] = 'Content-Type, Authorization'
-        response['Access-Control-Allow-Credentials'] = 'true'
+    async def options(self, request, *args, **kwargs):
+        # Manejar las solicitudes OPTIONS (preflight) para CORS.
+        # Django exige que todos los handlers de la vista sean async si alguno lo es.
+        response = _add_audio_cors_headers(request, HttpResponse(status=204)) # 204 No Content para preflight
         response['Access-Control-Max-Age'] = '86400' # Cache preflight por 24 horas
-        logger.info(f"SharpenAudioProxyView: Recibida solicitud OPTIONS (preflight) desde {origin}.")
+        logger.info(f"SharpenAudioProxyView: Recibida solicitud OPTIONS (preflight) desde {request.META.get('HTTP_ORIGIN')}.")
         return response
 
 class SharpenApiGenericProxyView(APIView):
@@ -177,8 +398,8 @@ class SharpenApiGenericProxyView(APIView):
             )
         logger.info(f"SharpenApiGenericProxyView: Procesando endpoint: {endpoint} con payload: {payload}")
 
-        # Llama a la función de servicio asíncrona desde este contexto síncrono
-        result = async_to_sync(_call_sharpen_api_async)(endpoint, payload)
+        # Llama a la función de servicio asíncrona desde este contexto síncrono (loop de fondo y cliente compartidos)
+        result = run_sync(_call_sharpen_api_async, endpoint, payload)
 
         # Maneja la respuesta del servicio
         if result and "error" not in result:
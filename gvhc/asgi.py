@@ -15,19 +15,42 @@ from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.sessions import SessionMiddlewareStack # <-- Este es el de sesión
 from websocket_app import routing
 from .jwt_middleware import JWTAuthMiddleware
+from websocket_app.sharpen_client import aclose_async_client
 
 # from channels.security.websocket import AllowedHostsOriginValidator, OriginValidator
 
 
 django_asgi_app = get_asgi_application()
 
+# Modelos de Vosk de settings.VOSK_PRELOAD: se cargan en segundo plano para no demorar el arranque
+from calling_monitor.utils.vosk_models import preload_vosk_models_in_background
+preload_vosk_models_in_background()
+# Instancias de LanguageTool (settings.LANGUAGETOOL_PRELOAD), también en segundo plano
+from calling_monitor.utils.grammar import warm_up_grammar_in_background
+warm_up_grammar_in_background()
+
 # 2. Define las rutas de WebSocket
 websocket_app = URLRouter(routing.websocket_urlpatterns)
 
+async def lifespan_app(scope, receive, send):
+    """
+    Maneja el protocolo lifespan de ASGI para cerrar el pool de Sharpen al apagar.
+    Daphne no envía estos eventos; en ese caso el cierre lo hace el hook `atexit` de sharpen_client.
+    """
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await aclose_async_client()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
 # 3. Combina todo en un ProtocolTypeRouter
 # Esto maneja las solicitudes HTTP y WebSocket
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
+    "lifespan": lifespan_app,
     "websocket": SessionMiddlewareStack(  # <-- Paso 1: Primero el SessionMiddleware
         JWTAuthMiddleware(  # <-- Paso 2: Luego tu middleware de JWT
             AuthMiddlewareStack( # <-- Paso 3: Luego el de autenticación de Channels
@@ -1,6 +1,7 @@
 # gvhc/celery.py
 import os
 from celery import Celery
+from celery.signals import worker_init, worker_process_shutdown, worker_shutdown
 
 import tracemalloc
 import atexit
@@ -22,6 +23,19 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.autodiscover_tasks()
 
+@worker_init.connect
+def preload_vosk_models_on_boot(**kwargs):
+    # Carga los modelos de settings.VOSK_PRELOAD antes de aceptar tareas (con prefork los hijos los heredan)
+    from calling_monitor.utils.vosk_models import preload_vosk_models
+    preload_vosk_models()
+
+@worker_shutdown.connect
+@worker_process_shutdown.connect
+def close_sharpen_clients(**kwargs):
+    # Cierra el pool de conexiones HTTP hacia Sharpen al apagar el worker (solo) o cada proceso hijo (prefork)
+    from websocket_app.sharpen_client import shutdown_clients
+    shutdown_clients()
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
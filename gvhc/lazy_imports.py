@@ -0,0 +1,60 @@
+# gvhc/lazy_imports.py
+"""
+Importación diferida de dependencias pesadas (spaCy, Vosk, numpy, pandas, LanguageTool...).
+
+`lazy_import("numpy")` devuelve un objeto que se comporta como el módulo pero sólo lo importa
+en el primer acceso a un atributo. Así, importar las vistas o las tareas (lo que hacen Daphne y
+todos los procesos de Celery al arrancar, incluido beat) no carga bibliotecas que sólo se usan
+al transcribir o analizar una llamada.
+
+`import_times()` dice cuáles se cargaron ya y cuánto tardaron; `manage.py import_report`
+mide el arranque completo.
+"""
+import importlib
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+_lock = threading.RLock()
+_import_times = {}
+
+
+class LazyModule:
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with _lock:
+                module = self.__dict__["_module"]
+                if module is None:
+                    started = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    elapsed = time.perf_counter() - started
+                    _import_times[self._name] = round(elapsed, 3)
+                    self.__dict__["_module"] = module
+                    logger.info(f"📦 Módulo {self._name} importado bajo demanda en {elapsed:.2f}s.")
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "cargado" if self.__dict__["_module"] is not None else "sin cargar"
+        return f"<LazyModule {self._name} ({state})>"
+
+
+def lazy_import(name: str) -> LazyModule:
+    return LazyModule(name)
+
+
+def import_times() -> dict:
+    """Segundos que tardó cada módulo diferido que ya se importó."""
+    return dict(_import_times)
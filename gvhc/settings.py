@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.1/ref/settings/
 """
 import os  
+import tempfile
 from urllib.parse import urlparse, urlunparse, parse_qs, urlencode
 import psycopg2
 from pathlib import Path
@@ -47,6 +48,30 @@ else: # development (o cualquier otro valor de MODE)
     SHARPEN_CKEY2 = os.getenv('SHARPEN_CKEY2')
     SHARPEN_UKEY = os.getenv('SHARPEN_UKEY')
 
+# Pool de conexiones compartido para la API de Sharpen (ver websocket_app/sharpen_client.py)
+SHARPEN_HTTP2 = os.getenv('SHARPEN_HTTP2', 'True').lower() in ('true', '1', 't')
+SHARPEN_HTTP_MAX_CONNECTIONS = int(os.getenv('SHARPEN_HTTP_MAX_CONNECTIONS', '20'))
+SHARPEN_HTTP_MAX_KEEPALIVE = int(os.getenv('SHARPEN_HTTP_MAX_KEEPALIVE', '10'))
+SHARPEN_HTTP_KEEPALIVE_EXPIRY = float(os.getenv('SHARPEN_HTTP_KEEPALIVE_EXPIRY', '30'))
+SHARPEN_HTTP_TIMEOUT = float(os.getenv('SHARPEN_HTTP_TIMEOUT', '30'))
+# Pool aparte para descargar grabaciones de S3 (proxy de audio): cada reproducción ocupa una conexión
+# mientras dura. READ_TIMEOUT es el máximo sin recibir datos, no la duración de la descarga.
+AUDIO_HTTP_MAX_CONNECTIONS = int(os.getenv('AUDIO_HTTP_MAX_CONNECTIONS', '50'))
+AUDIO_HTTP_MAX_KEEPALIVE = int(os.getenv('AUDIO_HTTP_MAX_KEEPALIVE', '10'))
+AUDIO_HTTP_CONNECT_TIMEOUT = float(os.getenv('AUDIO_HTTP_CONNECT_TIMEOUT', '10'))
+AUDIO_HTTP_READ_TIMEOUT = float(os.getenv('AUDIO_HTTP_READ_TIMEOUT', '60'))
+# URLs presignadas de grabaciones en caché (dashboards/recording_urls.py): se descartan este margen
+# de segundos antes de que expire su firma de S3 (X-Amz-Date + X-Amz-Expires)
+RECORDING_URL_CACHE_ENABLED = os.getenv('RECORDING_URL_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+RECORDING_URL_CACHE_MARGIN = int(os.getenv('RECORDING_URL_CACHE_MARGIN', '120'))
+# Grabaciones descargadas en disco (dashboards/recording_cache.py), compartidas por el proxy de audio y
+# el worker de transcripción si el directorio está en un volumen común. Expulsión LRU por tamaño y por
+# segundos sin usarse.
+RECORDING_CACHE_ENABLED = os.getenv('RECORDING_CACHE_ENABLED', 'True').lower() in ('true', '1', 't')
+RECORDING_CACHE_DIR = os.getenv('RECORDING_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'gvhc_recordings'))
+RECORDING_CACHE_MAX_MB = int(os.getenv('RECORDING_CACHE_MAX_MB', '2048'))
+RECORDING_CACHE_MAX_AGE = int(os.getenv('RECORDING_CACHE_MAX_AGE', str(7 * 24 * 3600)))
+
 # URL de Redis para Channels
 # Render usa REDIS_URL para Redis
 REDIS_URL = os.getenv('REDIS_URL_PROD') if MODE == 'production' else os.getenv('REDIS_URL_DEV', 'redis://redis:6379/0')
@@ -65,6 +90,98 @@ CHANNEL_LAYERS = {
 }
 
 
+# Caché compartida entre procesos (web, worker y beat) para checksums y snapshots en vivo
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": REDIS_URL,
+        "KEY_PREFIX": "gvhc",
+    }
+}
+
+# Antigüedad máxima (segundos) del snapshot en vivo antes de volver a consultar Sharpen
+LIVE_SNAPSHOT_MAX_AGE = float(os.getenv('LIVE_SNAPSHOT_MAX_AGE', '15'))
+# Timeout (segundos) por fuente al armar el snapshot en vivo; las fuentes se consultan en paralelo
+LIVE_SNAPSHOT_DEFAULT_TIMEOUT = float(os.getenv('LIVE_SNAPSHOT_DEFAULT_TIMEOUT', '10'))
+LIVE_SNAPSHOT_SOURCE_TIMEOUTS = {
+    'getCallsOnHoldData': float(os.getenv('LIVE_ON_HOLD_TIMEOUT', LIVE_SNAPSHOT_DEFAULT_TIMEOUT)),
+    'liveQueueStatus': float(os.getenv('LIVE_QUEUE_STATUS_TIMEOUT', LIVE_SNAPSHOT_DEFAULT_TIMEOUT)),
+}
+# Poller dedicado del dashboard en vivo (python manage.py run_live_poller)
+LIVE_POLL_MIN_INTERVAL = float(os.getenv('LIVE_POLL_MIN_INTERVAL', '2'))
+LIVE_POLL_MAX_INTERVAL = float(os.getenv('LIVE_POLL_MAX_INTERVAL', '15'))
+LIVE_POLL_BACKOFF = float(os.getenv('LIVE_POLL_BACKOFF', '1.5'))
+LIVE_POLL_JITTER = float(os.getenv('LIVE_POLL_JITTER', '0.1'))
+# Campos que identifican cada fila para los parches (dataPatch); se usa el primero que tenga valor
+LIVE_ROW_KEY_FIELDS = {
+    'getCallsOnHoldData': ('uniqueID', 'UniqueID', 'queueCallManagerID', 'callID'),
+    'liveQueueStatus': ('Queue Name',),
+}
+# Campo con el nombre de la cola en cada fuente, para enviar a cada agente sólo las filas de sus colas
+LIVE_ROW_QUEUE_FIELDS = {
+    'getCallsOnHoldData': ('queueName', 'QueueName', 'queue'),
+    'liveQueueStatus': ('Queue Name',),
+}
+# Roles que ven todas las colas; los demás usuarios con colas asignadas (User.queues) sólo ven las suyas
+LIVE_FULL_VIEW_ROLES = [role.strip() for role in os.getenv('LIVE_FULL_VIEW_ROLES', 'teamleader,supervisor,egs').split(',') if role.strip()]
+# Roles que consultan los trabajos y lotes de análisis de todos los usuarios (los demás sólo los suyos)
+ANALYSIS_FULL_ACCESS_ROLES = [role.strip() for role in os.getenv('ANALYSIS_FULL_ACCESS_ROLES', ','.join(LIVE_FULL_VIEW_ROLES)).split(',') if role.strip()]
+# Cada cuánto (segundos) el broadcaster vuelve a leer de la base qué combinaciones de colas existen
+LIVE_VIEWS_REFRESH = float(os.getenv('LIVE_VIEWS_REFRESH', '60'))
+# Heartbeat de los WebSockets en vivo (un solo scheduler por proceso, ver websocket_app/heartbeat.py)
+LIVE_HEARTBEAT_INTERVAL = float(os.getenv('LIVE_HEARTBEAT_INTERVAL', '20'))
+# Heartbeats seguidos sin ningún mensaje del cliente (ping/pong) antes de cerrar la conexión; 0 = nunca.
+# Sólo aplica a clientes que ya enviaron algún mensaje: un dashboard que sólo escucha no se cierra por silencio.
+LIVE_HEARTBEAT_MAX_MISSED = int(os.getenv('LIVE_HEARTBEAT_MAX_MISSED', '3'))
+
+# Modelos de Vosk (calling_monitor/utils/vosk_models.py). En Docker la carpeta del host se monta en /models.
+VOSK_MODELS_DIR = os.getenv('VOSK_MODELS_DIR', '/models' if os.path.exists('/.dockerenv') else os.path.join(BASE_DIR, 'models'))
+VOSK_MODEL_PATHS = {
+    'es': os.path.join(VOSK_MODELS_DIR, 'vosk-model-es-0.42'),
+    'en': os.path.join(VOSK_MODELS_DIR, 'vosk-model-en-us-0.22'),
+}
+# Idiomas a cargar al arrancar el worker/servidor (p. ej. "es,en"); vacío = cada modelo se carga en su primer uso
+VOSK_PRELOAD = [lang.strip() for lang in os.getenv('VOSK_PRELOAD', '').split(',') if lang.strip()]
+# Pasar un segundo de silencio por el modelo después de cargarlo, para que la primera transcripción no pague la inicialización
+VOSK_WARM_UP = os.getenv('VOSK_WARM_UP', 'True').lower() in ('true', '1', 't')
+# Transcripción en paralelo (calling_monitor/utils/parallel_transcriber.py): el audio se corta en silencios
+# en segmentos de ~TRANSCRIBE_SEGMENT_SECONDS y se reparte entre TRANSCRIBE_WORKERS procesos.
+# Sólo en el worker de la cola `transcription` con --pool=solo (los hijos de prefork no pueden crear procesos).
+# Cada proceso carga su propia copia del modelo del idioma (varios GB con es-0.42/en-us-0.22), así que
+# el pool ocupa TRANSCRIBE_WORKERS × un modelo: no subirlo sin revisar la memoria del host. Queda
+# desactivado hasta medir la aceleración con `manage.py bench_parallel_transcription` en el hardware del worker.
+TRANSCRIBE_PARALLEL = os.getenv('TRANSCRIBE_PARALLEL', 'False').lower() in ('true', '1', 't')
+TRANSCRIBE_WORKERS = int(os.getenv('TRANSCRIBE_WORKERS', '2'))
+TRANSCRIBE_SEGMENT_SECONDS = float(os.getenv('TRANSCRIBE_SEGMENT_SECONDS', '30'))
+# Nivel (dBFS) por debajo del cual un bloque de 30 ms cuenta como silencio, y silencio mínimo para cortar
+TRANSCRIBE_VAD_SILENCE_DB = float(os.getenv('TRANSCRIBE_VAD_SILENCE_DB', '-40'))
+TRANSCRIBE_VAD_MIN_SILENCE_MS = int(os.getenv('TRANSCRIBE_VAD_MIN_SILENCE_MS', '300'))
+# Grabaciones mixmon en estéreo: un canal por lado de la llamada, transcritos por separado y en paralelo
+TRANSCRIBE_SPLIT_STEREO = os.getenv('TRANSCRIBE_SPLIT_STEREO', 'True').lower() in ('true', '1', 't')
+# Canal del agente ('left' o 'right'); el otro es el del llamante
+TRANSCRIBE_AGENT_CHANNEL = os.getenv('TRANSCRIBE_AGENT_CHANNEL', 'right').lower()
+# Trabajos de un lote de análisis (analyze_calls_batch) en curso a la vez
+TRANSCRIBE_BATCH_CONCURRENCY = int(os.getenv('TRANSCRIBE_BATCH_CONCURRENCY', '2'))
+# Tope para el `concurrency` que se pida al crear un lote (API o comando)
+TRANSCRIBE_BATCH_MAX_CONCURRENCY = int(os.getenv('TRANSCRIBE_BATCH_MAX_CONCURRENCY', '4'))
+# Reglas del analizador de transcripciones (riesgos y motivos por idioma)
+ANALYZER_RULES_PATH = os.getenv('ANALYZER_RULES_PATH', os.path.join(BASE_DIR, 'calling_monitor', 'utils', 'analyzer_rules.json'))
+# Componentes de Spacy que el analizador no usa, y procesamiento por lotes (nlp.pipe)
+ANALYZER_SPACY_EXCLUDE = [name.strip() for name in os.getenv('ANALYZER_SPACY_EXCLUDE', 'parser,ner').split(',') if name.strip()]
+ANALYZER_BATCH_SIZE = int(os.getenv('ANALYZER_BATCH_SIZE', '64'))
+ANALYZER_N_PROCESS = int(os.getenv('ANALYZER_N_PROCESS', '1'))
+# Corrección gramatical (calling_monitor/utils/grammar.py): pool de instancias de LanguageTool por proceso.
+# Con LANGUAGETOOL_SERVER_URL (p. ej. http://languagetool:8010) se usa un servidor compartido en lugar de
+# arrancar Java en cada proceso.
+LANGUAGETOOL_LANGUAGE = os.getenv('LANGUAGETOOL_LANGUAGE', 'en-US')
+LANGUAGETOOL_SERVER_URL = os.getenv('LANGUAGETOOL_SERVER_URL', '')
+LANGUAGETOOL_POOL_SIZE = int(os.getenv('LANGUAGETOOL_POOL_SIZE', '2'))
+LANGUAGETOOL_ACQUIRE_TIMEOUT = float(os.getenv('LANGUAGETOOL_ACQUIRE_TIMEOUT', '10'))
+# Oraciones revisadas en caché: LRU por proceso y en Redis (segundos; 0 = sólo en memoria)
+LANGUAGETOOL_CACHE_SIZE = int(os.getenv('LANGUAGETOOL_CACHE_SIZE', '4096'))
+LANGUAGETOOL_REDIS_TTL = int(os.getenv('LANGUAGETOOL_REDIS_TTL', str(7 * 24 * 3600)))
+LANGUAGETOOL_PRELOAD = os.getenv('LANGUAGETOOL_PRELOAD', 'False').lower() in ('true', '1', 't')
+
 # Impresiones para depuración
 print(f"Loading settings in MODE: {MODE}")
 print(f"DEBUG is: {DEBUG}")
@@ -387,10 +504,16 @@ CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'America/Hermosillo' # Ajusta tu zona horaria
 CELERY_ENABLE_UTC = False # Si manejas tus horas localmente
 CELERY_IMPORTS = ('websocket_app.tasks',) # Or 'websocket_app.task' if that's the filename
+# Las transcripciones (minutos de CPU por llamada) van a su propia cola y su propio worker
+# (`celery -A gvhc worker -Q transcription`), para no retrasar el broadcast en vivo.
+CELERY_TASK_ROUTES = {
+    'calling_monitor.tasks.run_transcription_job': {'queue': 'transcription'},
+}
 
 CELERY_BEAT_SCHEDULER = 'django_celery_beat.schedulers:DatabaseScheduler'
 
 CELERY_BEAT_SCHEDULE = {
+    # Respaldo: si el poller dedicado (run_live_poller) está corriendo, este tick se omite solo
     'broadcast-calls-update-every-5-seconds': { # Give a more descriptive name
         'task': 'websocket_app.tasks.broadcast_calls_update',
         'schedule': timedelta(seconds=5), # Use timedelta for clarity
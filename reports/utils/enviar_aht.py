@@ -1,9 +1,12 @@
 # reports/send_report.py
 
-import pandas as pd
 from datetime import datetime
 import requests
 
+from gvhc.lazy_imports import lazy_import
+
+pd = lazy_import("pandas")
+
 def send_teams_report():
     # 1. Leer los datos
     df_calls = pd.read_excel("ruta/a/tu/aht_calls.xlsx", sheet_name="AHT")
@@ -1,7 +1,11 @@
-import pandas as pd
 import io 
 from datetime import timedelta
 
+from gvhc.lazy_imports import lazy_import
+
+# pandas se importa al procesar el primer archivo, no al cargar las URLs
+pd = lazy_import("pandas")
+
 def procesar_archivo(archivo):
     extension = archivo.name.split('.')[-1].lower()
     if extension == 'xlsx':
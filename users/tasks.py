@@ -16,8 +16,9 @@ def update_agent_gamification_scores():
         # Obtener datos de rendimiento de Sharpen
         # Asumiendo que fetch_agent_performance_data es async, necesitas async_to_sync si no estás en un contexto asincrono
         # Si fetch_agent_performance_data es una simple función síncrona, úsala directamente.
-        from asgiref.sync import async_to_sync
-        sharpen_data = async_to_sync(fetch_agent_performance_data)()
+        # run_sync reutiliza el pool de conexiones a Sharpen del worker en lugar de abrir un loop nuevo.
+        from websocket_app.sharpen_client import run_sync
+        sharpen_data = run_sync(fetch_agent_performance_data)
 
         for agent_data in sharpen_data:
             sharpen_username = agent_data.get('username') # Asegúrate de que esta clave coincida con la API de Sharpen
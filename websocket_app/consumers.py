@@ -1,34 +1,34 @@
 # websocket_app/consumers.py
 import json
+from urllib.parse import parse_qs
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
 import logging
-from .fetch_script import fetch_calls_on_hold_data, fetch_live_queue_status_data
-import asyncio
+from .fetch_script import fetch_live_snapshot_data
+from .live_snapshot import aget_fresh_snapshot, build_snapshot
+from .live_diff import full_message_json
+from .heartbeat import get_heartbeat_hub
+from calling_monitor.jobs import get_visible_job, job_event, job_group_name
+from .live_views import amark_view_connected, slice_snapshot, user_view, view_group_name
 
 logger = logging.getLogger(__name__)
 CALLS_GROUP_NAME = "calls"
 
+
 class CallsConsumer(AsyncWebsocketConsumer):
     """
     Este consumer maneja las conexiones WebSocket para las actualizaciones de llamadas.
     """
 
-    async def send_heartbeat(self):
-        while True:
-            try:
-                await asyncio.sleep(20)  # cada 20 segundos
-                await self.send(text_data=json.dumps({"type": "heartbeat"}))
-                logger.debug(f"💓 Heartbeat enviado a {self.channel_name}")
-            except asyncio.CancelledError:
-                logger.info(f"⛔ Heartbeat cancelado para {self.channel_name}")
-                break
-            except Exception as e:
-                logger.error(f"❌ Error en heartbeat: {e}")
-                break
-
-
     async def connect(self):
-        self.group_name = CALLS_GROUP_NAME  # Nombre del grupo para broadcast
+        # Supervisores y team leaders reciben todas las colas en el grupo general; los agentes
+        # con colas asignadas sólo las suyas, en el grupo de su vista (ver live_views.py)
+        self.view = await database_sync_to_async(user_view)(self.scope.get("user"))
+        self.group_name = CALLS_GROUP_NAME if self.view is None else view_group_name(self.view)
+        # Con ?binary=1 el cliente recibe los mensajes del broadcast como frames binarios (UTF-8),
+        # tal como llegan del channel layer, sin decodificarlos por conexión.
+        query = parse_qs(self.scope.get("query_string", b"").decode())
+        self.binary_frames = query.get("binary", ["0"])[0] == "1"
 
         await self.accept()
         await self.send(text_data=json.dumps({"message": "WebSocket conectado"}))
@@ -36,34 +36,47 @@ class CallsConsumer(AsyncWebsocketConsumer):
             self.group_name,
             self.channel_name
         )
+        if self.view is not None:
+            # Que el broadcaster empiece a publicar en este grupo desde su próximo tick
+            await amark_view_connected(self.view)
+        # Notificaciones personales (trabajos de análisis, gamificación)
+        user = self.scope.get("user")
+        self.user_group_name = f"user_{user.id}" if getattr(user, "is_authenticated", False) else None
+        if self.user_group_name:
+            await self.channel_layer.group_add(self.user_group_name, self.channel_name)
+        self.job_groups = set()
         
 
         logger.info(f"Cliente conectado al grupo '{self.group_name}' con channel_name: {self.channel_name}")
         
-        self.heartbeat_task = asyncio.create_task(self.send_heartbeat())
+        # Un solo scheduler por proceso envía los heartbeats (ver heartbeat.py)
+        get_heartbeat_hub().register(self)
 
         try:            
-            calls_on_hold_data = await fetch_calls_on_hold_data()
-            live_queue_status_data = await fetch_live_queue_status_data()
-
-            calls_data = calls_on_hold_data.get("getCallsOnHoldData") or []
-            live_queue_data = live_queue_status_data.get("liveQueueStatus") or []
-
-            initial_payload = {
-                "getCallsOnHoldData": calls_data,
-                "getLiveQueueStatusData": live_queue_data
-            }
-            logger.debug(f"Payload que se enviará vía WebSocket: {json.dumps(initial_payload)}")
-            await self.send(text_data=json.dumps({
-                "type": "dataUpdate",
-                "payload": initial_payload
-            }))
+            await self.send_full_state()
             logger.info(f"Enviado estado inicial de datos al nuevo cliente: {self.channel_name}")
 
         except Exception as e:
             logger.error(f"Error al enviar datos iniciales a nuevo cliente: {e}", exc_info=True)
         # --- FIN DE LA MODIFICACIÓN ---
 
+    async def send_full_state(self):
+        """
+        Envía el estado completo (`dataUpdate`) con su número de secuencia. Se usa al conectar
+        y cuando el cliente detecta un hueco en la secuencia de parches y pide `resync`.
+        """
+        # Primero intentamos servir el snapshot que publica broadcast_calls_update
+        snapshot = await aget_fresh_snapshot()
+        if snapshot is None:
+            # Sin snapshot reciente consultamos Sharpen. No lo publicamos: sólo el broadcaster
+            # escribe el snapshot, que es la base de los parches (seq=None fuerza un resync después).
+            logger.debug("Snapshot en vivo ausente o expirado; consultando Sharpen.")
+            snapshot = build_snapshot(await fetch_live_snapshot_data())
+        if self.view is not None:
+            snapshot = slice_snapshot(snapshot, self.view)
+
+        await self.send_encoded(full_message_json(snapshot).encode("utf-8"))
+
     async def disconnect(self, close_code):
         # Salir del grupo de canales al desconectar
         logger.info(f"Cliente desconectado del grupo '{self.group_name}' con código: {close_code}.")
@@ -71,8 +84,16 @@ class CallsConsumer(AsyncWebsocketConsumer):
             self.group_name,
             self.channel_name
         )
-        if hasattr(self, "heartbeat_task"):
-            self.heartbeat_task.cancel()
+        for group in [getattr(self, "user_group_name", None), *getattr(self, "job_groups", ())]:
+            if group:
+                await self.channel_layer.group_discard(group, self.channel_name)
+        get_heartbeat_hub().unregister(self)
+
+    async def evict_dead_peer(self):
+        """Lo llama el HeartbeatHub cuando el cliente dejó de responder a los heartbeats."""
+        logger.warning(f"💀 Cliente sin respuesta a los heartbeats; cerrando {self.channel_name}.")
+        await self.channel_layer.group_discard(self.group_name, self.channel_name)
+        await self.close(code=4000)
 
 
     async def receive(self, text_data):
@@ -80,12 +101,23 @@ class CallsConsumer(AsyncWebsocketConsumer):
         Este método maneja los mensajes recibidos del cliente WebSocket.
         Responde con un 'pong' si recibe un 'ping'.
         """
+        # Cualquier mensaje del cliente demuestra que la conexión sigue viva
+        get_heartbeat_hub().mark_alive(self)
         try:
             data = json.loads(text_data)
             if data.get('type') == 'ping':
                 # Si el cliente envía un 'ping', responde con un 'pong'
                 await self.send(text_data=json.dumps({'type': 'pong'}))
                 logger.debug("Received ping, sent pong.")
+            elif data.get('type') == 'pong':
+                # Respuesta del cliente a un heartbeat; ya se registró arriba
+                pass
+            elif data.get('type') == 'resync':
+                # El cliente perdió un parche (seq != baseSeq): le reenviamos el estado completo
+                logger.info(f"Resync solicitado por {self.channel_name} (último seq del cliente: {data.get('seq')}).")
+                await self.send_full_state()
+            elif data.get('type') == 'watchJob':
+                await self.watch_job(data.get('jobId'))
             # Puedes añadir aquí cualquier otra lógica para manejar diferentes tipos de mensajes
             # Por ejemplo, si el frontend necesita enviar comandos.
         except json.JSONDecodeError:
@@ -93,15 +125,53 @@ class CallsConsumer(AsyncWebsocketConsumer):
         except Exception as e:
             logger.error(f"Error handling received message: {e}")
 
+    async def watch_job(self, job_id):
+        """
+        Suscribe al cliente a las notificaciones de un trabajo de análisis y le envía su estado actual.
+        Sólo si el usuario del socket puede ver el trabajo (ver calling_monitor.jobs.visible_jobs);
+        si no, la misma respuesta que para un trabajo inexistente.
+        """
+        job = await database_sync_to_async(get_visible_job)(job_id, self.scope.get("user"))
+        if job is None:
+            await self.send(text_data=json.dumps({"type": "transcriptionJob", "error": "Trabajo no encontrado", "jobId": job_id}))
+            return
+        group = job_group_name(job.id)
+        if group not in self.job_groups:
+            self.job_groups.add(group)
+            await self.channel_layer.group_add(group, self.channel_name)
+        # El trabajo pudo terminar antes de que el cliente se suscribiera
+        await self.transcription_job(job_event(job))
+
+    async def transcription_job(self, event):
+        """Progreso o resultado de un trabajo de análisis (`type: transcription.job`)."""
+        await self.send(text_data=json.dumps({"type": "transcriptionJob", "job": event["job"]}))
+        if event["job"]["status"] in ("done", "failed"):
+            group = job_group_name(event["job"]["jobId"])
+            if group in self.job_groups:
+                self.job_groups.discard(group)
+                await self.channel_layer.group_discard(group, self.channel_name)
+
+    async def analysis_batch(self, event):
+        """Progreso de un lote de análisis, enviado al grupo `user_<id>` de quien lo pidió."""
+        await self.send(text_data=json.dumps({"type": "analysisBatch", "batch": event["batch"]}))
+
+    async def gamification_level_up(self, event):
+        """Subida de nivel enviada por User.check_level_up al grupo `user_<id>`."""
+        await self.send(text_data=json.dumps({"type": "gamificationLevelUp", "payload": event["payload"]}))
+
+    async def send_encoded(self, data: bytes):
+        if self.binary_frames:
+            await self.send(bytes_data=data)
+        else:
+            await self.send(text_data=data.decode("utf-8"))
+
     async def send_message(self, event):
         """
-        Método genérico para reenviar cualquier mensaje recibido del channel layer
-        al cliente WebSocket. El nombre del método debe coincidir con el 'type'
-        en el grupo_send de Celery.
+        Reenvía al cliente un mensaje del grupo (`type: send.message`).
+        El productor (broadcast_live_tick) serializa el mensaje una sola vez y lo manda como
+        bytes UTF-8 en `event["bytes"]`; aquí no se vuelve a serializar ni se registra el payload.
         """
-        message = event['message']
-        await self.send(text_data=message)
-        logger.debug(f"Enviando mensaje recibido de Celery. Tamaño del payload: {len(message)} bytes.")
+        await self.send_encoded(event["bytes"])
 
     # async def dataUpdate(self, event):
     #     """
@@ -1,11 +1,14 @@
 # websocket_app/fetch_script.py
 
+import asyncio
 import httpx
 import json
 from urllib.parse import urljoin # Asegúrate de que esto está importado
 
 from dashboards.utils import convert_query_times_to_utc, convert_result_datetimes_to_local
 from django.conf import settings 
+from .sharpen_client import get_async_client
+from .singleflight import SingleFlight, make_key
 import logging
 import datetime # Necesario para calcular rangos de fecha/hora si la API lo pide
 from django.utils import timezone # Para manejar zonas horarias y fechas actuales
@@ -39,15 +42,16 @@ async def _forward_to_sharpen_async(endpoint: str, full_payload: dict):
     url = urljoin(settings.SHARPEN_API_BASE_URL, endpoint)
     logger.debug(f"DEBUG: Llamando a Sharpen URL: {url} con payload: {json.dumps(full_payload)}") # Añadir payload al log
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=full_payload, timeout=30.0)
-            response.raise_for_status()
-            
-            # Procesamos la respuesta para convertir fechas, etc.
-            result = response.json()
-            processed_result = convert_result_datetimes_to_local(result)
-            logger.debug(f"DEBUG: Respuesta de Sharpen para {endpoint}: {json.dumps(processed_result)}") # Log de la respuesta
-            return processed_result
+        # Cliente compartido por event loop: reutiliza conexiones keep-alive (y HTTP/2 si está disponible)
+        client = get_async_client()
+        response = await client.post(url, json=full_payload)
+        response.raise_for_status()
+
+        # Procesamos la respuesta para convertir fechas, etc.
+        result = response.json()
+        processed_result = convert_result_datetimes_to_local(result)
+        logger.debug(f"DEBUG: Respuesta de Sharpen para {endpoint}: {json.dumps(processed_result)}") # Log de la respuesta
+        return processed_result
             
     except httpx.HTTPStatusError as e:
         logger.error(f"Service Error: HTTP Status {e.response.status_code} from Sharpen: {e.response.text}")
@@ -58,11 +62,24 @@ async def _forward_to_sharpen_async(endpoint: str, full_payload: dict):
         return {"error": str(e), "status_code": 500}
 
 
+# Peticiones idénticas concurrentes (p. ej. muchos clientes reconectando a la vez) comparten una sola llamada
+_sharpen_flights = SingleFlight()
+
+
 async def _call_sharpen_api_async(endpoint: str, payload: dict):
     """
     Función centralizada y asíncrona para llamar a cualquier endpoint de Sharpen.
     Esta función reemplaza la lógica de '_forward_to_sharpen' de tu vista.
+
+    Las llamadas con el mismo endpoint y payload que ya estén en curso se coalescen:
+    todos los que esperan reciben el mismo resultado (no debe modificarse).
     """
+    key = make_key(endpoint, payload)
+    return await _sharpen_flights.do(key, _dispatch_sharpen_call, endpoint, dict(payload))
+
+
+async def _dispatch_sharpen_call(endpoint: str, payload: dict):
+    """Arma el payload completo según el endpoint y hace la llamada real a Sharpen."""
     auth_payload = {
         "cKey1": settings.SHARPEN_CKEY1,
         "cKey2": settings.SHARPEN_CKEY2,
@@ -147,28 +164,21 @@ async def fetch_agent_performance_data():
         logger.error(f"Error al obtener datos de rendimiento de Sharpen: {e}", exc_info=True)
         return []
 
-# Esta función ahora contiene la lógica para hablar con la API externa
-async def fetch_calls_on_hold_data():
-    """
-    Obtiene los datos de las llamadas en espera llamando DIRECTAMENTE
-    a la función de servicio de Sharpen.
-    """
+class SharpenSourceError(Exception):
+    """Una fuente de datos en vivo no devolvió datos válidos de Sharpen."""
+
+
+async def _get_calls_on_hold_rows() -> list:
     endpoint = "V2/queues/getCallsOnHold/"
     payload = {} # El payload para este endpoint específico es vacío
 
-    # ✅ ¡Llamada directa! No más proxy.
     data = await _call_sharpen_api_async(endpoint, payload)
-
     if data and "error" not in data:
-        calls_data = data.get("getCallsOnHoldData", []) # <-- Aquí se define 'calls_data'
-        return {"getCallsOnHoldData": calls_data}
-    logger.warning("No data or error received from Sharpen for getCallsOnHoldData. Returning empty.")
-    return {"getCallsOnHoldData": []}
+        return data.get("getCallsOnHoldData", [])
+    raise SharpenSourceError(f"getCallsOnHoldData: {data.get('error', 'sin datos') if data else 'sin datos'}")
 
-async def fetch_live_queue_status_data():
-    """
-    Obtiene los datos de Live Queue Status llamando a la API de Sharpen con la consulta SQL avanzada.
-    """
+
+async def _get_live_queue_status_rows() -> list:
     endpoint = "V2/query/"
 
     sql_query = SQL_CALL_COUNT_BY_QUEUE 
@@ -182,10 +192,66 @@ async def fetch_live_queue_status_data():
     # He añadido "AS \"Call Count\"" como ejemplo. Ajusta el nombre según lo que necesites en el frontend.
 
     data = await _call_sharpen_api_async(endpoint, payload)
-
     if data and "error" not in data and "data" in data: 
         # Parsear los resultados de V2/query/ de 'rows' y 'columns'
-        parsed_data = parse_sharpen_query_result(data)
-        return {"liveQueueStatus": parsed_data}
-    logger.warning("No data or error received from Sharpen for Live Queue Status. Returning empty.")
-    return {"liveQueueStatus": []}
+        return parse_sharpen_query_result(data)
+    raise SharpenSourceError(f"liveQueueStatus: {data.get('error', 'sin datos') if data else 'sin datos'}")
+
+
+# Esta función ahora contiene la lógica para hablar con la API externa
+async def fetch_calls_on_hold_data():
+    """
+    Obtiene los datos de las llamadas en espera llamando DIRECTAMENTE
+    a la función de servicio de Sharpen.
+    """
+    try:
+        return {"getCallsOnHoldData": await _get_calls_on_hold_rows()}
+    except SharpenSourceError:
+        logger.warning("No data or error received from Sharpen for getCallsOnHoldData. Returning empty.")
+        return {"getCallsOnHoldData": []}
+
+async def fetch_live_queue_status_data():
+    """
+    Obtiene los datos de Live Queue Status llamando a la API de Sharpen con la consulta SQL avanzada.
+    """
+    try:
+        return {"liveQueueStatus": await _get_live_queue_status_rows()}
+    except SharpenSourceError:
+        logger.warning("No data or error received from Sharpen for Live Queue Status. Returning empty.")
+        return {"liveQueueStatus": []}
+
+
+# Fuentes que componen el snapshot del dashboard en vivo: clave del payload -> función que trae las filas
+LIVE_SNAPSHOT_SOURCES = {
+    "getCallsOnHoldData": _get_calls_on_hold_rows,
+    "liveQueueStatus": _get_live_queue_status_rows,
+}
+
+
+async def _fetch_live_source(name: str, fetch_rows) -> tuple[str, list | None]:
+    timeout = settings.LIVE_SNAPSHOT_SOURCE_TIMEOUTS.get(name, settings.LIVE_SNAPSHOT_DEFAULT_TIMEOUT)
+    try:
+        # shield: si vence el timeout la petición sigue en curso y la aprovechan otros (single-flight)
+        return name, await asyncio.wait_for(asyncio.shield(fetch_rows()), timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning(f"Fuente en vivo '{name}' excedió el timeout de {timeout}s.")
+    except SharpenSourceError as e:
+        logger.warning(f"Fuente en vivo '{name}' sin datos válidos: {e}")
+    except Exception as e:
+        logger.error(f"Error inesperado en la fuente en vivo '{name}': {e}", exc_info=True)
+    return name, None
+
+
+async def fetch_live_snapshot_data() -> dict:
+    """
+    Consulta en paralelo todas las fuentes del dashboard en vivo (latencia = la fuente más lenta).
+
+    Devuelve `{"sources": {nombre: filas}, "failed": [nombres]}`. Las fuentes que fallan o
+    exceden su timeout no aparecen en `sources` y se listan en `failed` (resultado parcial).
+    """
+    results = await asyncio.gather(
+        *(_fetch_live_source(name, fetch_rows) for name, fetch_rows in LIVE_SNAPSHOT_SOURCES.items())
+    )
+    sources = {name: rows for name, rows in results if rows is not None}
+    failed = [name for name, rows in results if rows is None]
+    return {"sources": sources, "failed": failed}
@@ -0,0 +1,114 @@
+# websocket_app/heartbeat.py
+"""
+Heartbeat compartido para los WebSockets en vivo.
+
+En lugar de una tarea asyncio por conexión, cada event loop (Daphne tiene uno) mantiene un
+`HeartbeatHub` con una rueda de temporización: `LIVE_HEARTBEAT_INTERVAL` ranuras de 1 segundo.
+Cada conexión vive en una ranura y una sola tarea avanza la rueda, enviando el mismo frame
+pre-serializado a todas las conexiones de la ranura actual.
+
+Cualquier mensaje del cliente (ping, pong, resync) cuenta como señal de vida. Una conexión que
+ya envió alguno y luego acumula `LIVE_HEARTBEAT_MAX_MISSED` heartbeats seguidos sin respuesta se
+considera muerta: se saca del grupo y se cierra (0 = nunca). Las que nunca enviaron nada (clientes
+que sólo escuchan y no responden pong) no se expulsan por silencio; si el par desaparece, Daphne
+las cierra con su propio ping de protocolo (`--ping-timeout`) y `disconnect` las saca de la rueda.
+"""
+import asyncio
+import logging
+import threading
+import weakref
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_FRAME = '{"type":"heartbeat"}'
+WHEEL_RESOLUTION = 1.0  # segundos por ranura
+
+_lock = threading.Lock()
+_hubs: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, HeartbeatHub]" = weakref.WeakKeyDictionary()
+
+
+class HeartbeatHub:
+    def __init__(self, interval: float, max_missed: int, resolution: float = WHEEL_RESOLUTION):
+        self.resolution = resolution
+        self.max_missed = max_missed
+        self._slots = [set() for _ in range(max(1, round(interval / resolution)))]
+        self._slot_of = {}  # consumer -> índice de su ranura
+        self._missed = {}   # consumer -> heartbeats sin respuesta (None = nunca respondió)
+        self._cursor = 0
+        self._task = None
+
+    def __len__(self):
+        return len(self._slot_of)
+
+    def register(self, consumer) -> None:
+        # La ranura actual no se vuelve a procesar hasta dar la vuelta completa: el primer
+        # heartbeat llega un intervalo después de conectar, como con la tarea por conexión.
+        self._slots[self._cursor].add(consumer)
+        self._slot_of[consumer] = self._cursor
+        self._missed[consumer] = None
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def unregister(self, consumer) -> None:
+        index = self._slot_of.pop(consumer, None)
+        if index is not None:
+            self._slots[index].discard(consumer)
+        self._missed.pop(consumer, None)
+
+    def mark_alive(self, consumer) -> None:
+        if consumer in self._missed:
+            self._missed[consumer] = 0
+
+    async def _run(self):
+        logger.info("💓 Heartbeat compartido iniciado.")
+        try:
+            while self._slot_of:
+                await asyncio.sleep(self.resolution)
+                self._cursor = (self._cursor + 1) % len(self._slots)
+                due = list(self._slots[self._cursor])
+                if due:
+                    await self._beat(due)
+        except asyncio.CancelledError:
+            logger.info("⛔ Heartbeat compartido cancelado.")
+            raise
+        finally:
+            self._task = None
+
+    async def _beat(self, due: list):
+        dead = [
+            c for c in due
+            if self.max_missed and self._missed.get(c) is not None and self._missed[c] >= self.max_missed
+        ]
+        alive = [c for c in due if c not in dead]
+        for consumer in alive:
+            if self._missed.get(consumer) is not None:
+                self._missed[consumer] += 1
+
+        results = await asyncio.gather(
+            *(consumer.send(text_data=HEARTBEAT_FRAME) for consumer in alive), return_exceptions=True
+        )
+        for consumer, result in zip(alive, results):
+            if isinstance(result, Exception):
+                logger.error(f"❌ Error en heartbeat para {consumer.channel_name}: {result}")
+                self.unregister(consumer)
+        logger.debug(f"💓 Heartbeat enviado a {len(alive)} conexiones (ranura {self._cursor}).")
+
+        for consumer in dead:
+            self.unregister(consumer)
+            try:
+                await consumer.evict_dead_peer()
+            except Exception as e:
+                logger.error(f"Error al cerrar la conexión sin respuesta {consumer.channel_name}: {e}")
+
+
+def get_heartbeat_hub() -> HeartbeatHub:
+    """Devuelve el hub del event loop en ejecución, creándolo si hace falta."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        hub = _hubs.get(loop)
+        if hub is None:
+            hub = HeartbeatHub(settings.LIVE_HEARTBEAT_INTERVAL, settings.LIVE_HEARTBEAT_MAX_MISSED)
+            _hubs[loop] = hub
+        return hub
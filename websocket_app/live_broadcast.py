@@ -0,0 +1,186 @@
+# websocket_app/live_broadcast.py
+"""
+Un "tick" del dashboard en vivo (consultar Sharpen, publicar snapshot, emitir parche) y el
+poller asíncrono de larga vida que lo ejecuta con intervalo adaptativo.
+
+El poller (`python manage.py run_live_poller`) reemplaza al beat de 5 segundos: mientras está
+vivo mantiene un lock en Redis y la tarea `broadcast_calls_update` de Celery se salta sus ticks,
+así que el beat queda como respaldo si el poller se cae.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .consumers import CALLS_GROUP_NAME
+from .fetch_script import fetch_live_snapshot_data
+from .live_diff import anext_seq, diff_snapshots, full_message_json, patch_message_json
+from .live_snapshot import aget_last_snapshot, apublish_snapshot, build_snapshot
+from .live_views import aget_active_views, slice_snapshot, view_group_name
+
+logger = logging.getLogger(__name__)
+
+LIVE_TICK_LOCK_KEY = "live_tick_lock"
+
+
+async def acquire_tick_lock(owner: str, ttl: float) -> bool:
+    """
+    Toma (o renueva, si ya es nuestro) el lock que evita ticks simultáneos entre procesos.
+    Devuelve False si otro dueño lo tiene.
+    """
+    if await cache.aadd(LIVE_TICK_LOCK_KEY, owner, timeout=ttl):
+        return True
+    if await cache.aget(LIVE_TICK_LOCK_KEY) == owner:
+        await cache.atouch(LIVE_TICK_LOCK_KEY, timeout=ttl)
+        return True
+    return False
+
+
+async def release_tick_lock(owner: str) -> None:
+    if await cache.aget(LIVE_TICK_LOCK_KEY) == owner:
+        await cache.adelete(LIVE_TICK_LOCK_KEY)
+
+
+async def broadcast_live_tick(channel_layer, log_prefix: str = "[Live]") -> dict | None:
+    """
+    Ejecuta un tick completo. Devuelve el snapshot publicado (con `changed` indicando si se
+    emitió algo) o None si ninguna fuente respondió.
+    """
+    # 1. Todas las fuentes en paralelo; las que fallen conservan los datos del snapshot anterior
+    fetch_result = await fetch_live_snapshot_data()
+    if not fetch_result["sources"]:
+        logger.warning(f"{log_prefix} Ninguna fuente en vivo respondió ({fetch_result['failed']}). Se omite este tick.")
+        return None
+
+    # 2. Comparar contra el último snapshot publicado (la base de los parches que tienen los clientes)
+    previous = await aget_last_snapshot()
+    snapshot = build_snapshot(fetch_result, previous=previous)
+    logger.debug(f"New checksums: {snapshot['checksums']}")
+
+    patch = diff_snapshots(previous, snapshot) if previous else None
+    if previous and not patch:
+        snapshot["seq"] = previous.get("seq")
+        await apublish_snapshot(snapshot)
+        logger.debug(f"{log_prefix} No se detectaron cambios en los datos. No se envía actualización a los clientes.")
+        return {**snapshot, "changed": False}
+
+    # 3. Publicamos el snapshot con su nuevo número de secuencia antes de emitir,
+    #    así un cliente que pida resync recibe el mismo estado que el parche produce.
+    base_seq = previous.get("seq") if previous else None
+    snapshot["seq"] = await anext_seq()
+    await apublish_snapshot(snapshot)
+
+    # El mensaje completo reutiliza el JSON de cada fuente serializado en build_snapshot
+    full_json = full_message_json(snapshot)
+    message_to_send = full_json
+    if patch and base_seq is not None:
+        patch_json = patch_message_json(patch, base_seq, snapshot["seq"])
+        # Si casi todo cambió el parche puede ser más grande que el estado completo
+        if len(patch_json) < len(full_json):
+            message_to_send = patch_json
+
+    logger.info(
+        f"{log_prefix} Cambios detectados. Emitiendo seq={snapshot['seq']} "
+        f"({'parche' if message_to_send is not full_json else 'completo'}, {len(message_to_send)} bytes)."
+    )
+    # Se codifica una sola vez: viaja como bytes por el channel layer y cada consumer
+    # lo escribe en su socket tal cual (ver CallsConsumer.send_message)
+    await channel_layer.group_send(
+        CALLS_GROUP_NAME,
+        {
+            "type": "send.message",
+            "bytes": message_to_send.encode("utf-8")
+        }
+    )
+    await broadcast_view_slices(channel_layer, previous, snapshot, base_seq)
+    return {**snapshot, "changed": True}
+
+
+async def broadcast_view_slices(channel_layer, previous: dict | None, snapshot: dict, base_seq: int | None) -> None:
+    """
+    Envía a cada grupo de vista (ver live_views) sólo las filas de sus colas. Todas las vistas
+    reciben un mensaje con el nuevo seq en cada tick con cambios, aunque su parte no haya
+    cambiado (parche vacío), para que su secuencia de parches no tenga huecos.
+    """
+    views = await aget_active_views()
+    for view in views:
+        view_snapshot = slice_snapshot(snapshot, view)
+        message = full_message_json(view_snapshot)
+        if previous and base_seq is not None:
+            view_patch = diff_snapshots(slice_snapshot(previous, view), view_snapshot)
+            patch_json = patch_message_json(view_patch, base_seq, snapshot["seq"])
+            if len(patch_json) < len(message):
+                message = patch_json
+        await channel_layer.group_send(
+            view_group_name(view),
+            {
+                "type": "send.message",
+                "bytes": message.encode("utf-8")
+            }
+        )
+    if views:
+        logger.debug(f"Emitidas {len(views)} vistas por cola (seq={snapshot['seq']}).")
+
+
+class LivePoller:
+    """
+    Bucle de sondeo de Sharpen con intervalo adaptativo:
+    - vuelve al intervalo mínimo cuando hay cambios o llamadas en espera,
+    - multiplica el intervalo por `backoff` (hasta el máximo) cuando todo está quieto,
+    - agrega jitter para no sincronizarse con otros procesos,
+    - nunca solapa ticks (el siguiente se programa al terminar el anterior).
+    """
+
+    def __init__(self, channel_layer, min_interval=None, max_interval=None, backoff=None, jitter=None):
+        self.channel_layer = channel_layer
+        self.min_interval = min_interval or settings.LIVE_POLL_MIN_INTERVAL
+        self.max_interval = max_interval or settings.LIVE_POLL_MAX_INTERVAL
+        self.backoff = backoff or settings.LIVE_POLL_BACKOFF
+        self.jitter = settings.LIVE_POLL_JITTER if jitter is None else jitter
+        self.interval = self.min_interval
+        self.owner = f"poller:{socket.gethostname()}:{os.getpid()}"
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    def _next_interval(self, snapshot: dict | None) -> float:
+        if snapshot is None:
+            # Sharpen no respondió: nos alejamos para no martillar la API
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        elif snapshot["changed"] or snapshot.get("getCallsOnHoldData"):
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * self.backoff, self.max_interval)
+        return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+    async def run(self):
+        logger.info(f"🚀 Poller en vivo iniciado ({self.owner}), intervalo {self.min_interval}-{self.max_interval}s.")
+        lock_ttl = self.max_interval * 3
+        try:
+            while not self._stopping.is_set():
+                if await acquire_tick_lock(self.owner, lock_ttl):
+                    started = time.monotonic()
+                    snapshot = None
+                    try:
+                        snapshot = await broadcast_live_tick(self.channel_layer, log_prefix="[Poller]")
+                    except Exception as e:
+                        logger.exception(f"Error en el tick del poller en vivo: {e}")
+                    logger.debug(f"Tick del poller en {time.monotonic() - started:.3f}s.")
+                    delay = self._next_interval(snapshot)
+                else:
+                    logger.debug("Otro proceso tiene el lock del tick en vivo; esperando.")
+                    delay = self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await release_tick_lock(self.owner)
+            logger.info(f"Poller en vivo detenido ({self.owner}).")
@@ -0,0 +1,110 @@
+# websocket_app/live_diff.py
+"""
+Cálculo de parches (inserts/updates/removals) entre dos snapshots en vivo.
+
+Cada fila se identifica por el primer campo de `settings.LIVE_ROW_KEY_FIELDS[fuente]` que
+tenga valor (p. ej. el uniqueID de la llamada o el nombre de la cola). Si ninguno existe,
+se usa el hash de la fila como clave, de modo que un cambio se ve como eliminación + inserción.
+
+Sólo se comparan filas de las fuentes cuyo checksum cambió, y los mensajes se arman
+concatenando JSON ya serializado en lugar de volver a serializar el payload.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .live_encoding import EncodedRows, canonical_json, encode_rows, row_hash
+
+logger = logging.getLogger(__name__)
+
+LIVE_SEQ_CACHE_KEY = "live_snapshot_seq"
+
+# Nombre de cada fuente del snapshot en los mensajes al frontend
+PAYLOAD_KEYS = {
+    "getCallsOnHoldData": "getCallsOnHoldData",
+    "liveQueueStatus": "getLiveQueueStatusData",
+}
+
+
+def row_key(row, key_fields: tuple) -> str:
+    if isinstance(row, dict):
+        for field in key_fields:
+            value = row.get(field)
+            if value not in (None, ""):
+                return str(value)
+    return row_hash(row)
+
+
+def diff_rows(source: str, previous_rows: list, new_rows: list) -> dict | None:
+    """
+    Devuelve `{"upserts": [(key, row_json)...], "removes": [keys], "order": [keys]}` o None si no hay cambios.
+    `order` sólo se incluye si el orden final no coincide con el que obtendría el cliente
+    aplicando el parche (filas existentes en su orden + nuevas al final).
+    """
+    key_fields = settings.LIVE_ROW_KEY_FIELDS.get(source, ())
+    previous_by_key = {row_key(row, key_fields): row for row in previous_rows}
+    new_keys = []
+    upserts = []
+    for row in new_rows:
+        key = row_key(row, key_fields)
+        new_keys.append(key)
+        if previous_by_key.get(key) != row:
+            upserts.append((key, canonical_json(row)))
+
+    new_key_set = set(new_keys)
+    removes = [key for key in previous_by_key if key not in new_key_set]
+    if not upserts and not removes and list(previous_by_key) == new_keys:
+        return None
+
+    patch = {"upserts": upserts, "removes": removes}
+    expected_order = [key for key in previous_by_key if key in new_key_set]
+    expected_order += [key for key in new_keys if key not in previous_by_key]
+    if expected_order != new_keys:
+        patch["order"] = new_keys
+    return patch
+
+
+def _encoded_sources(snapshot: dict) -> dict[str, EncodedRows]:
+    """Filas ya serializadas del snapshot; si viene de Redis (sin `_encoded`) se serializan aquí."""
+    encoded = snapshot.get("_encoded") or {}
+    return {source: encoded.get(source) or encode_rows(snapshot.get(source, [])) for source in PAYLOAD_KEYS}
+
+
+def diff_snapshots(previous: dict, snapshot: dict) -> dict:
+    """Parche por fuente (con el nombre que usa el frontend) para las fuentes que cambiaron."""
+    patch = {}
+    for source, payload_key in PAYLOAD_KEYS.items():
+        if previous.get("checksums", {}).get(source) == snapshot["checksums"].get(source):
+            continue
+        source_patch = diff_rows(source, previous.get(source, []), snapshot.get(source, []))
+        if source_patch is not None:
+            patch[payload_key] = source_patch
+    return patch
+
+
+async def anext_seq() -> int:
+    """Número de secuencia monotónico compartido por todos los procesos (INCR de Redis)."""
+    await cache.aadd(LIVE_SEQ_CACHE_KEY, 0, timeout=None)
+    return await cache.aincr(LIVE_SEQ_CACHE_KEY)
+
+
+def full_message_json(snapshot: dict) -> str:
+    """`{"type": "dataUpdate", "seq", "payload": {...}}` armado con el JSON ya serializado de cada fuente."""
+    encoded = _encoded_sources(snapshot)
+    payload = ",".join(
+        f"{canonical_json(payload_key)}:{encoded[source].array_json}" for source, payload_key in PAYLOAD_KEYS.items()
+    )
+    return f'{{"type":"dataUpdate","seq":{canonical_json(snapshot.get("seq"))},"payload":{{{payload}}}}}'
+
+
+def patch_message_json(patch: dict, base_seq: int, seq: int) -> str:
+    """`{"type": "dataPatch", "seq", "baseSeq", "patch": {...}}` con upserts `{"key", "row"}`."""
+    parts = []
+    for payload_key, source_patch in patch.items():
+        upserts = ",".join(f'{{"key":{canonical_json(key)},"row":{row_json}}}' for key, row_json in source_patch["upserts"])
+        body = f'"upserts":[{upserts}],"removes":{canonical_json(source_patch["removes"])}'
+        if "order" in source_patch:
+            body += f',"order":{canonical_json(source_patch["order"])}'
+        parts.append(f"{canonical_json(payload_key)}:{{{body}}}")
+    return f'{{"type":"dataPatch","seq":{seq},"baseSeq":{base_seq},"patch":{{{",".join(parts)}}}}}'
@@ -0,0 +1,44 @@
+# websocket_app/live_encoding.py
+"""
+Serialización canónica + hash rápido para la detección de cambios del dashboard en vivo.
+
+Cada fuente se serializa UNA sola vez (JSON compacto con claves ordenadas) y:
+- el checksum es un BLAKE2b de 8 bytes sobre esos bytes (no criptográfico para este uso),
+- el mensaje `dataUpdate` se arma concatenando esa misma cadena.
+
+Sólo se serializan fila por fila las filas que entran en un parche; el diff compara las filas
+como diccionarios (en C) y `row_hash` queda para las filas que no traen identificador.
+"""
+import hashlib
+import json
+from typing import NamedTuple
+
+_ENCODER_OPTIONS = dict(sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+# default=str: cualquier valor no serializable (fechas, Decimals) se convierte en texto en lugar de fallar
+_encode = json.JSONEncoder(**_ENCODER_OPTIONS).encode
+
+
+def canonical_json(value) -> str:
+    return _encode(value)
+
+
+def fast_hash(data: bytes) -> str:
+    return hashlib.blake2b(data, digest_size=8).hexdigest()
+
+
+def row_hash(row) -> str:
+    """Hash de una sola fila (lo usa el diff como clave de filas sin identificador)."""
+    return fast_hash(_encode(row).encode("utf-8"))
+
+
+class EncodedRows(NamedTuple):
+    """Filas de una fuente con su serialización única (para el mensaje) y su checksum."""
+    rows: list
+    array_json: str
+    checksum: str
+
+
+def encode_rows(rows: list | None) -> EncodedRows:
+    rows = rows or []
+    array_json = _encode(rows)
+    return EncodedRows(rows, array_json, fast_hash(array_json.encode("utf-8")))
@@ -0,0 +1,90 @@
+# websocket_app/live_snapshot.py
+"""
+Último snapshot de datos en vivo (llamadas en espera + live queue status) compartido en Redis.
+
+`broadcast_calls_update` lo publica en cada tick; los consumidores WebSocket y las vistas REST
+lo leen y sólo vuelven a consultar Sharpen si no existe o es más viejo que
+`settings.LIVE_SNAPSHOT_MAX_AGE` segundos.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .live_encoding import encode_rows
+
+logger = logging.getLogger(__name__)
+
+LIVE_SNAPSHOT_CACHE_KEY = "live_snapshot"
+# Tiempo que Redis conserva la entrada; la frescura real se controla con `fetched_at`.
+LIVE_SNAPSHOT_CACHE_TIMEOUT = 300
+# Debe coincidir con las claves de fetch_script.LIVE_SNAPSHOT_SOURCES
+LIVE_SNAPSHOT_SOURCE_NAMES = ("getCallsOnHoldData", "liveQueueStatus")
+
+
+def build_snapshot(fetch_result: dict, previous: dict | None = None) -> dict:
+    """
+    Arma un snapshot a partir del resultado de `fetch_live_snapshot_data`.
+
+    Las fuentes que fallaron conservan las filas, el checksum y la hora de consulta del snapshot
+    anterior (o quedan vacías si no hay). `fetched_at` es la hora de la fuente más vieja, de modo
+    que una fuente que falla repetidamente termina marcando el snapshot como expirado.
+    """
+    now = time.time()
+    previous = previous or {}
+    snapshot = {
+        "checksums": {},
+        "source_fetched_at": {},
+        "stale_sources": list(fetch_result.get("failed", [])),
+        # Filas ya serializadas para armar los mensajes; no se guardan en Redis
+        "_encoded": {},
+    }
+
+    for name in LIVE_SNAPSHOT_SOURCE_NAMES:
+        if name in fetch_result.get("sources", {}):
+            rows = fetch_result["sources"][name]
+            snapshot["source_fetched_at"][name] = now
+        else:
+            rows = previous.get(name, [])
+            snapshot["source_fetched_at"][name] = previous.get("source_fetched_at", {}).get(name, 0)
+        encoded = encode_rows(rows)
+        snapshot[name] = rows
+        snapshot["checksums"][name] = encoded.checksum
+        snapshot["_encoded"][name] = encoded
+
+    snapshot["fetched_at"] = min(snapshot["source_fetched_at"].values())
+    return snapshot
+
+
+async def aget_last_snapshot() -> dict | None:
+    """Último snapshot publicado, sin importar su antigüedad."""
+    return await cache.aget(LIVE_SNAPSHOT_CACHE_KEY)
+
+
+def _is_fresh(snapshot, max_age: float | None) -> bool:
+    if not snapshot:
+        return False
+    if max_age is None:
+        max_age = settings.LIVE_SNAPSHOT_MAX_AGE
+    age = time.time() - snapshot.get("fetched_at", 0)
+    if age > max_age:
+        logger.debug(f"Snapshot en vivo expirado ({age:.1f}s > {max_age}s).")
+        return False
+    return True
+
+
+async def apublish_snapshot(snapshot: dict) -> None:
+    stored = {key: value for key, value in snapshot.items() if not key.startswith("_")}
+    await cache.aset(LIVE_SNAPSHOT_CACHE_KEY, stored, LIVE_SNAPSHOT_CACHE_TIMEOUT)
+
+
+def get_fresh_snapshot(max_age: float | None = None) -> dict | None:
+    """Devuelve el snapshot publicado si no supera `max_age` segundos; si no, None."""
+    snapshot = cache.get(LIVE_SNAPSHOT_CACHE_KEY)
+    return snapshot if _is_fresh(snapshot, max_age) else None
+
+
+async def aget_fresh_snapshot(max_age: float | None = None) -> dict | None:
+    snapshot = await cache.aget(LIVE_SNAPSHOT_CACHE_KEY)
+    return snapshot if _is_fresh(snapshot, max_age) else None
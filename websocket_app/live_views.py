@@ -0,0 +1,137 @@
+# websocket_app/live_views.py
+"""
+Vistas por cola del dashboard en vivo.
+
+Los usuarios con rol en `settings.LIVE_FULL_VIEW_ROLES` (y el staff) siguen en el grupo `calls`
+y reciben todas las colas. Los demás usuarios con colas asignadas (`User.queues`) se unen a
+un grupo por "vista" (el conjunto de nombres de sus colas) y sólo reciben las filas de esas
+colas. Una vista por combinación de colas, y no un grupo por cola, mantiene un solo mensaje
+(y una sola secuencia de parches) por cliente.
+
+El broadcaster recarga las vistas de la base cada `LIVE_VIEWS_REFRESH` segundos, o antes si un
+consumer avisa (`amark_view_connected`) que se conectó una vista que no se vio en esa ventana:
+así un agente cuya vista aparece entre dos recargas no queda sin actualizaciones.
+"""
+import logging
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .live_encoding import canonical_json, encode_rows, fast_hash
+from .live_snapshot import LIVE_SNAPSHOT_SOURCE_NAMES
+
+logger = logging.getLogger(__name__)
+
+VIEW_GROUP_PREFIX = "calls.view."
+
+# Cambia cada vez que se conecta una vista nueva; el broadcaster la compara en cada tick
+LIVE_VIEWS_VERSION_KEY = "live_views_version"
+LIVE_VIEW_SEEN_PREFIX = "live_view_seen:"
+
+_views_cache: dict = {"views": None, "loaded_at": 0.0, "version": None}
+
+
+def normalize_queue_name(name) -> str:
+    return str(name).strip().casefold()
+
+
+def view_group_name(view: frozenset) -> str:
+    """Nombre de grupo válido para Channels (ASCII, < 100 caracteres) para un conjunto de colas."""
+    return VIEW_GROUP_PREFIX + fast_hash(canonical_json(sorted(view)).encode("utf-8"))
+
+
+def user_view(user) -> frozenset | None:
+    """
+    Colas (normalizadas) que ve el usuario, o None si ve todas. Hace consultas a la base:
+    desde código asíncrono usar `database_sync_to_async`.
+    """
+    if not getattr(user, "is_authenticated", False):
+        # Sin token válido se conserva el comportamiento anterior (todas las colas)
+        return None
+    if user.is_staff or user.role in settings.LIVE_FULL_VIEW_ROLES:
+        return None
+    names = frozenset(normalize_queue_name(name) for name in user.queues.values_list("name", flat=True))
+    return names or None
+
+
+def _load_active_views() -> list[frozenset]:
+    from django.contrib.auth import get_user_model
+
+    User = get_user_model()
+    users = (
+        User.objects.filter(is_active=True, is_staff=False, queues__isnull=False)
+        .exclude(role__in=settings.LIVE_FULL_VIEW_ROLES)
+        .prefetch_related("queues")
+        .distinct()
+    )
+    views = {frozenset(normalize_queue_name(queue.name) for queue in user.queues.all()) for user in users}
+    return [view for view in views if view]
+
+
+async def amark_view_connected(view: frozenset) -> None:
+    """
+    Lo llama el consumer al conectarse a una vista. Si no se vio en los últimos
+    `LIVE_VIEWS_REFRESH` segundos cambia la versión, y el broadcaster recarga las vistas en su
+    próximo tick en lugar de esperar a la recarga periódica.
+    """
+    try:
+        if await cache.aadd(LIVE_VIEW_SEEN_PREFIX + view_group_name(view), 1, timeout=settings.LIVE_VIEWS_REFRESH):
+            await cache.aset(LIVE_VIEWS_VERSION_KEY, uuid.uuid4().hex, timeout=None)
+    except Exception as e:
+        logger.warning(f"No se pudo registrar la vista por cola conectada: {e}")
+
+
+async def aget_active_views() -> list[frozenset]:
+    """
+    Vistas posibles según la base, recargadas cada `LIVE_VIEWS_REFRESH` segundos o cuando se
+    conecta una vista nueva (ver `amark_view_connected`).
+    """
+    now = time.monotonic()
+    try:
+        version = await cache.aget(LIVE_VIEWS_VERSION_KEY)
+    except Exception as e:
+        logger.warning(f"No se pudo leer la versión de las vistas por cola: {e}")
+        version = _views_cache["version"]
+    if (
+        _views_cache["views"] is None
+        or now - _views_cache["loaded_at"] > settings.LIVE_VIEWS_REFRESH
+        or version != _views_cache["version"]
+    ):
+        try:
+            _views_cache["views"] = await sync_to_async(_load_active_views)()
+            _views_cache["loaded_at"] = now
+            # La versión leída antes de cargar: una vista que se conecte durante la carga fuerza otra
+            _views_cache["version"] = version
+            logger.debug(f"{len(_views_cache['views'])} vistas por cola activas.")
+        except Exception as e:
+            logger.error(f"No se pudieron cargar las vistas por cola: {e}", exc_info=True)
+            if _views_cache["views"] is None:
+                return []
+    return _views_cache["views"]
+
+
+def _row_queue(row, queue_fields: tuple) -> str | None:
+    if isinstance(row, dict):
+        for field in queue_fields:
+            value = row.get(field)
+            if value not in (None, ""):
+                return normalize_queue_name(value)
+    return None
+
+
+def slice_snapshot(snapshot: dict, view: frozenset) -> dict:
+    """Copia del snapshot con sólo las filas de las colas de la vista (con su propio checksum)."""
+    sliced = {key: value for key, value in snapshot.items() if not key.startswith("_")}
+    sliced["checksums"] = {}
+    sliced["_encoded"] = {}
+    for name in LIVE_SNAPSHOT_SOURCE_NAMES:
+        queue_fields = settings.LIVE_ROW_QUEUE_FIELDS.get(name, ())
+        rows = [row for row in snapshot.get(name, []) if _row_queue(row, queue_fields) in view]
+        encoded = encode_rows(rows)
+        sliced[name] = rows
+        sliced["checksums"][name] = encoded.checksum
+        sliced["_encoded"][name] = encoded
+    return sliced
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import random
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from websocket_app.live_diff import diff_snapshots, full_message_json, patch_message_json
+from websocket_app.live_snapshot import build_snapshot
+
+
+def legacy_checksum(data):
+    """Implementación anterior de tasks.get_checksum (MD5 sobre json.dumps con sort_keys)."""
+    return hashlib.md5(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def sample_calls_on_hold(n: int) -> list[dict]:
+    """Filas con la forma aproximada de getCallsOnHoldData."""
+    queues = ["GVHC Appointments", "GVHC Nurse Line", "GVHC Billing", "GVHC Pharmacy", "GVHC Spanish"]
+    return [
+        {
+            "uniqueID": f"1723{i:06d}.{random.randint(1000, 9999)}",
+            "queueCallManagerID": str(300000 + i),
+            "queueName": random.choice(queues),
+            "callerID": f"+1559{random.randint(1000000, 9999999)}",
+            "callerName": f"CALLER {i}",
+            "commType": "call",
+            "startTime": f"2025-08-01 {8 + i % 9:02d}:{i % 60:02d}:{(i * 7) % 60:02d}",
+            "currentTime": "2025-08-01 17:00:00",
+            "holdTime": str(random.randint(0, 1800)),
+            "position": str(i + 1),
+            "priority": str(random.randint(0, 5)),
+            "language": random.choice(["en", "es"]),
+            "status": random.choice(["waiting", "ringing", "callback"]),
+            "agentUsername": "",
+            "transferCount": str(random.randint(0, 3)),
+        }
+        for i in range(n)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Compara la detección de cambios anterior (MD5 + doble json.dumps) contra la serialización única con hash rápido'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=500)
+        parser.add_argument('--iterations', type=int, default=200)
+
+    def handle(self, *args, **options):
+        random.seed(42)
+        calls = sample_calls_on_hold(options['rows'])
+        queues = [{"Queue Name": f"Queue {i}", "Call Count": i} for i in range(20)]
+        iterations = options['iterations']
+
+        def fetch(rows):
+            return {"sources": {"getCallsOnHoldData": rows, "liveQueueStatus": queues}, "failed": []}
+
+        # Mismo estado con algunas filas modificadas (llamadas que avanzan en la cola)
+        changed_calls = [dict(row) for row in calls]
+        for row in changed_calls[::50]:
+            row["holdTime"] = str(int(row["holdTime"]) + 5)
+        previous = build_snapshot(fetch(calls))
+        previous["seq"] = 1
+        stored_previous = {key: value for key, value in previous.items() if not key.startswith("_")}
+
+        def legacy_unchanged_tick():
+            # broadcast_calls_update antes: checksum MD5 por fuente en cada tick
+            legacy_checksum(calls)
+            legacy_checksum(queues)
+
+        def new_unchanged_tick():
+            build_snapshot(fetch(calls), previous=stored_previous)
+
+        def legacy_full_tick():
+            # checksum por fuente + serialización del mensaje completo
+            legacy_checksum(calls)
+            legacy_checksum(queues)
+            json.dumps({"type": "dataUpdate", "payload": {"getCallsOnHoldData": calls, "getLiveQueueStatusData": queues}})
+
+        def new_full_tick():
+            snapshot = build_snapshot(fetch(calls))
+            snapshot["seq"] = 1
+            full_message_json(snapshot)
+
+        def legacy_patch_tick():
+            # checksum + diff comparando diccionarios fila a fila + json.dumps del parche
+            legacy_checksum(changed_calls)
+            legacy_checksum(queues)
+            previous_by_key = {row["uniqueID"]: row for row in calls}
+            upserts = [
+                {"key": row["uniqueID"], "row": row}
+                for row in changed_calls if previous_by_key.get(row["uniqueID"]) != row
+            ]
+            json.dumps({"type": "dataPatch", "seq": 2, "baseSeq": 1,
+                        "patch": {"getCallsOnHoldData": {"upserts": upserts, "removes": []}}})
+
+        def new_patch_tick():
+            snapshot = build_snapshot(fetch(changed_calls), previous=stored_previous)
+            patch = diff_snapshots(stored_previous, snapshot)
+            patch_message_json(patch, 1, 2)
+
+        results = [
+            ("tick sin cambios", legacy_unchanged_tick, new_unchanged_tick),
+            ("tick completo", legacy_full_tick, new_full_tick),
+            ("tick con parche", legacy_patch_tick, new_patch_tick),
+        ]
+        self.stdout.write(f"{options['rows']} filas, {iterations} iteraciones (mejor de 5)")
+        for label, legacy, new in results:
+            legacy_ms = min(timeit.repeat(legacy, number=iterations, repeat=5)) / iterations * 1000
+            new_ms = min(timeit.repeat(new, number=iterations, repeat=5)) / iterations * 1000
+            self.stdout.write(
+                f"{label:<18} anterior: {legacy_ms:7.3f} ms   nuevo: {new_ms:7.3f} ms   ({legacy_ms / new_ms:.2f}x)"
+            )
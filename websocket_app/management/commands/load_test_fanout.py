@@ -0,0 +1,109 @@
+import asyncio
+import random
+import statistics
+import time
+
+from channels.layers import channel_layers
+from channels.testing import WebsocketCommunicator
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from websocket_app.consumers import CALLS_GROUP_NAME, CallsConsumer
+from websocket_app.heartbeat import HEARTBEAT_FRAME
+from websocket_app.live_diff import full_message_json
+from websocket_app.live_snapshot import build_snapshot
+from websocket_app.management.commands.bench_live_checksum import sample_calls_on_hold
+
+LOAD_TEST_LAYER_ALIAS = "load_test_fanout"
+
+
+class LoadTestCallsConsumer(CallsConsumer):
+    """CallsConsumer sin el estado inicial (no consulta Redis ni Sharpen durante la prueba)."""
+
+    async def send_full_state(self):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Prueba de carga del fan-out: N consumers en proceso contra un channel layer en memoria; reporta percentiles de latencia'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumers', type=int, default=200)
+        parser.add_argument('--messages', type=int, default=50)
+        parser.add_argument('--rows', type=int, default=500, help='Filas de llamadas en espera por mensaje')
+        parser.add_argument('--interval', type=float, default=0.05, help='Segundos entre mensajes')
+        parser.add_argument('--text', action='store_true', help='Frames de texto (por defecto binarios, ?binary=1)')
+
+    def handle(self, *args, **options):
+        # Channel layer en memoria sólo para esta prueba; no toca el de Redis configurado
+        settings.CHANNEL_LAYERS[LOAD_TEST_LAYER_ALIAS] = {
+            "BACKEND": "channels.layers.InMemoryChannelLayer",
+            "CONFIG": {"capacity": options['messages'] + 10},
+        }
+        random.seed(42)
+        snapshot = build_snapshot({
+            "sources": {"getCallsOnHoldData": sample_calls_on_hold(options['rows']), "liveQueueStatus": []},
+            "failed": [],
+        })
+        snapshot["seq"] = 1
+        data = full_message_json(snapshot).encode("utf-8")
+
+        latencies, elapsed = asyncio.run(self._run(data, options))
+
+        received = len(latencies)
+        expected = options['consumers'] * options['messages']
+        self.stdout.write(
+            f"{options['consumers']} consumers, {options['messages']} mensajes de {len(data)} bytes "
+            f"({'texto' if options['text'] else 'binario'}), entregados {received}/{expected} en {elapsed:.2f}s "
+            f"({received / elapsed:.0f} entregas/s)"
+        )
+        if received < 2:
+            return
+        cuts = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"latencia ms  p50: {cuts[49] * 1000:.2f}  p95: {cuts[94] * 1000:.2f}  "
+            f"p99: {cuts[98] * 1000:.2f}  max: {max(latencies) * 1000:.2f}"
+        )
+
+    async def _run(self, data: bytes, options) -> tuple[list[float], float]:
+        channel_layer = channel_layers[LOAD_TEST_LAYER_ALIAS]
+        application = LoadTestCallsConsumer.as_asgi(channel_layer_alias=LOAD_TEST_LAYER_ALIAS)
+        path = "/ws/calls/" if options['text'] else "/ws/calls/?binary=1"
+
+        communicators = [WebsocketCommunicator(application, path) for _ in range(options['consumers'])]
+        for communicator in communicators:
+            connected, _ = await communicator.connect()
+            if not connected:
+                raise RuntimeError("Un consumer de prueba rechazó la conexión.")
+            await communicator.receive_output()  # "WebSocket conectado"
+        # group_add ocurre después del accept: esperamos a que todos estén en el grupo
+        while len(channel_layer.groups.get(CALLS_GROUP_NAME, {})) < len(communicators):
+            await asyncio.sleep(0.01)
+
+        sent_at = []
+        latencies = []
+
+        async def drain(communicator):
+            index = 0
+            while index < options['messages']:
+                try:
+                    output = await communicator.receive_output(timeout=10)
+                except asyncio.TimeoutError:
+                    return
+                if output.get("text") == HEARTBEAT_FRAME:
+                    continue
+                latencies.append(time.perf_counter() - sent_at[index])
+                index += 1
+
+        started = time.perf_counter()
+        drains = [asyncio.create_task(drain(communicator)) for communicator in communicators]
+        for _ in range(options['messages']):
+            sent_at.append(time.perf_counter())
+            await channel_layer.group_send(CALLS_GROUP_NAME, {"type": "send.message", "bytes": data})
+            await asyncio.sleep(options['interval'])
+        await asyncio.gather(*drains)
+        elapsed = time.perf_counter() - started
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        return latencies, elapsed
@@ -0,0 +1,46 @@
+import asyncio
+import signal
+
+from channels.layers import get_channel_layer
+from django.core.management.base import BaseCommand, CommandError
+
+from websocket_app.live_broadcast import LivePoller
+from websocket_app.sharpen_client import aclose_async_client
+
+
+class Command(BaseCommand):
+    help = 'Sondea Sharpen y emite las actualizaciones del dashboard en vivo (reemplaza al beat de 5 segundos)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-interval', type=float, help='Intervalo mínimo en segundos (LIVE_POLL_MIN_INTERVAL)')
+        parser.add_argument('--max-interval', type=float, help='Intervalo máximo en segundos (LIVE_POLL_MAX_INTERVAL)')
+        parser.add_argument('--backoff', type=float, help='Factor de crecimiento del intervalo sin actividad (LIVE_POLL_BACKOFF)')
+        parser.add_argument('--jitter', type=float, help='Jitter relativo, p. ej. 0.1 = ±10%% (LIVE_POLL_JITTER)')
+
+    def handle(self, *args, **options):
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            raise CommandError("Channel layer not configured.")
+
+        poller = LivePoller(
+            channel_layer,
+            min_interval=options['min_interval'],
+            max_interval=options['max_interval'],
+            backoff=options['backoff'],
+            jitter=options['jitter'],
+        )
+        asyncio.run(self._run(poller))
+        self.stdout.write(self.style.SUCCESS("✅ Poller en vivo detenido"))
+
+    async def _run(self, poller):
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, poller.stop)
+            except NotImplementedError:
+                # Windows: Ctrl+C llega como KeyboardInterrupt
+                pass
+        try:
+            await poller.run()
+        finally:
+            await aclose_async_client()
@@ -0,0 +1,178 @@
+# websocket_app/sharpen_client.py
+"""
+Clientes HTTP compartidos (con pool de conexiones keep-alive) para hablar con Sharpen.
+
+- `get_async_client()` devuelve un `httpx.AsyncClient` por event loop (Daphne tiene uno
+  solo y de larga vida, así que todas las conexiones WebSocket y vistas lo comparten).
+- `get_sync_client()` devuelve un `httpx.Client` único por proceso para las vistas síncronas
+  (URL de grabaciones).
+- `get_async_audio_client()` es un cliente aparte, también por event loop, para descargar
+  grabaciones de S3: un streaming largo (o lento por contrapresión del navegador) ocupa su
+  conexión por minutos y no debe dejar sin conexiones a las llamadas a la API de Sharpen.
+- `run_sync()` ejecuta una corrutina en un loop de fondo persistente. Los procesos que no
+  tienen loop propio (Celery) deben usarlo en lugar de `async_to_sync`, que crea un loop
+  nuevo en cada llamada y por lo tanto tiraría el pool en cada tick.
+"""
+import asyncio
+import atexit
+import importlib.util
+import logging
+import threading
+import weakref
+
+import httpx
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# HTTP/2 necesita el paquete opcional `h2`; si no está instalado usamos HTTP/1.1 con keep-alive.
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+_lock = threading.Lock()
+_async_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_async_audio_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_sync_client: httpx.Client | None = None
+_io_loop: asyncio.AbstractEventLoop | None = None
+_io_thread: threading.Thread | None = None
+
+
+def _client_options() -> dict:
+    """Opciones comunes (límites del pool, timeouts y HTTP/2) leídas de settings."""
+    use_http2 = settings.SHARPEN_HTTP2 and HTTP2_AVAILABLE
+    if settings.SHARPEN_HTTP2 and not HTTP2_AVAILABLE:
+        logger.warning("SHARPEN_HTTP2 está activo pero el paquete 'h2' no está instalado. Usando HTTP/1.1.")
+    return {
+        "http2": use_http2,
+        "limits": httpx.Limits(
+            max_connections=settings.SHARPEN_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.SHARPEN_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.SHARPEN_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        "timeout": httpx.Timeout(settings.SHARPEN_HTTP_TIMEOUT),
+    }
+
+
+def get_async_client() -> httpx.AsyncClient:
+    """Devuelve el cliente asíncrono asociado al event loop en ejecución, creándolo si hace falta."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.get(loop)
+        if client is None or client.is_closed:
+            options = _client_options()
+            client = httpx.AsyncClient(**options)
+            _async_clients[loop] = client
+            logger.info(f"🔌 Nuevo cliente HTTP de Sharpen creado para el loop {id(loop)} (http2={options['http2']}).")
+        return client
+
+
+def _audio_client_options() -> dict:
+    """Límites y timeouts propios de las descargas de audio (HTTP/1.1: S3 no habla HTTP/2)."""
+    return {
+        "limits": httpx.Limits(
+            max_connections=settings.AUDIO_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.AUDIO_HTTP_MAX_KEEPALIVE,
+            keepalive_expiry=settings.SHARPEN_HTTP_KEEPALIVE_EXPIRY,
+        ),
+        # `read` es el máximo entre bloques, no la duración total del streaming
+        "timeout": httpx.Timeout(
+            settings.AUDIO_HTTP_READ_TIMEOUT,
+            connect=settings.AUDIO_HTTP_CONNECT_TIMEOUT,
+            pool=settings.AUDIO_HTTP_CONNECT_TIMEOUT,
+        ),
+        "follow_redirects": True,
+    }
+
+
+def get_async_audio_client() -> httpx.AsyncClient:
+    """Cliente asíncrono para descargar grabaciones, separado del pool de la API de Sharpen."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_audio_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(**_audio_client_options())
+            _async_audio_clients[loop] = client
+            logger.info(f"🔌 Nuevo cliente HTTP de audio creado para el loop {id(loop)}.")
+        return client
+
+
+def get_sync_client() -> httpx.Client:
+    """Devuelve el cliente síncrono compartido por todo el proceso (es thread-safe)."""
+    global _sync_client
+    with _lock:
+        if _sync_client is None or _sync_client.is_closed:
+            # `requests` seguía redirecciones por defecto; mantenemos ese comportamiento.
+            _sync_client = httpx.Client(follow_redirects=True, **_client_options())
+            logger.info("🔌 Nuevo cliente HTTP síncrono de Sharpen creado.")
+        return _sync_client
+
+
+def _get_io_loop() -> asyncio.AbstractEventLoop:
+    global _io_loop, _io_thread
+    with _lock:
+        if _io_loop is None or _io_loop.is_closed():
+            _io_loop = asyncio.new_event_loop()
+            _io_thread = threading.Thread(target=_io_loop.run_forever, name="sharpen-io", daemon=True)
+            _io_thread.start()
+        return _io_loop
+
+
+def run_sync(async_fn, *args, **kwargs):
+    """
+    Ejecuta `async_fn(*args, **kwargs)` en el loop de fondo del proceso y espera el resultado.
+    Equivalente a `async_to_sync(async_fn)(*args, **kwargs)` pero reutilizando el pool de conexiones.
+    """
+    future = asyncio.run_coroutine_threadsafe(async_fn(*args, **kwargs), _get_io_loop())
+    return future.result()
+
+
+async def aclose_async_client():
+    """Cierra los clientes del loop actual (p. ej. en el evento `lifespan.shutdown` de ASGI)."""
+    loop = asyncio.get_running_loop()
+    with _lock:
+        client = _async_clients.pop(loop, None)
+        audio_client = _async_audio_clients.pop(loop, None)
+    if audio_client is not None and not audio_client.is_closed:
+        await audio_client.aclose()
+    if client is not None and not client.is_closed:
+        await client.aclose()
+        logger.info("Cliente HTTP de Sharpen cerrado para el loop actual.")
+
+
+def shutdown_clients():
+    """
+    Cierre ordenado de todos los clientes del proceso. Se llama al apagar los workers de Celery
+    y vía `atexit` (Daphne no implementa el protocolo lifespan de ASGI).
+    """
+    global _sync_client, _io_loop, _io_thread
+    with _lock:
+        sync_client, _sync_client = _sync_client, None
+        io_loop, _io_loop = _io_loop, None
+        io_thread, _io_thread = _io_thread, None
+        pending = list(_async_clients.items()) + list(_async_audio_clients.items())
+        _async_clients.clear()
+        _async_audio_clients.clear()
+
+    if sync_client is not None:
+        sync_client.close()
+
+    for loop, client in pending:
+        if client.is_closed or loop.is_closed():
+            continue
+        try:
+            if loop is io_loop:
+                asyncio.run_coroutine_threadsafe(client.aclose(), loop).result(timeout=5)
+            elif not loop.is_running():
+                loop.run_until_complete(client.aclose())
+        except Exception as e:
+            logger.warning(f"No se pudo cerrar limpiamente un cliente HTTP de Sharpen: {e}")
+
+    if io_loop is not None and not io_loop.is_closed():
+        io_loop.call_soon_threadsafe(io_loop.stop)
+        if io_thread is not None:
+            io_thread.join(timeout=5)
+        if not io_loop.is_running():
+            io_loop.close()
+    logger.info("Clientes HTTP de Sharpen cerrados.")
+
+
+atexit.register(shutdown_clients)
@@ -0,0 +1,73 @@
+# websocket_app/singleflight.py
+"""
+Coalescencia de peticiones idénticas en vuelo ("single-flight").
+
+Si llegan varias llamadas con la misma clave mientras la primera sigue en curso, sólo la
+primera (el "líder") ejecuta la corrutina; las demás esperan y reciben el mismo resultado.
+Usa `concurrent.futures.Future` + un lock de hilos para funcionar también entre event loops
+distintos del mismo proceso (el loop de Daphne y el loop de fondo de `sharpen_client.run_sync`).
+
+El resultado se comparte por referencia: quien lo reciba debe tratarlo como de sólo lectura.
+"""
+import asyncio
+import concurrent.futures
+import json
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class _LeaderCancelled(Exception):
+    """El líder fue cancelado antes de terminar; los seguidores deben reintentar."""
+
+
+def make_key(endpoint: str, payload: dict) -> str:
+    """Clave estable para un endpoint + payload (independiente del orden de las claves)."""
+    return f"{endpoint}|{json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str)}"
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls: dict[str, concurrent.futures.Future] = {}
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return len(self._calls)
+
+    async def do(self, key: str, coro_fn, *args, **kwargs):
+        while True:
+            with self._lock:
+                future = self._calls.get(key)
+                is_leader = future is None
+                if is_leader:
+                    future = concurrent.futures.Future()
+                    self._calls[key] = future
+
+            if is_leader:
+                return await self._lead(key, future, coro_fn, *args, **kwargs)
+
+            logger.debug(f"Single-flight: reutilizando petición en curso para {key[:80]}")
+            try:
+                # shield: si este seguidor se cancela no debe cancelar el futuro compartido
+                return await asyncio.shield(asyncio.wrap_future(future))
+            except _LeaderCancelled:
+                continue
+
+    async def _lead(self, key, future, coro_fn, *args, **kwargs):
+        try:
+            result = await coro_fn(*args, **kwargs)
+        except asyncio.CancelledError:
+            future.set_exception(_LeaderCancelled())
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                if self._calls.get(key) is future:
+                    del self._calls[key]
@@ -1,20 +1,23 @@
 #websocket_app/task.py
 import logging
-import hashlib
-import json
+import os
 from celery import shared_task
-from .fetch_script import fetch_calls_on_hold_data, fetch_live_queue_status_data, fetch_agent_performance_data 
+from .fetch_script import fetch_agent_performance_data 
 from users.models import User  # Importa tu modelo de usuario
 from django.db import transaction
 from django.utils import timezone
 from django.db.models import F # Para actualizaciones atómicas y seguras
 from channels.layers import get_channel_layer
-from asgiref.sync import async_to_sync
 from .monitoring import get_resource_metrics
+from .sharpen_client import run_sync
+from .live_broadcast import acquire_tick_lock, broadcast_live_tick, release_tick_lock
 import ssl  # Asegúrate de importar ssl para usar CERT_NONE
 
 logger = logging.getLogger(__name__)
 
+# Tiempo máximo que un tick de Celery retiene el lock si el worker muere a mitad del tick
+CELERY_TICK_LOCK_TTL = 30
+
 
 # _last_data_checksums = {
 #     'getCallsOnHoldData': None,
@@ -23,28 +26,6 @@ logger = logging.getLogger(__name__)
 # }
 
 
-def get_checksum(data_to_hash):
-    """
-    Calcula un checksum MD5 para los datos proporcionados.
-    Asegura que los datos sean una lista serializable para JSON.
-    """
-    # Convertir a una lista si no lo es, o asegurar que sea serializable.
-    # Si data_to_hash es None, lo convertimos a una lista vacía para que no falle el JSON.
-    if data_to_hash is None:
-        processed_data = []
-    elif not isinstance(data_to_hash, list):
-        processed_data = [data_to_hash] # Si es un solo elemento, lo envolvemos en una lista
-    else:
-        processed_data = data_to_hash # Si ya es una lista, la usamos directamente
-
-    # Usamos sort_keys=True para asegurar un orden consistente para el hashing.
-    try:
-        return hashlib.md5(json.dumps(processed_data, sort_keys=True).encode('utf-8')).hexdigest()
-    except TypeError as e:
-        logger.error(f"TypeError al calcular checksum: {e}. Datos problemáticos: {processed_data}")
-        # Retorna un checksum único para indicar un error o un estado no válido
-        return "error_checksum_" + str(hash(json.dumps(processed_data, sort_keys=True))) # Intenta crear un hash único
-
 GAMIFICATION_RULES = {
     'call_completed': 10,
     'efficient_wrap_up': 5, # Ejemplo: si wrap up es < 30s
@@ -58,7 +39,7 @@ GAMIFICATION_RULES = {
 def update_agent_gamification_scores():
     logger.info("Iniciando tarea de actualización de gamificación de agentes...")
     try:
-        sharpen_agent_data = async_to_sync(fetch_agent_performance_data)()
+        sharpen_agent_data = run_sync(fetch_agent_performance_data)
         
         # Corregir la indentación de esta sección
         if not sharpen_agent_data:
@@ -126,66 +107,28 @@ def update_agent_gamification_scores():
         logger.exception(f"Error general en update_agent_gamification_scores: {e}")
 
 
+async def _celery_live_tick(channel_layer):
+    # Si el poller dedicado (run_live_poller) está vivo tiene el lock y este tick se omite;
+    # también evita que se solapen ticks de Celery atrasados.
+    owner = f"celery:{os.getpid()}"
+    if not await acquire_tick_lock(owner, CELERY_TICK_LOCK_TTL):
+        logger.debug("[Celery] El tick en vivo lo está ejecutando otro proceso. Se omite.")
+        return
+    try:
+        await broadcast_live_tick(channel_layer, log_prefix="[Celery]")
+    finally:
+        await release_tick_lock(owner)
+
+
 @shared_task
 def broadcast_calls_update():
     try:
-        # 1. Leer el último estado desde la caché
-        from django.core.cache import cache
-        last_on_hold_checksum = cache.get('last_on_hold_checksum')
-        last_live_queue_checksum = cache.get('last_live_queue_checksum')
-        
-        logger.debug(f"Last checksums from cache: OnHold={last_on_hold_checksum}, LiveQueue={last_live_queue_checksum}")
-
         channel_layer = get_channel_layer()
         if not channel_layer:
             logging.error("Error: Channel layer not configured.")
             return
 
-        payload_on_hold = async_to_sync(fetch_calls_on_hold_data)()
-        calls_on_hold_data = payload_on_hold.get('getCallsOnHoldData', []) if isinstance(payload_on_hold, dict) else []
-
-        payload_live_queue = async_to_sync(fetch_live_queue_status_data)()
-        live_queue_status_data = payload_live_queue.get('liveQueueStatus', []) if isinstance(payload_live_queue, dict) else []
-
-        new_on_hold_checksum = get_checksum(calls_on_hold_data)
-        new_live_queue_checksum = get_checksum(live_queue_status_data)
-
-        logger.debug(f"New checksums: OnHold={new_on_hold_checksum}, LiveQueue={new_live_queue_checksum}")
-        transitioned_to_empty = (
-            (calls_on_hold_data == [] and last_on_hold_checksum not in [None, get_checksum([])]) or
-            (live_queue_status_data == [] and last_live_queue_checksum not in [None, get_checksum([])])
-        )
-        # 2. Comparar los nuevos checksums con los de la caché
-        if (
-            new_on_hold_checksum != last_on_hold_checksum
-            or new_live_queue_checksum != last_live_queue_checksum
-            or transitioned_to_empty
-        ):
-            logger.info("[Celery] Cambios detectados. Emitiendo actualización a clientes WebSocket.")
-
-            full_frontend_payload = {
-                "type": "dataUpdate",
-                "payload": {
-                "getCallsOnHoldData": calls_on_hold_data,
-                "getLiveQueueStatusData": live_queue_status_data
-                }
-            }
-
-            message_to_send = json.dumps(full_frontend_payload)
-
-            async_to_sync(channel_layer.group_send)(
-                "calls",
-                {
-                    "type": "send.message", 
-                    "payload": message_to_send 
-                }
-            )
-        # 3. Guardar el nuevo estado en la caché
-            cache.set('last_on_hold_checksum', new_on_hold_checksum)
-            cache.set('last_live_queue_checksum', new_live_queue_checksum)
-
-        else:
-            logger.info("[Celery] No se detectaron cambios en los datos. No se envía actualización a los clientes.")
+        run_sync(_celery_live_tick, channel_layer)
     except Exception as e:
         logger.exception(f"Error en Celery broadcast_calls_update: {e}")
 
@@ -1,3 +1,46 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, override_settings
 
-# Create your tests here.
+from .live_diff import diff_rows
+from .live_encoding import canonical_json
+
+
+@override_settings(LIVE_ROW_KEY_FIELDS={"calls": ("uniqueID",)})
+class DiffRowsTests(SimpleTestCase):
+    def rows(self, *pairs):
+        return [{"uniqueID": key, "state": state} for key, state in pairs]
+
+    def test_sin_cambios_devuelve_none(self):
+        rows = self.rows(("a", 1), ("b", 2))
+        self.assertIsNone(diff_rows("calls", rows, [dict(row) for row in rows]))
+
+    def test_fila_modificada_es_upsert_sin_order(self):
+        patch = diff_rows("calls", self.rows(("a", 1), ("b", 2)), self.rows(("a", 1), ("b", 3)))
+        self.assertEqual(patch["upserts"], [("b", canonical_json({"uniqueID": "b", "state": 3}))])
+        self.assertEqual(patch["removes"], [])
+        self.assertNotIn("order", patch)
+
+    def test_fila_eliminada_e_insertada_al_final(self):
+        patch = diff_rows("calls", self.rows(("a", 1), ("b", 2)), self.rows(("b", 2), ("c", 1)))
+        self.assertEqual([key for key, _ in patch["upserts"]], ["c"])
+        self.assertEqual(patch["removes"], ["a"])
+        # Existentes en su orden + nuevas al final: el cliente llega solo a este orden
+        self.assertNotIn("order", patch)
+
+    def test_reordenar_incluye_order(self):
+        patch = diff_rows("calls", self.rows(("a", 1), ("b", 2)), self.rows(("b", 2), ("a", 1)))
+        self.assertEqual(patch["upserts"], [])
+        self.assertEqual(patch["removes"], [])
+        self.assertEqual(patch["order"], ["b", "a"])
+
+    def test_fila_nueva_antes_de_una_existente_incluye_order(self):
+        patch = diff_rows("calls", self.rows(("a", 1)), self.rows(("c", 1), ("a", 1)))
+        self.assertEqual([key for key, _ in patch["upserts"]], ["c"])
+        self.assertEqual(patch["order"], ["c", "a"])
+
+    def test_fila_sin_clave_se_identifica_por_hash(self):
+        previous = [{"state": 1}]
+        patch = diff_rows("calls", previous, [{"state": 2}])
+        # Sin uniqueID un cambio es eliminación + inserción
+        self.assertEqual(len(patch["removes"]), 1)
+        self.assertEqual(len(patch["upserts"]), 1)
+        self.assertNotEqual(patch["removes"][0], patch["upserts"][0][0])
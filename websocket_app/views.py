@@ -1,8 +1,14 @@
 #websocket_app/views,py
 from django.http import JsonResponse
 import psutil
-from .fetch_script import fetch_calls_on_hold_data
+from calling_monitor.utils.vosk_models import vosk_models
+from calling_monitor.utils.grammar import get_grammar_pool
+from dashboards.recording_cache import recording_cache
+from gvhc.lazy_imports import import_times
+from .fetch_script import fetch_calls_on_hold_data, fetch_live_queue_status_data
+from .live_snapshot import aget_fresh_snapshot, get_fresh_snapshot
 import asyncio # Necesario para ejecutar funciones asíncronas en vistas síncronas
+from .sharpen_client import run_sync
 from rest_framework.views import APIView
 from rest_framework.permissions import IsAuthenticated
 
@@ -12,6 +18,10 @@ async def get_calls_on_hold_from_sharpen(request):
     y los devuelve como una respuesta JSON.
     """
     try:
+        snapshot = await aget_fresh_snapshot()
+        if snapshot is not None:
+            return JsonResponse({"getCallsOnHoldData": snapshot["getCallsOnHoldData"]})
+
         data = await fetch_calls_on_hold_data()
         # Sharpen devuelve un objeto con 'getCallsOnHoldData'
         # Asegúrate de que el formato de la respuesta sea consistente con lo que espera el frontend
@@ -30,20 +40,15 @@ class LiveQueueStatusAPIView(APIView):
     permission_classes = [IsAuthenticated] # Asegúrate de que solo usuarios autenticados puedan acceder
 
     def get(self, request, *args, **kwargs):
-        # Aquí va la lógica para obtener tus datos de LiveQueueStatus
-        # Esto es un placeholder, ajústalo a tu estructura de datos real.
-        # Podrías consultar una base de datos, un caché, etc.
-        sample_data = [
-            {"QueueName": "Ventas Online", "commType": "Llamadas", "intervals": "0-10s"},
-            {"QueueName": "Soporte Técnico", "commType": "Chats", "intervals": "10-30s"},
-            {"QueueName": "Reclamos", "commType": "Llamadas", "intervals": "30-60s"},
-        ]
-        # Si usas un serializer:
-        # queryset = LiveQueueStatusModel.objects.all()
-        # serializer = LiveQueueStatusSerializer(queryset, many=True)
-        # return JsonResponse({"getLiveQueueStatusData": serializer.data})
+        # Servimos el snapshot publicado por broadcast_calls_update; sólo si no existe
+        # o está expirado consultamos Sharpen directamente.
+        snapshot = get_fresh_snapshot()
+        if snapshot is not None:
+            return JsonResponse({"getLiveQueueStatusData": snapshot["liveQueueStatus"]})
 
-        return JsonResponse({"getLiveQueueStatusData": sample_data})
+        # run_sync reutiliza el loop de fondo del proceso y su cliente HTTP compartido
+        data = run_sync(fetch_live_queue_status_data)
+        return JsonResponse({"getLiveQueueStatusData": data.get("liveQueueStatus", [])})
 
 def cors_test(request):
     return JsonResponse({"message": "CORS works!"})
@@ -54,5 +59,12 @@ def system_metrics_view(request):
     return JsonResponse({
         "memory_used_mb": round(memory.used / (1024 ** 2), 2),
         "memory_percent": memory.percent,
-        "cpu_percent": cpu
+        "cpu_percent": cpu,
+        # Modelos de Vosk de este proceso: tiempo de carga y RSS que sumó cada uno
+        "vosk_models": vosk_models.stats(),
+        "lazy_imports": import_times(),
+        # Pool de LanguageTool: instancias creadas/reiniciadas, esperas y aciertos de caché
+        "grammar": get_grammar_pool().stats(),
+        # Caché en disco de grabaciones: aciertos, descargas guardadas y expulsadas
+        "recording_cache": recording_cache.stats(),
     })
\ No newline at end of file